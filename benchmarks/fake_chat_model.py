@@ -0,0 +1,88 @@
+"""Scripted chat model that drives the ReAct agent without calling OpenAI."""
+import re
+import time
+import asyncio
+import itertools
+from typing import Any, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+PLATFORM_DOMAINS = {"Amazon": "amazon.com", "Walmart": "walmart.com", "Ebay": "ebay.com", "Target": "target.com"}
+
+_RESULT_PATTERN = re.compile(
+    r"## \[(?P<title>[^\]]+)\]\((?P<url>[^)]+)\)\n\$(?P<price>[\d.]+) · Rated (?P<rating>[\d.]+) out of 5 \((?P<reviews>\d+) reviews\)\n!\[image\]\((?P<image>[^)]+)\)"
+)
+_ids = itertools.count()
+
+# (platform, prompt tokens) for every model call, for the benchmark's token report
+usage_log = []
+
+class FakeChatModel(BaseChatModel):
+    """Plays the agent's script: call `search_engine`, then answer.
+
+    When bound to the structured output schema it turns the canned search
+    results from the fake MCP server into a ProductSearchResponse tool call.
+    `latency` simulates model response time; token usage is estimated from
+    message length so tracing has numbers to report.
+    """
+
+    latency: float = 0.0
+    max_hits: int = 5
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-scripted-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _prompt(self, messages: List[BaseMessage]):
+        prompt = next((m.content for m in messages if isinstance(m, HumanMessage)), "")
+        platform = prompt.rsplit("Platforms:", 1)[-1].strip() if "Platforms:" in prompt else "Amazon"
+        return prompt.split("\n\nPlatforms:")[0], platform
+
+    def _respond(self, messages: List[BaseMessage], tools) -> AIMessage:
+        tool_names = [tool["function"]["name"] for tool in tools or []]
+        query, platform = self._prompt(messages)
+
+        if "ProductSearchResponse" in tool_names:
+            hits = []
+            for message in messages:
+                if isinstance(message, ToolMessage):
+                    for match in _RESULT_PATTERN.finditer(str(message.content)):
+                        hits.append({
+                            "title": match["title"],
+                            "url": match["url"],
+                            "price": f"${match['price']}",
+                            "rating": f"{match['rating']} ({match['reviews']} reviews)",
+                            "image_url": match["image"],
+                        })
+            arguments = {"platforms": [{"platform": platform, "hits": hits[:self.max_hits]}]}
+            return AIMessage(content="", tool_calls=[{"name": "ProductSearchResponse", "args": arguments, "id": f"call_{next(_ids)}"}])
+
+        if "search_engine" in tool_names and not any(isinstance(m, ToolMessage) for m in messages):
+            domain = PLATFORM_DOMAINS.get(platform, "amazon.com")
+            arguments = {"query": f"{query} site:{domain}"}
+            return AIMessage(content="", tool_calls=[{"name": "search_engine", "args": arguments, "id": f"call_{next(_ids)}"}])
+
+        return AIMessage(content=f"Found products on {platform}.")
+
+    def _result(self, messages, message: AIMessage) -> ChatResult:
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        usage_log.append((self._prompt(messages)[1], prompt_tokens))
+        completion_tokens = max(1, len(str(message.content) + str(message.tool_calls)) // 4)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        message.usage_metadata = {"input_tokens": prompt_tokens, "output_tokens": completion_tokens, "total_tokens": usage["total_tokens"]}
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output={"token_usage": usage})
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._result(messages, self._respond(messages, kwargs.get("tools")))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._result(messages, self._respond(messages, kwargs.get("tools")))
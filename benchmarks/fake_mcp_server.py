@@ -0,0 +1,116 @@
+"""Local stand-in for the BrightData MCP server with canned payloads.
+
+Serves `search_engine`, `scrape_as_markdown` and `web_data_*` tools over
+streamable HTTP so the search pipeline can run without network access:
+
+    python -m benchmarks.fake_mcp_server --port 8765 --latency 0.3 --jitter 0.1
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+from mcp.server.fastmcp import FastMCP
+
+BRANDS = ["Sony", "Bose", "Anker", "JBL", "Logitech", "Samsung", "Nike", "Apple", "Philips", "Soundcore"]
+
+DOMAINS = {
+    "amazon.com": lambda seed: f"https://www.amazon.com/dp/B0{seed % 10**8:08d}",
+    "walmart.com": lambda seed: f"https://www.walmart.com/ip/product/{seed % 10**9}",
+    "ebay.com": lambda seed: f"https://www.ebay.com/itm/{seed % 10**12}",
+    "target.com": lambda seed: f"https://www.target.com/p/product/-/A-{seed % 10**8}",
+}
+
+def _seed(*parts) -> int:
+    return int(hashlib.sha256("|".join(parts).encode()).hexdigest()[:12], 16)
+
+def canned_products(keywords: str, domain: str, count: int = 8):
+    """Deterministic product records for a keyword search on one domain"""
+    products = []
+    for i in range(count):
+        seed = _seed(keywords, domain, str(i))
+        rng = random.Random(seed)
+        products.append({
+            "title": f"{rng.choice(BRANDS)} {keywords.title()} {rng.choice(['Pro', 'Max', 'Lite', 'Plus', 'X'])} {rng.randint(100, 999)}",
+            "url": DOMAINS.get(domain, DOMAINS["amazon.com"])(seed),
+            "final_price": round(rng.uniform(15, 250), 2),
+            "currency": "USD",
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+            "reviews_count": rng.randint(5, 25000),
+            "image_url": f"https://images.example.com/{seed % 10**6}.jpg",
+        })
+    return products
+
+def create_server(latency: float = 0.0, jitter: float = 0.0, host: str = "127.0.0.1", port: int = 8765):
+    server = FastMCP("fake-brightdata", host=host, port=port, log_level="WARNING")
+
+    async def delay():
+        if latency or jitter:
+            await asyncio.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+
+    def keywords_and_domain(query: str):
+        match = re.search(r"site:(\S+)", query)
+        domain = match.group(1) if match else "amazon.com"
+        keywords = re.sub(r"site:\S+", "", query).strip() or "product"
+        return keywords, domain
+
+    @server.tool()
+    async def search_engine(query: str, engine: str = "google") -> str:
+        """Scrape search results from Google, Bing or Yandex as markdown"""
+        await delay()
+        keywords, domain = keywords_and_domain(query)
+        # Real result pages wrap the hits in navigation, filters and related searches
+        lines = [f"* [Menu item {i}](https://www.google.com/nav/{i})" for i in range(60)]
+        lines += ["", f"# Search results for {query}", ""]
+        for product in canned_products(keywords, domain):
+            lines.append(f"## [{product['title']}]({product['url']})")
+            lines.append(f"${product['final_price']} · Rated {product['rating']} out of 5 ({product['reviews_count']} reviews)")
+            lines.append(f"![image]({product['image_url']})")
+            lines.append("")
+        lines += [f"* [Related: {keywords} {i}](https://www.google.com/search?q=related+{i})" for i in range(40)]
+        return "\n".join(lines)
+
+    @server.tool()
+    async def scrape_as_markdown(url: str) -> str:
+        """Scrape a single webpage and return its content as markdown"""
+        await delay()
+        product = canned_products(url, "amazon.com", 1)[0]
+        navigation = "\n".join(f"* [Menu item {i}](https://example.com/nav/{i})" for i in range(200))
+        return f"{navigation}\n\n# {product['title']}\n\nPrice: ${product['final_price']}\n\nRating: {product['rating']} out of 5\n"
+
+    @server.tool()
+    async def web_data_amazon_product_search(keyword: str, url: str) -> str:
+        """Search Amazon products by keyword"""
+        await delay()
+        return json.dumps(canned_products(keyword, "amazon.com"))
+
+    def product_tool(domain):
+        async def lookup(url: str) -> str:
+            await delay()
+            product = canned_products(url, domain, 1)[0]
+            product["url"] = url
+            return json.dumps([product])
+        return lookup
+
+    for name, domain in (("amazon", "amazon.com"), ("walmart", "walmart.com"), ("ebay", "ebay.com")):
+        server.add_tool(
+            product_tool(domain),
+            name=f"web_data_{name}_product",
+            description=f"Quickly read structured {name} product data from a product URL",
+        )
+
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every tool call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- random seconds around --latency")
+    args = parser.parse_args()
+
+    create_server(args.latency, args.jitter, args.host, args.port).run(transport="streamable-http")
+
+if __name__ == "__main__":
+    main()
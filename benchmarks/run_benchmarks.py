@@ -0,0 +1,240 @@
+"""Offline benchmarks for the product search pipeline.
+
+Starts the fake MCP server, swaps in the scripted chat model and runs the real
+search functions end to end for every combination of platform count,
+concurrency, cache state and search mode:
+
+    python -m benchmarks.run_benchmarks --repeats 5 --server-latency 0.2 --model-latency 0.3
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/<previous>.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import itertools
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+QUERIES = [
+    "wireless headphones under $100",
+    "logitech mouse between $50 and $100",
+    "running shoes size 10 nike",
+    "4k monitor 27 inch",
+]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--platform-counts", default="1,2,4", help="comma separated numbers of platforms per search")
+    parser.add_argument("--concurrency", default="sequential,1,4", help="comma separated concurrency levels; 'sequential' uses run_agent_sequential")
+    parser.add_argument("--cache-states", default="off,cold,warm", help="comma separated: off, cold (empty cache) or warm (pre-populated)")
+    parser.add_argument("--modes", default="agent,fast_path", help="comma separated: agent and/or fast_path")
+    parser.add_argument("--repeats", type=int, default=5, help="searches per scenario")
+    parser.add_argument("--users", type=int, default=4, help="simultaneous searches for the throughput measurement")
+    parser.add_argument("--server-latency", type=float, default=0.2, help="seconds per fake MCP tool call")
+    parser.add_argument("--server-jitter", type=float, default=0.05)
+    parser.add_argument("--model-latency", type=float, default=0.3, help="seconds per fake LLM call")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", default=None, help="result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="previous result file to compare against")
+    return parser.parse_args()
+
+def wait_for_port(port, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"Fake MCP server did not start on port {port}")
+
+def start_server(args):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_mcp_server", "--port", str(args.port),
+         "--latency", str(args.server_latency), "--jitter", str(args.server_jitter)],
+        cwd=ROOT,
+    )
+    wait_for_port(args.port)
+    return process
+
+def configure_environment(args, workdir):
+    # Must run before utils.search is imported: settings are read at import time
+    os.environ["MCP_SERVER_URL"] = f"http://127.0.0.1:{args.port}/mcp"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ["RESULT_CACHE_PATH"] = os.path.join(workdir, "search_results.sqlite3")
+    os.environ["TOOL_MEMO_SPILL_PATH"] = os.path.join(workdir, "tool_calls.sqlite3")
+    os.environ["MCP_POOL_SIZE"] = str(max(4, args.users * 4))
+    os.environ["SEQUENTIAL_DELAY_SECONDS"] = "0"
+    os.environ["TRACE_SAMPLE_RATE"] = "0"
+
+def summarize(latencies):
+    values = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "min": float(values.min()),
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "max": float(values.max()),
+    }
+
+def run_scenario(search, run_sync, platforms, concurrency, cache_state, mode, args):
+    from utils import tool_memo
+
+    search.FAST_PATH_ENABLED = mode == "fast_path"
+    search.RESULT_CACHE_ENABLED = cache_state != "off"
+    tool_memo.TOOL_MEMO_ENABLED = cache_state != "off"
+    cache = search.get_result_cache()
+
+    def clear_caches():
+        cache.clear()
+        tool_memo.get_tool_memo().clear()
+
+    async def one_search(query):
+        if concurrency == "sequential":
+            return await search.run_agent_sequential(query, platforms)
+        return await search.run_agent_concurrent(query, platforms, max_concurrency=int(concurrency))
+
+    queries = [QUERIES[i % len(QUERIES)] for i in range(args.repeats)]
+    if cache_state == "warm":
+        for query in set(queries):
+            run_sync(one_search(query))
+
+    latencies = []
+    failures = 0
+    for query in queries:
+        if cache_state == "cold":
+            clear_caches()
+        started = time.perf_counter()
+        result = run_sync(one_search(query))
+        latencies.append(time.perf_counter() - started)
+        if not result:
+            failures += 1
+
+    # Throughput: several users searching at the same time
+    if cache_state == "cold":
+        clear_caches()
+
+    async def burst():
+        return await asyncio.gather(*(one_search(QUERIES[i % len(QUERIES)]) for i in range(args.users)))
+
+    started = time.perf_counter()
+    run_sync(burst())
+    elapsed = time.perf_counter() - started
+
+    return {
+        "name": f"platforms={len(platforms)} concurrency={concurrency} cache={cache_state} mode={mode}",
+        "platforms": len(platforms),
+        "concurrency": concurrency,
+        "cache": cache_state,
+        "mode": mode,
+        "latency_ms": summarize(latencies),
+        "failures": failures,
+        "throughput_searches_per_s": args.users / elapsed,
+    }
+
+def token_report(search, run_sync, usage_log):
+    """Prompt tokens per agent search on each platform, with and without the tool output reducer"""
+    from utils import tool_memo
+
+    search.FAST_PATH_ENABLED = False
+    search.RESULT_CACHE_ENABLED = False
+    tool_memo.TOOL_MEMO_ENABLED = False
+    pool = search.get_mcp_pool()
+    report = {}
+    for platform in search.PLATFORMS:
+        tokens = {}
+        for reducer in (False, True):
+            search.TOOL_OUTPUT_REDUCER_ENABLED = reducer
+            pool.agent = None
+            usage_log.clear()
+            run_sync(search.run_agent_single_platform(QUERIES[0], platform))
+            tokens["reduced" if reducer else "raw"] = sum(prompt_tokens for _, prompt_tokens in usage_log)
+        tokens["reduction_percent"] = (1 - tokens["reduced"] / tokens["raw"]) * 100 if tokens["raw"] else 0.0
+        report[platform] = tokens
+    pool.agent = None
+    return report
+
+def compare(current, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {scenario["name"]: scenario for scenario in json.load(f)["scenarios"]}
+
+    print(f"\nComparison with {baseline_path} (negative = faster):")
+    for scenario in current["scenarios"]:
+        previous = baseline.get(scenario["name"])
+        if previous is None:
+            continue
+        deltas = []
+        for key in ("p50", "p95"):
+            before, after = previous["latency_ms"][key], scenario["latency_ms"][key]
+            deltas.append(f"{key} {((after - before) / before * 100) if before else 0:+.1f}%")
+        print(f"  {scenario['name']}: {', '.join(deltas)}")
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="tympli-bench-")
+    configure_environment(args, workdir)
+    sys.path.insert(0, ROOT)
+
+    from benchmarks.fake_chat_model import FakeChatModel, usage_log
+    import utils.search as search
+    from utils.event_loop import run_sync
+    from utils.tool_memo import get_tool_memo
+
+    fake_model = FakeChatModel(latency=args.model_latency)
+    search.get_model = lambda: fake_model
+
+    server = start_server(args)
+    try:
+        platform_counts = [int(count) for count in args.platform_counts.split(",")]
+        scenarios = []
+        for count, concurrency, cache_state, mode in itertools.product(
+            platform_counts, args.concurrency.split(","), args.cache_states.split(","), args.modes.split(",")
+        ):
+            platforms = search.PLATFORMS[:count]
+            scenario = run_scenario(search, run_sync, platforms, concurrency, cache_state, mode, args)
+            scenarios.append(scenario)
+            latency = scenario["latency_ms"]
+            print(f"{scenario['name']}: p50 {latency['p50']:.0f}ms p95 {latency['p95']:.0f}ms "
+                  f"p99 {latency['p99']:.0f}ms, {scenario['throughput_searches_per_s']:.2f} searches/s, "
+                  f"{scenario['failures']} failed")
+
+        tokens = token_report(search, run_sync, usage_log)
+        print("\nPrompt tokens per agent search (raw -> reduced tool output):")
+        for platform, counts in tokens.items():
+            print(f"  {platform}: {counts['raw']} -> {counts['reduced']} ({counts['reduction_percent']:.0f}% fewer)")
+    finally:
+        run_sync(search.get_mcp_pool().close())
+        server.terminate()
+        server.wait(timeout=10)
+
+    result = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": vars(args),
+        "pool": dict(search.get_mcp_pool().stats),
+        "cache": search.get_result_cache().stats(),
+        "tool_memo": get_tool_memo().summary(),
+        "scenarios": scenarios,
+        "tokens": tokens,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+    if args.compare:
+        compare(result, args.compare)
+
+if __name__ == "__main__":
+    main()
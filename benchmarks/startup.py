@@ -0,0 +1,111 @@
+"""Cold-start and warm-rerun latency of every page.
+
+Each page is loaded in a fresh interpreter with Streamlit's AppTest (cold
+start: imports, cached resources and the first script run), then rerun
+several times in the same process (warm reruns). Runs offline: without real
+credentials the Supabase calls fail fast against an unreachable placeholder.
+
+    python -m benchmarks.startup --repeats 5 --reruns 10
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+PAGES = [
+    "main.py",
+    "pages/1_🏠_Home.py",
+    "pages/2_🔎_Product_Search.py",
+    "pages/3_📋_Watchlist.py",
+    "pages/4_📈_Metrics.py",
+]
+HEAVY_MODULES = ["langchain_openai", "langgraph.prebuilt", "mcp", "langchain_mcp_adapters.tools"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", default=",".join(PAGES), help="comma separated page scripts")
+    parser.add_argument("--repeats", type=int, default=5, help="fresh processes (cold starts) per page")
+    parser.add_argument("--reruns", type=int, default=10, help="warm reruns per process")
+    parser.add_argument("--output", default=None, help="result file (default: benchmarks/results/startup-<timestamp>.json)")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def measure_page(page, reruns):
+    """Runs in the child process: time the first run and the warm reruns of one page"""
+    started = time.perf_counter()
+    os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+    os.environ.setdefault("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.benchmark")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("TRACE_SAMPLE_RATE", "0")
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(ROOT, "main.py"), default_timeout=120)
+    for key in ("SUPABASE_URL", "SUPABASE_KEY", "OPENAI_API_KEY"):
+        app.secrets[key] = os.environ[key]
+    for key in ("stripe_link_starter", "stripe_link_basic", "stripe_link_pro"):
+        app.secrets[key] = "https://example.com"
+    app.session_state["user_email"] = "benchmark@example.com"
+    if page != "main.py":
+        app.switch_page(page)
+
+    app.run()
+    cold = time.perf_counter() - started
+
+    warm = []
+    for _ in range(reruns):
+        rerun_started = time.perf_counter()
+        app.run()
+        warm.append(time.perf_counter() - rerun_started)
+
+    return {
+        "cold_s": cold,
+        "warm_s": warm,
+        "exceptions": [exception.value for exception in app.exception],
+        "heavy_modules_loaded": [module for module in HEAVY_MODULES if module in sys.modules],
+    }
+
+def run_child(page, reruns):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child", page, "--reruns", str(reruns)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout
+    # AppTest and Streamlit may print to stdout too; the result is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    args = parse_args()
+    if args.child:
+        print(json.dumps(measure_page(args.child, args.reruns)))
+        return
+
+    pages = []
+    for page in args.pages.split(","):
+        runs = [run_child(page, args.reruns) for _ in range(args.repeats)]
+        cold = np.array([run["cold_s"] for run in runs]) * 1000
+        warm = np.array([value for run in runs for value in run["warm_s"]]) * 1000
+        result = {
+            "page": page,
+            "cold_ms": {"p50": float(np.percentile(cold, 50)), "max": float(cold.max())},
+            "warm_ms": {"p50": float(np.percentile(warm, 50)), "p95": float(np.percentile(warm, 95))},
+            "heavy_modules_loaded": runs[-1]["heavy_modules_loaded"],
+            "exceptions": runs[-1]["exceptions"],
+        }
+        pages.append(result)
+        print(f"{page}: cold p50 {result['cold_ms']['p50']:.0f}ms, warm p50 {result['warm_ms']['p50']:.1f}ms "
+              f"p95 {result['warm_ms']['p95']:.1f}ms, heavy modules: {', '.join(result['heavy_modules_loaded']) or 'none'}")
+
+    output = args.output or os.path.join(RESULTS_DIR, "startup-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"timestamp": datetime.now(timezone.utc).isoformat(), "config": vars(args), "pages": pages}, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+if __name__ == "__main__":
+    main()
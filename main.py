@@ -1,9 +1,6 @@
 import streamlit as st
 from utils.supabase_auth import auth_screen, sign_out
-from utils.database import init_supabase
-
-# Initialize Supabase
-supabase = init_supabase()
+from utils.config import is_admin
 
 def main_home():
     """Main home page with basic info"""
@@ -27,6 +24,8 @@ if st.session_state.get("user_email"):
         st.page_link("pages/1_🏠_Home.py", label="Home", icon="🏠")
         st.page_link("pages/2_🔎_Product_Search.py", label="Product Search", icon="🔍")
         st.page_link("pages/3_📋_Watchlist.py", label="Watchlist", icon="📋")
+        if is_admin(st.session_state.get("user_email")):
+            st.page_link("pages/4_📈_Metrics.py", label="Metrics", icon="📈")
         st.markdown("---")
         if st.button("Logout"):
             sign_out()
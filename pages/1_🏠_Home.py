@@ -1,5 +1,6 @@
 import streamlit as st
 from utils.supabase_auth import sign_out
+from utils.config import is_admin
 import streamlit.components.v1 as components
 
 # Check if user is authenticated - redirect to main if not
@@ -13,6 +14,8 @@ with st.sidebar:
     st.page_link("pages/1_🏠_Home.py", label="Home", icon="🏠")
     st.page_link("pages/2_🔎_Product_Search.py", label="Product Search", icon="🔍")
     st.page_link("pages/3_📋_Watchlist.py", label="Watchlist", icon="📋")
+    if is_admin(st.session_state.get("user_email")):
+        st.page_link("pages/4_📈_Metrics.py", label="Metrics", icon="📈")
     st.markdown("---")
     if st.button("Logout"):
         sign_out()
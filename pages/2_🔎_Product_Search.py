@@ -1,16 +1,14 @@
+import concurrent.futures
 import streamlit as st
-import asyncio
-import json
-import base64
-from typing import List
-from pydantic import BaseModel, Field  
-from mcp import ClientSession
-from mcp.client.streamable_http import streamablehttp_client
-from langchain_openai import ChatOpenAI
-from langchain_mcp_adapters.tools import load_mcp_tools
-from langgraph.prebuilt import create_react_agent
 from utils.supabase_auth import sign_out
-from utils.database import get_or_create_user, add_to_watchlist
+from utils.config import is_admin, get_setting
+from utils.database import get_or_create_user, add_to_watchlist_in_background
+from utils.search import PLATFORMS, SEARCH_POLICY
+from utils.search_jobs import get_search_jobs, AdmissionError, DEFAULT_TIER, FINISHED_STATUSES, SEARCH_POLL_SECONDS
+from utils.image_cache import prefetch_images, show_thumbnail
+from utils.normalize import RESULT_SORTS, normalize_results, filter_results, sort_results
+from utils.product_match import best_prices
+from utils.query_index import parse_query, narrows
 
 # Set page config
 st.set_page_config(
@@ -29,108 +27,30 @@ if "last_search_result" not in st.session_state:
 if "last_search_query" not in st.session_state:
     st.session_state["last_search_query"] = None
 
+if "last_search_frame" not in st.session_state:
+    st.session_state["last_search_frame"] = None
+
+# URL -> pending write (None once saved) for products added from this page
+if "watchlist_added" not in st.session_state:
+    st.session_state["watchlist_added"] = {}
+
+# Result list -> number of cards shown
+if "results_shown" not in st.session_state:
+    st.session_state["results_shown"] = {}
+
 # Check if user is authenticated - redirect to main if not
 if not st.session_state.get("user_email"):
     st.error("Please log in to access this page.")
     st.info("Redirecting to login page...")
     st.switch_page("main.py")
 
-# Constants
-PLATFORMS = ["Amazon", "Walmart", "Ebay", "Target"]
-
-# Smithery.ai configuration
-SMITHERY_API_KEY = st.secrets.get("SMITHERY_API_KEY", "")
-
-# Pydantic models
-class Hit(BaseModel):
-    title: str
-    url: str
-    price: str
-    rating: str
-    image_url: str
-
-class PlatformBlock(BaseModel):
-    platform: str
-    hits: List[Hit]
-
-class ProductSearchResponse(BaseModel):
-    platforms: List[PlatformBlock]
-
-# Model setup
-model = ChatOpenAI(
-    model="gpt-4o-mini",
-    api_key=st.secrets["OPENAI_API_KEY"]
-)
-
-def create_smithery_url():
-    """Create Smithery.ai MCP server URL with configuration"""
-    config = {
-        "apiToken": st.secrets["API_TOKEN"],
-        "browserAuth": st.secrets["BROWSER_AUTH"], 
-        "webUnlockerZone": st.secrets["WEB_UNLOCKER_ZONE"]
-    }
-    
-    config_b64 = base64.b64encode(json.dumps(config).encode()).decode()
-    url = f"https://server.smithery.ai/@luminati-io/brightdata-mcp/mcp?config={config_b64}&api_key={SMITHERY_API_KEY}"
-    
-    return url
-
-SYSTEM_PROMPT = (
-    "To find products, first use the search_engine tool. When finding products, use the web_data tool for the platform. "
-    "If none exists, scrape as markdown. "
-    "Search all requested platforms in sequence, not in parallel. "
-    "Example: Don't use web_data_bestbuy_products for search. Use it only for getting data on specific products you already found in search."
-)
-
-async def run_agent_single_platform(query, platform):
-    """Run agent for a single platform"""
-    try:
-        smithery_url = create_smithery_url()
-        
-        async with streamablehttp_client(smithery_url) as (read_stream, write_stream, _):
-            async with ClientSession(read_stream, write_stream) as session:
-                await session.initialize()
-                tools = await load_mcp_tools(session)
-                agent = create_react_agent(model, tools, response_format=ProductSearchResponse)
-
-                prompt = f'{query}\n\nPlatforms: {platform}'
-                result = await agent.ainvoke({
-                    'messages': [
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {"role": "user", "content": prompt}
-                    ]
-                })
-
-                print(f"Raw agent result for {platform}:", result)
-                structured = result["structured_response"]
-                print(f"Structured response for {platform}:", structured.model_dump(mode="json"))
-                return structured.model_dump()
-            
-    except Exception as e:
-        print(f"Error connecting to Smithery.ai MCP server for {platform}: {str(e)}")
-        return None
-
-async def run_agent_sequential(query, platforms):
-    """Run agent sequentially for multiple platforms to avoid conflicts"""
-    all_results = {"platforms": []}
-    
-    for platform in platforms:
-        print(f"Searching {platform}...")
-        result = await run_agent_single_platform(query, platform)
-        if result and "platforms" in result:
-            all_results["platforms"].extend(result["platforms"])
-        
-        await asyncio.sleep(1)
-    
-    return all_results if all_results["platforms"] else None
-
-
-
 # Sidebar - Only show if authenticated
 with st.sidebar:
     st.page_link("pages/1_🏠_Home.py", label="Home", icon="🏠")
     st.page_link("pages/2_🔎_Product_Search.py", label="Product Search", icon="🔍")
     st.page_link("pages/3_📋_Watchlist.py", label="Watchlist", icon="📋")
+    if is_admin(st.session_state.get("user_email")):
+        st.page_link("pages/4_📈_Metrics.py", label="Metrics", icon="📈")
     st.markdown("---")
     if st.button("Logout"):
         sign_out()
@@ -154,80 +74,344 @@ selected_platforms = st.multiselect(
 )
 
 # Add warning for multiple platforms
-if len(selected_platforms) > 3:
+if len(selected_platforms) > 3 and SEARCH_POLICY == "sequential":
     st.warning("⚠️ Searching many platforms may take longer as each platform is searched individually for better reliability.")
 
+RESULTS_PAGE_SIZE = get_setting("RESULTS_PAGE_SIZE", 10, int)
+# How long an add waits for the database before the card is shown as saving
+WATCHLIST_CONFIRM_SECONDS = get_setting("WATCHLIST_CONFIRM_SECONDS", 1.0, float)
+
+STATUS_MESSAGES = {
+    "pending": "⏳ {platform}: waiting to search...",
+    "running": "🔄 {platform}: searching...",
+    "failed": "❌ {platform}: search failed",
+    "timeout": "⌛ {platform}: search timed out",
+    "unavailable": "🚫 {platform}: temporarily unavailable, skipped",
+}
+
+def save_to_watchlist(items):
+    """Button callback: show (product, platform) pairs as saved right away and write them in the background"""
+    user = get_or_create_user(st.session_state.user_email)
+    if not user:
+        return
+    items = [(hit, platform_name) for hit, platform_name in items if hit["url"] not in st.session_state.watchlist_added]
+    if not items:
+        return
+    future = add_to_watchlist_in_background(user["id"], items, st.session_state.get("results_query"))
+    for hit, _ in items:
+        st.session_state.watchlist_added[hit["url"]] = future
+    # Usually the write lands well within this; a slow one is reported on a later rerun
+    concurrent.futures.wait([future], timeout=WATCHLIST_CONFIRM_SECONDS)
+    if not future.done():
+        st.toast("📌 Saving to watchlist..." if len(items) == 1 else f"📌 Saving {len(items)} products to watchlist...")
+    settle_watchlist_saves()
+
+def settle_watchlist_saves():
+    """Report finished background adds; products whose write failed can be added again"""
+    added, existing, failed, error = 0, 0, 0, None
+    finished = {}
+    for url, future in st.session_state.watchlist_added.items():
+        if future is not None and future.done():
+            finished.setdefault(future, []).append(url)
+    for future, urls in finished.items():
+        if future.exception() is None:
+            added += len(future.result()["added"])
+            existing += len(future.result()["existing"])
+            for url in urls:
+                st.session_state.watchlist_added[url] = None
+        else:
+            for url in urls:
+                del st.session_state.watchlist_added[url]
+            failed, error = failed + len(urls), future.exception()
+    if added:
+        st.toast("✅ Added to watchlist!" if added == 1 else f"✅ Added {added} products to watchlist!")
+    if existing:
+        st.toast("ℹ️ This product is already in your watchlist." if existing == 1 else f"ℹ️ {existing} products were already in your watchlist.")
+    if failed:
+        st.toast(f"❌ Could not add {failed} product(s) to your watchlist: {str(error)}")
+
+def show_more_results(list_key):
+    st.session_state.results_shown[list_key] = st.session_state.results_shown.get(list_key, RESULTS_PAGE_SIZE) + RESULTS_PAGE_SIZE
+
+def render_platform(platform):
+    """Render one platform's results expander"""
+    with st.expander(f"🏪 {platform['platform']} ({len(platform['hits'])} results)", expanded=True):
+        render_hit_list(
+            platform["platform"],
+            [(hit, platform["platform"], i) for i, hit in enumerate(platform["hits"])],
+            add_all=True,
+        )
+
+@st.fragment
+def render_hit_list(list_key, rows, show_platform=False, add_all=False):
+    """Render (hit, platform, rank) rows a page at a time; paging and "Add all" only rerun this list"""
+    settle_watchlist_saves()
+    if add_all and len(rows) > 1:
+        unsaved = [(hit, platform_name) for hit, platform_name, _ in rows if hit["url"] not in st.session_state.watchlist_added]
+        st.button(
+            f"📌 Add all {len(rows)} to Watchlist",
+            key=f"add_all_{list_key}",
+            disabled=not unsaved,
+            help="Save every product from this platform in one go",
+            on_click=save_to_watchlist,
+            args=(unsaved,),
+        )
+
+    shown = st.session_state.results_shown.get(list_key, RESULTS_PAGE_SIZE)
+    # Warm the thumbnails of the next page while this one is being looked at
+    prefetch_images([hit["image_url"] for hit, _, _ in rows[shown:shown + RESULTS_PAGE_SIZE]], wait=0)
+    for hit, platform_name, rank in rows[:shown]:
+        render_hit(hit, platform_name, rank, show_platform)
+
+    if len(rows) > shown:
+        st.button(
+            f"⬇️ Show {min(RESULTS_PAGE_SIZE, len(rows) - shown)} more ({len(rows) - shown} left)",
+            key=f"more_{list_key}",
+            on_click=show_more_results,
+            args=(list_key,),
+        )
+
+@st.fragment
+def render_hit(hit, platform_name, rank, show_platform=False):
+    """Render one product card; its add-to-watchlist button only reruns this card"""
+    col1, col2, col3 = st.columns([1, 4, 1])
+    
+    with col1:
+        show_thumbnail(hit["image_url"])
+    
+    with col2:
+        st.markdown(f"**[{hit['title']}]({hit['url']})**")
+        if show_platform:
+            st.markdown(f"🏪 {platform_name}")
+        if hit["price"]:
+            st.markdown(f"💰 {hit['price']}")
+        else:
+            st.markdown("💰 Price not available")                                 
+        if hit["rating"]:
+            st.markdown(f"⭐ {hit['rating']}")
+        else:
+            st.markdown("⭐ No rating available")
+    
+    with col3:
+        saved = hit["url"] in st.session_state.watchlist_added
+        st.button(
+            "✅ In watchlist" if saved else "📌 Add to Watchlist",
+            key=f"add_{platform_name}_{rank}_{hit['url'][:20]}",
+            disabled=saved,
+            help="Save this product to your watchlist",
+            on_click=save_to_watchlist,
+            args=([(hit, platform_name)],),
+        )
+    
+    st.markdown("---")
+
+def render_result_controls(frame):
+    """Sort and filter controls for the current results; returns the chosen settings"""
+    with st.expander("🎛️ Sort & filter", expanded=False):
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            sort = st.selectbox("Sort by", list(RESULT_SORTS), key="results_sort")
+        with col2:
+            min_price = st.number_input("Min price", min_value=0.0, value=None, step=10.0, key="results_min_price")
+        with col3:
+            max_price = st.number_input("Max price", min_value=0.0, value=None, step=10.0, key="results_max_price")
+        with col4:
+            min_rating = st.slider("Min rating", 0.0, 5.0, 0.0, 0.5, key="results_min_rating")
+        platforms = st.multiselect("Platforms", sorted(frame["platform"].unique()), key="results_platforms")
+    return {"sort": sort, "min_price": min_price, "max_price": max_price, "min_rating": min_rating, "platforms": platforms}
+
+def render_ranked(frame, controls):
+    """Render hits from every platform in one list, filtered and sorted by the controls"""
+    ranked = sort_results(
+        filter_results(frame, controls["platforms"], controls["min_price"], controls["max_price"], controls["min_rating"]),
+        controls["sort"],
+    )
+    st.caption(f"Showing {len(ranked)} of {len(frame)} products")
+    rows = [
+        ({"title": row.title, "url": row.url, "price": row.price, "rating": row.rating, "image_url": row.image_url}, row.platform, row.rank)
+        for row in ranked.itertuples(index=False)
+    ]
+    render_hit_list("ranked", rows, show_platform=True)
+
+def render_best_prices(comparison):
+    """Products found on several platforms, with the cheapest offer for each"""
+    if comparison.empty:
+        return
+    with st.expander(f"💸 Best prices across platforms ({len(comparison)} products)", expanded=True):
+        platform_columns = [column for column in comparison.columns if column in PLATFORMS]
+        st.dataframe(
+            comparison[["product", "best_price", "best_platform", "savings", *platform_columns, "url"]],
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "product": st.column_config.TextColumn("Product", width="large"),
+                "best_price": st.column_config.NumberColumn("Best price", format="%.2f"),
+                "best_platform": "Cheapest on",
+                "savings": st.column_config.NumberColumn("You save", format="%.2f"),
+                **{column: st.column_config.NumberColumn(column, format="%.2f") for column in platform_columns},
+                "url": st.column_config.LinkColumn("Link", display_text="Open"),
+            },
+        )
+
+def controls_active(controls):
+    return (controls["sort"] != "Relevance" or controls["min_price"] is not None or controls["max_price"] is not None
+            or controls["min_rating"] > 0 or bool(controls["platforms"]))
+
+jobs = get_search_jobs()
+user_email = st.session_state.user_email
+
+if st.session_state.get("search_job_id") is None:
+    # Pick up a search that was still running when the page was refreshed
+    st.session_state["search_job_id"] = jobs.latest_for_user(user_email)
+
+def submit_search(query, platforms):
+    """Queue a search job for the current user"""
+    user = get_or_create_user(user_email)
+    try:
+        st.session_state.search_job_id = jobs.submit(
+            user_email, query, platforms, tier=(user or {}).get("tier") or DEFAULT_TIER
+        )
+        st.session_state.search_refinement = None
+    except AdmissionError as e:
+        st.warning(f"⚠️ {str(e)}")
+
+def refine_last_search(query, platforms):
+    """Answer a query that only narrows the last search by filtering its results.
+
+    Returns False when the query widens the search or looks for something else,
+    or when a selected platform has no results from the last search.
+    """
+    last_result = st.session_state.get("last_search_result")
+    if not last_result or not st.session_state.get("last_search_query"):
+        return False
+    if not set(platforms) <= {block["platform"] for block in last_result["platforms"]}:
+        return False
+    constraints = parse_query(query)
+    if not narrows(parse_query(st.session_state.last_search_query), constraints):
+        return False
+
+    if st.session_state.get("last_search_frame") is None:
+        st.session_state.last_search_frame = normalize_results(last_result["platforms"])
+    frame = filter_results(
+        st.session_state.last_search_frame, platforms, constraints["min_price"], constraints["max_price"],
+        constraints["min_rating"], constraints["brand"], constraints["size"],
+    )
+    st.session_state.search_refinement = {"query": query, "platforms": platforms, "frame": frame, "best_prices": best_prices(frame)}
+    st.session_state.results_shown.pop("ranked", None)
+    return True
+
 if st.button("🔍 Search Products", type="primary", disabled=not (query and selected_platforms)):
-    if query and selected_platforms:
-        with st.spinner("🔍 Searching across platforms... This may take a moment..."):
-            try:
-                result = asyncio.run(run_agent_sequential(query, selected_platforms))
-                
-                if result and "platforms" in result and result["platforms"]:
-                    st.session_state.last_search_result = result
-                    st.session_state.last_search_query = query
-                else:
-                    st.error("No results found. Try adjusting your search query or selecting different platforms.")
-            except Exception as e:
-                st.error(f"Search failed: {str(e)}")
-                st.info("Try selecting fewer platforms or adjust your search query.")
-
-# Display results
-if st.session_state.get('last_search_result'):
+    if query and selected_platforms and not refine_last_search(query, selected_platforms):
+        submit_search(query, selected_platforms)
+
+def finish_search_job(job):
+    """Move a finished job's results into the session and stop polling it"""
+    jobs.mark_collected(job["id"])
+    st.session_state.search_job_id = None
+    st.session_state.search_refinement = None
+    st.session_state.results_shown = {}
+    if job["status"] == "done":
+        st.session_state.last_search_result = {"platforms": job["blocks"], "failed": job["failed"]}
+        st.session_state.last_search_query = job["query"]
+        st.session_state.last_search_frame = normalize_results(job["blocks"])
+        st.session_state.last_search_best_prices = best_prices(st.session_state.last_search_frame)
+        st.session_state.search_notice = None
+    elif job["status"] == "cancelled":
+        st.session_state.search_notice = "Search cancelled."
+    else:
+        st.session_state.search_notice = "No results found. Try adjusting your search query or selecting different platforms."
+
+@st.fragment(run_every=SEARCH_POLL_SECONDS)
+def render_search_job(job_id):
+    """Poll a running search job and show each platform as soon as it finishes"""
+    job = jobs.get(job_id, user_email)
+    if job is None or job["status"] in FINISHED_STATUSES:
+        if job is not None:
+            finish_search_job(job)
+        else:
+            st.session_state.search_job_id = None
+        st.rerun()
+
+    # Watchlist adds from the results below are recorded with this query
+    st.session_state.results_query = job["query"]
+
     st.markdown("---")
     st.subheader("🎯 Search Results")
 
-    total_products = sum(len(platform["hits"]) for platform in st.session_state.last_search_result["platforms"])
-    
-    for platform in st.session_state.last_search_result["platforms"]:
-        with st.expander(f"🏪 {platform['platform']} ({len(platform['hits'])} results)", expanded=True):
-            
-            for i, hit in enumerate(platform["hits"]):
-                col1, col2, col3 = st.columns([1, 4, 1])
-                
-                with col1:
-                    if hit["image_url"] and hit["image_url"] != "No Image URL Available" and hit["image_url"].startswith(('http://', 'https://')):
-                        try:
-                            st.image(hit["image_url"], width=100)
-                        except:
-                            st.markdown("📦")
-                    else:
-                        st.markdown("📦")
-                
-                with col2:
-                    st.markdown(f"**[{hit['title']}]({hit['url']})**")
-                    if hit["price"]:
-                        st.markdown(f"💰 {hit['price']}")
-                    else:
-                        st.markdown("💰 Price not available")                                 
-                    if hit["rating"]:
-                        st.markdown(f"⭐ {hit['rating']}")
-                    else:
-                        st.markdown("⭐ No rating available")
-                
-                with col3:
-                    button_key = f"add_{platform['platform']}_{i}_{hit['url'][:20]}"
-                    if st.button("📌 Add to Watchlist", key=button_key, help="Save this product to your watchlist"):
-                        user = get_or_create_user(st.session_state.user_email)
-                        if user:
-                            success = add_to_watchlist(
-                                user["id"], 
-                                hit, 
-                                platform["platform"], 
-                                st.session_state.last_search_query
-                            )
-                            if success:
-                                st.success("✅ Added to watchlist!")
-                                st.balloons()
-                
-                st.markdown("---")
+    col1, col2 = st.columns([5, 1])
+    with col1:
+        if job["status"] == "queued":
+            st.info(f"⏳ Your search is queued (position {job['position']}) and will start as soon as a slot frees up.")
+        else:
+            st.caption(f"Searching for *{job['query']}*...")
+    with col2:
+        if st.button("✖️ Cancel search", key="cancel_search"):
+            jobs.cancel(job_id, user_email)
+
+    for platform_name in job["platforms"]:
+        status = job["platform_status"][platform_name]
+        if status == "done":
+            blocks = [block for block in job["blocks"] if block["platform"] == platform_name]
+            prefetch_images([hit["image_url"] for block in blocks for hit in block["hits"]], wait=0)
+            for platform in blocks:
+                render_platform(platform)
+        elif status in ("pending", "running"):
+            st.info(STATUS_MESSAGES[status].format(platform=platform_name))
+        else:
+            st.warning(STATUS_MESSAGES[status].format(platform=platform_name))
+
+if st.session_state.get("search_job_id"):
+    render_search_job(st.session_state.search_job_id)
+elif st.session_state.get("search_notice"):
+    st.warning(st.session_state.search_notice)
+    st.session_state.search_notice = None
+
+# Display results of the last finished search
+if st.session_state.get('last_search_result') and not st.session_state.get("search_job_id"):
+    st.markdown("---")
+    st.subheader("🎯 Search Results")
+    st.session_state.results_query = st.session_state.last_search_query
+
+    if st.session_state.get("last_search_frame") is None:
+        st.session_state.last_search_frame = normalize_results(st.session_state.last_search_result["platforms"])
+        st.session_state.last_search_best_prices = best_prices(st.session_state.last_search_frame)
+
+    refinement = st.session_state.get("search_refinement")
+    if refinement:
+        frame, comparison = refinement["frame"], refinement["best_prices"]
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            st.info(
+                f"⚡ Showing the {len(frame)} products from your search for *{st.session_state.last_search_query}* "
+                f"that match *{refinement['query']}*, no new search needed."
+            )
+        with col2:
+            if st.button("🔍 Search again", key="search_again", help="Run the refined query as a new search"):
+                submit_search(refinement["query"], refinement["platforms"])
+                st.rerun()
+    else:
+        frame, comparison = st.session_state.last_search_frame, st.session_state.last_search_best_prices
+
+    render_best_prices(comparison)
+    controls = render_result_controls(frame)
+
+    if refinement or controls_active(controls):
+        render_ranked(frame, controls)
+    else:
+        for platform in st.session_state.last_search_result["platforms"]:
+            render_platform(platform)
 
 # Show search tips if no results   
-if not st.session_state.get('last_search_result'):
+if not st.session_state.get('last_search_result') and not st.session_state.get("search_job_id"):
     st.markdown("---")
     st.markdown("### 💡 Search Tips")
     
-    st.write("""
+    if SEARCH_POLICY == "sequential":
+        timing_tip = "Platforms are searched one after another, so each one you add makes the search take longer"
+    else:
+        timing_tip = "Platforms are searched at the same time, so adding more mostly adds results, not waiting time"
+
+    st.write(f"""
     **Good search examples:**
     - "Find wireless bluetooth headphones with 4 star rating or above under $100"
     - "Find mouses from Logitech between \\$50 and \\$100"
@@ -235,6 +419,9 @@ if not st.session_state.get('last_search_result'):
     
     **For multiple platforms:**
     - Each platform is searched individually for better reliability
-    - More platforms = longer search time but more comprehensive results
-    - Consider starting with 2-3 platforms for faster results
+    - {timing_tip}
+    - If a platform is slow or unavailable, results from the others are still shown
+
+    **Refining a search:**
+    - Tightening the price range, minimum rating, brand ("from Sony") or size of your last search filters its results instantly instead of searching again
     """)
\ No newline at end of file
@@ -1,6 +1,10 @@
 import streamlit as st
+from datetime import timedelta
 from utils.supabase_auth import sign_out
-from utils.database import get_user_watchlist, remove_from_watchlist, get_or_create_user
+from utils.config import is_admin
+from utils.database import get_user_watchlist_page, remove_from_watchlist, remove_many_from_watchlist, get_or_create_user, wait_for_watchlist_writes
+from utils.search import PLATFORMS
+from utils.image_cache import prefetch_images, show_thumbnail
 
 # Set page config
 st.set_page_config(
@@ -24,6 +28,8 @@ with st.sidebar:
     st.page_link("pages/1_🏠_Home.py", label="Home", icon="🏠")
     st.page_link("pages/2_🔎_Product_Search.py", label="Product Search", icon="🔍")
     st.page_link("pages/3_📋_Watchlist.py", label="Watchlist", icon="📋")
+    if is_admin(st.session_state.get("user_email")):
+        st.page_link("pages/4_📈_Metrics.py", label="Metrics", icon="📈")
     st.markdown("---")
     if st.button("Logout"):
         sign_out()
@@ -33,23 +39,85 @@ with st.sidebar:
 st.title("📋 Your Watchlist")
 st.write("Keep track of products you're interested in!")
 
+PAGE_SIZE = 20
+
+SORT_LABELS = {
+    "newest": "Newest first",
+    "oldest": "Oldest first",
+    "price_low": "Price: low to high",
+    "price_high": "Price: high to low",
+}
+
+def reset_watchlist():
+    """Drop loaded pages so the first page is fetched again"""
+    for key in ("watchlist_items", "watchlist_cursor", "watchlist_total", "watchlist_filters"):
+        st.session_state.pop(key, None)
+
+def load_more(user_id, filters):
+    """Append the next page (runs as a button callback, before the rerun)"""
+    items, cursor, _ = get_user_watchlist_page(
+        user_id, cursor=st.session_state.watchlist_cursor, limit=PAGE_SIZE, **filters
+    )
+    st.session_state.watchlist_items.extend(items)
+    st.session_state.watchlist_cursor = cursor
+
 # Get user and their watchlist
 user = get_or_create_user(st.session_state.user_email)
 if user:
-    watchlist_items = get_user_watchlist(user["id"])
+    with st.expander("🔎 Search, filter & sort"):
+        search = st.text_input("Search titles", placeholder="e.g. headphones")
+        filter_col1, filter_col2 = st.columns(2)
+        with filter_col1:
+            platforms = st.multiselect("Platforms", PLATFORMS)
+            sort = st.selectbox("Sort by", list(SORT_LABELS), format_func=SORT_LABELS.get)
+        with filter_col2:
+            min_price = st.number_input("Min price ($)", min_value=0.0, value=None, step=10.0)
+            max_price = st.number_input("Max price ($)", min_value=0.0, value=None, step=10.0)
+            added = st.date_input("Added between", value=())
+        if sort in ("price_low", "price_high"):
+            st.caption("Items without a price are hidden when sorting by price.")
+
+    filters = {
+        "sort": sort,
+        "platforms": platforms or None,
+        "min_price": min_price,
+        "max_price": max_price,
+        "added_after": added[0].isoformat() if len(added) > 0 else None,
+        "added_before": (added[-1] + timedelta(days=1)).isoformat() if len(added) > 0 else None,
+        "search": search.strip() or None,
+    }
+
+    # Filters changed (or first visit, or products were just added): load the first page
+    if st.session_state.get("watchlist_filters") != (user["id"], filters):
+        wait_for_watchlist_writes()
+        items, cursor, total = get_user_watchlist_page(user["id"], limit=PAGE_SIZE, **filters)
+        st.session_state.watchlist_items = items
+        st.session_state.watchlist_cursor = cursor
+        st.session_state.watchlist_total = total
+        st.session_state.watchlist_filters = (user["id"], filters)
+
+    watchlist_items = st.session_state.watchlist_items
     
     if watchlist_items:
-        st.info(f"You have {len(watchlist_items)} items in your watchlist")
+        total = st.session_state.watchlist_total
+        st.info(f"You have {total if total is not None else len(watchlist_items)} items in your watchlist")
+
+        # Checkbox state from the previous run decides what "Remove selected" removes
+        selected_ids = [item["id"] for item in watchlist_items if st.session_state.get(f"select_{item['id']}")]
+        if st.button(f"🗑️ Remove selected ({len(selected_ids)})", disabled=not selected_ids):
+            removed = remove_many_from_watchlist(user["id"], selected_ids)
+            if removed is not None:
+                st.success(f"Removed {len(removed['removed'])} items from watchlist!")
+                reset_watchlist()
+                st.rerun()
         
+        prefetch_images([item.get("image_url") for item in watchlist_items])
         for item in watchlist_items:
             with st.container():
                 col1, col2, col3 = st.columns([1, 4, 1])
                 
                 with col1:
-                    if item.get("image_url"):
-                        st.image(item["image_url"], width=100)
-                    else:
-                        st.markdown("📦")
+                    show_thumbnail(item.get("image_url"))
                 
                 with col2:
                     st.markdown(f"**[{item['title']}]({item['url']})**")
@@ -63,15 +131,27 @@ if user:
                     st.markdown(f"📅 Added: {item['created_at'][:10]}")
                 
                 with col3:
+                    st.checkbox("Select", key=f"select_{item['id']}")
                     if st.button("🗑️ Remove", key=f"remove_{item['id']}", help="Remove from watchlist"):
                         if remove_from_watchlist(item["id"]):
                             st.success("Removed from watchlist!")
+                            reset_watchlist()
                             st.rerun()
                         else:
                             st.error("Failed to remove item")
                 
                 st.markdown("---")
+
+        if st.session_state.watchlist_cursor is not None:
+            st.button(
+                f"⬇️ Load more ({len(watchlist_items)} of {st.session_state.watchlist_total or '?'} shown)",
+                on_click=load_more,
+                args=(user["id"], filters)
+            )
     
+    elif any(value for key, value in filters.items() if key != "sort"):
+        st.info("No items match these filters.")
+
     else:
         st.info("Your watchlist is empty!")
         st.markdown("""
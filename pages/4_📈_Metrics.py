@@ -0,0 +1,92 @@
+import streamlit as st
+import pandas as pd
+from utils.supabase_auth import sign_out
+from utils.config import is_admin
+from utils import tracing
+from utils.search import get_mcp_pool, get_result_cache, get_single_flight, get_scheduler
+from utils.search_jobs import get_search_jobs
+from utils.tool_memo import get_tool_memo
+
+# Set page config
+st.set_page_config(
+    page_title="Tympli - Metrics",
+    page_icon="📈",
+    layout="wide"
+)
+
+# Initialize session state if needed
+if "user_email" not in st.session_state:
+    st.session_state["user_email"] = None
+
+# Check if user is authenticated - redirect to main if not
+if not st.session_state.get("user_email"):
+    st.error("Please log in to access this page.")
+    st.info("Redirecting to login page...")
+    st.switch_page("main.py")
+
+if not is_admin(st.session_state.user_email):
+    st.error("This page is only available to admins.")
+    st.stop()
+
+# Sidebar - Only show if authenticated
+with st.sidebar:
+    st.page_link("pages/1_🏠_Home.py", label="Home", icon="🏠")
+    st.page_link("pages/2_🔎_Product_Search.py", label="Product Search", icon="🔍")
+    st.page_link("pages/3_📋_Watchlist.py", label="Watchlist", icon="📋")
+    st.page_link("pages/4_📈_Metrics.py", label="Metrics", icon="📈")
+    st.markdown("---")
+    if st.button("Logout"):
+        sign_out()
+        st.rerun()
+
+# Main page content
+st.title("📈 Search Metrics")
+st.write(f"Latency percentiles over the last {tracing.METRICS_WINDOW} observations per metric in this process.")
+
+if st.button("🔄 Refresh"):
+    st.rerun()
+
+summary = tracing.metrics.summary()
+if summary:
+    st.subheader("⏱️ Latency (ms)")
+    st.dataframe(pd.DataFrame(summary).set_index("metric").round(1), use_container_width=True)
+else:
+    st.info("No searches recorded yet.")
+
+col1, col2, col3 = st.columns(3)
+
+with col1:
+    st.subheader("🗄️ Result Cache")
+    st.json(get_result_cache().stats())
+
+with col2:
+    st.subheader("🔌 MCP Session Pool")
+    st.json(get_mcp_pool().stats)
+
+with col3:
+    st.subheader("🔀 Coalesced Searches")
+    st.json(get_single_flight().stats)
+
+col4, col5 = st.columns(2)
+
+with col4:
+    st.subheader("📥 Search Jobs")
+    st.json(get_search_jobs().load())
+
+with col5:
+    st.subheader("🧰 Memoized Tool Calls")
+    st.json(get_tool_memo().summary())
+
+scheduler = get_scheduler().snapshot()
+if scheduler:
+    st.subheader("🚦 Platforms")
+    st.dataframe(pd.DataFrame.from_dict(scheduler, orient="index"), use_container_width=True)
+
+error_counts = tracing.errors.summary()
+if error_counts:
+    st.subheader("⚠️ Errors")
+    st.json(error_counts)
+    st.dataframe(pd.DataFrame(tracing.errors.recent()).assign(
+        time=lambda frame: pd.to_datetime(frame["time"], unit="s")), use_container_width=True)
+
+st.caption(f"Sampled traces ({tracing.TRACE_SAMPLE_RATE:.0%}) are written to `{tracing.TRACE_PATH}`.")
@@ -0,0 +1,11 @@
+-- One watchlist row per (user, product URL), so inserts can be single-request upserts.
+
+-- Drop duplicates left by the old check-then-insert race, keeping the oldest row
+delete from public.watchlist newer
+using public.watchlist older
+where newer.user_id = older.user_id
+  and newer.url = older.url
+  and (newer.created_at, newer.id::text) > (older.created_at, older.id::text);
+
+alter table public.watchlist
+  add constraint watchlist_user_id_url_key unique (user_id, url);
@@ -0,0 +1,41 @@
+-- One user row per email, so get_or_create_user can be a single upsert.
+
+-- Merge duplicates left by the old select-then-insert race into one surviving row per email:
+-- the oldest account, with the id breaking ties between rows created at the same time
+create temporary table user_merges as
+with ranked as (
+  select u.id, first_value(u.id) over (partition by u.email order by u.created_at nulls last, u.id) as survivor_id
+  from public.users u
+  where u.email is not null
+)
+select ranked.id as duplicate_id, ranked.survivor_id
+from ranked
+where ranked.id <> ranked.survivor_id;
+
+-- Watchlist rows the merged user would have twice: keep the oldest, as watchlist_unique_user_url does
+delete from public.watchlist w
+using (
+  select w2.id,
+         row_number() over (
+           partition by coalesce(m.survivor_id, w2.user_id), w2.url
+           order by w2.created_at, w2.id::text
+         ) as rank
+  from public.watchlist w2
+  left join user_merges m on m.duplicate_id = w2.user_id
+  where w2.user_id in (select duplicate_id from user_merges union select survivor_id from user_merges)
+) ranked
+where w.id = ranked.id and ranked.rank > 1;
+
+update public.watchlist w
+set user_id = m.survivor_id
+from user_merges m
+where w.user_id = m.duplicate_id;
+
+delete from public.users u
+using user_merges m
+where u.id = m.duplicate_id;
+
+drop table user_merges;
+
+alter table public.users
+  add constraint users_email_key unique (email);
@@ -0,0 +1,15 @@
+-- Numeric price for server-side price filters and sorting, and indexes for
+-- keyset pagination of a user's watchlist.
+alter table public.watchlist
+  add column if not exists price_value numeric;
+
+update public.watchlist
+set price_value = substring(replace(price, ',', '') from '[0-9]+(?:\.[0-9]+)?')::numeric
+where price_value is null and price ~ '[0-9]';
+
+create index if not exists watchlist_user_created_id_idx
+  on public.watchlist (user_id, created_at desc, id desc);
+
+create index if not exists watchlist_user_price_id_idx
+  on public.watchlist (user_id, price_value, id)
+  where price_value is not null;
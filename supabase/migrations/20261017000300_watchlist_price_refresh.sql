@@ -0,0 +1,45 @@
+-- Support for the background price refresh (utils/price_refresh.py): page
+-- through distinct tracked URLs and apply a batch of refreshed prices to every
+-- user's row for those URLs in one call.
+alter table public.watchlist
+  add column if not exists price_refreshed_at timestamptz;
+
+create index if not exists watchlist_url_idx
+  on public.watchlist (url);
+
+create or replace function public.distinct_watchlist_urls(after_url text default null, page_size integer default 1000)
+returns table (url text, platform text)
+language sql
+stable
+as $$
+  select distinct on (w.url) w.url, w.platform
+  from public.watchlist w
+  where after_url is null or w.url > after_url
+  order by w.url
+  limit page_size
+$$;
+
+create or replace function public.apply_watchlist_price_refresh(updates jsonb)
+returns integer
+language sql
+as $$
+  with refreshed as (
+    select *
+    from jsonb_to_recordset(updates) as u(url text, price text, price_value numeric, rating text)
+  ),
+  updated as (
+    update public.watchlist w
+    set price = refreshed.price,
+        price_value = refreshed.price_value,
+        rating = coalesce(refreshed.rating, w.rating),
+        price_refreshed_at = now()
+    from refreshed
+    where w.url = refreshed.url
+    returning 1
+  )
+  select count(*)::integer from updated
+$$;
+
+-- Only the refresh worker (service role) may call these
+revoke execute on function public.distinct_watchlist_urls(text, integer) from public, anon, authenticated;
+revoke execute on function public.apply_watchlist_price_refresh(jsonb) from public, anon, authenticated;
@@ -0,0 +1,44 @@
+-- Price history shared per product URL, per-item alert rules, and the alerts
+-- raised by the price refresh (utils/price_history.py).
+create table if not exists public.price_history (
+  url text primary key,
+  start_time bigint not null,
+  start_cents bigint not null,
+  -- Seconds and cents relative to the previous point
+  time_deltas integer[] not null default '{}',
+  price_deltas integer[] not null default '{}',
+  low_cents bigint not null
+);
+
+alter table public.watchlist
+  add column if not exists target_price numeric,
+  add column if not exists alert_drop_percent numeric,
+  add column if not exists alert_all_time_low boolean not null default false;
+
+create table if not exists public.price_alerts (
+  id uuid primary key default gen_random_uuid(),
+  user_id uuid not null references public.users (id) on delete cascade,
+  watchlist_id uuid references public.watchlist (id) on delete cascade,
+  url text not null,
+  kind text not null check (kind in ('price_drop', 'all_time_low', 'below_target')),
+  price_value numeric not null,
+  previous_price_value numeric,
+  created_at timestamptz not null default now()
+);
+
+create index if not exists price_alerts_user_created_idx
+  on public.price_alerts (user_id, created_at desc);
+
+-- Only the refresh worker writes these tables, with the service role, which bypasses
+-- RLS. Users may read their own alerts; public.users rows are keyed by email, not by
+-- auth uid, so ownership goes through the signed-in user's email.
+alter table public.price_history enable row level security;
+alter table public.price_alerts enable row level security;
+
+drop policy if exists price_alerts_select_own on public.price_alerts;
+create policy price_alerts_select_own on public.price_alerts
+  for select to authenticated
+  using (user_id in (select u.id from public.users u where u.email = auth.jwt() ->> 'email'));
+
+revoke insert, update, delete on public.price_history from anon, authenticated;
+revoke insert, update, delete on public.price_alerts from anon, authenticated;
@@ -0,0 +1,4 @@
+-- Pricing plan per user; search admission limits depend on it (utils/search_jobs.py).
+alter table public.users
+  add column if not exists tier text not null default 'starter'
+  check (tier in ('starter', 'basic', 'pro'));
@@ -0,0 +1,4 @@
+-- Earlier versions of 20261017000000 created move_watchlist_items, which could
+-- hand rows to any user id and had no callers. There are no lists or folders to
+-- move items between, so the function is dropped rather than kept around.
+drop function if exists public.move_watchlist_items(uuid[], uuid, uuid);
@@ -0,0 +1,31 @@
+import pandas as pd
+from utils.product_match import best_prices, cluster_listings
+
+def test_generic_listing_does_not_hide_matched_pair():
+    frame = pd.DataFrame([
+        {"title": "Sony WH-1000XM5 Wireless Noise Canceling Headphones", "platform": "Amazon",
+         "url": "https://www.amazon.com/dp/B09XS7JWHH", "amount": 328.0, "currency": "USD"},
+        {"title": "Sony WH-1000XM5 Wireless Noise Canceling Headphones, Black", "platform": "Walmart",
+         "url": "https://www.walmart.com/ip/1234567", "amount": 299.0, "currency": "USD"},
+        {"title": "onn. Wireless Noise Canceling Headphones", "platform": "Walmart",
+         "url": "https://www.walmart.com/ip/7654321", "amount": 39.0, "currency": "USD"},
+    ])
+
+    labels = cluster_listings(frame["title"].tolist(), frame["url"].tolist())
+    assert labels[0] == labels[1]
+    assert labels[2] != labels[0]
+
+    comparison = best_prices(frame)
+    assert len(comparison) == 1
+    assert comparison.loc[0, "best_platform"] == "Walmart"
+    assert comparison.loc[0, "best_price"] == 299.0
+    assert comparison.loc[0, "savings"] == 29.0
+
+def test_different_brands_are_not_compared():
+    frame = pd.DataFrame([
+        {"title": "Sony Wireless Headphones, Black", "platform": "Amazon",
+         "url": "https://www.amazon.com/dp/B0000000A1", "amount": 59.0, "currency": "USD"},
+        {"title": "onn. Wireless Headphones, Black", "platform": "Walmart",
+         "url": "https://www.walmart.com/ip/111", "amount": 19.0, "currency": "USD"},
+    ])
+    assert best_prices(frame).empty
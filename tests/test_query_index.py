@@ -0,0 +1,36 @@
+import pytest
+from utils.query_index import QueryIndex
+from utils.result_cache import SearchResultCache
+
+RESPONSE = {"platforms": [{"platform": "Amazon", "hits": []}]}
+
+@pytest.mark.parametrize("typo, cached", [
+    ("wireless headphnes", "wireless headphones"),
+    ("gamng mouse", "gaming mouse"),
+    ("cofee maker", "coffee maker"),
+    ("air fryr", "air fryer"),
+    ("mechanical keybord", "mechanical keyboard"),
+    ("bluetoth speaker", "bluetooth speaker"),
+    ("laptop backpak", "laptop backpack"),
+    ("running shoes for womn", "running shoes for women"),
+])
+def test_one_typo_reuses_cached_entry(tmp_path, typo, cached):
+    cache = SearchResultCache(str(tmp_path / "results.db"), query_index=QueryIndex())
+    cache.put(cached, "Amazon", RESPONSE)
+
+    assert cache.get(typo, "Amazon") == RESPONSE
+    assert cache.near_hits == 1
+
+@pytest.mark.parametrize("query, cached", [
+    ("blue sony wireless noise cancelling headphones", "red sony wireless noise cancelling headphones"),
+    ("wireless headphones under $100 for kids", "wireless headphones under $100"),
+    ("wireless mouse", "wireless house"),
+    ("iphone case", "iphone cage"),
+    ("tan boots", "tank boots"),
+    ("sony wh-1000xm4", "sony wh-1000xm5"),
+])
+def test_different_query_misses(query, cached):
+    index = QueryIndex()
+    index.add(cached, "Amazon")
+
+    assert index.lookup(query, "Amazon") is None
@@ -0,0 +1,245 @@
+"""Headless batch search for scheduled jobs such as the daily deals newsletter.
+
+Runs every query in a file against the selected platforms with the same search
+functions as the app (result cache, fast path, then the agent), with bounded
+concurrency and per-platform rate limits. Each finished query is appended to a
+JSONL file as a validated ProductSearchResponse plus the query and the
+platforms that failed. The output doubles as the checkpoint: rerunning the same
+command skips queries already written with every platform searched, so an
+interrupted run resumes where it stopped. Queries with failed platforms search
+just those platforms again, and the merged record replaces the old one.
+
+Query files are plain text (one query per line, `#` comments) or JSONL with
+{"query": ..., "platforms": [...]} per line:
+
+    python -m utils.batch_search queries.txt --output deals.jsonl
+    python -m utils.batch_search queries.txt --output deals.jsonl --platforms Amazon,Walmart --concurrency 8
+    python -m utils.batch_search queries.txt --output deals.jsonl --mcp-url http://127.0.0.1:8765/mcp
+"""
+import os
+import json
+import asyncio
+import argparse
+from datetime import datetime, timezone
+from utils.config import get_setting
+from utils.event_loop import run_sync
+from utils.rate_limit import RateLimiter
+from utils.result_cache import normalize_query
+from utils import tracing
+
+BATCH_CONCURRENCY = get_setting("BATCH_CONCURRENCY", 8, int)
+BATCH_PLATFORM_TIMEOUT_SECONDS = get_setting("BATCH_PLATFORM_TIMEOUT_SECONDS", 120.0, float)
+
+# Per-platform budgets: searches started per second and searches in flight
+DEFAULT_RATE_PER_SECOND = get_setting("BATCH_RATE_PER_SECOND", 1.0, float)
+DEFAULT_PLATFORM_CONCURRENCY = get_setting("BATCH_PLATFORM_CONCURRENCY", 4, int)
+# Overrides per platform, e.g. {"Ebay": {"rate": 0.5, "concurrency": 2}}
+PLATFORM_BUDGETS = get_setting("BATCH_PLATFORM_BUDGETS", {}, lambda value: json.loads(value) if isinstance(value, str) else dict(value))
+
+def job_key(query: str, platforms) -> str:
+    return normalize_query(query) + "|" + ",".join(sorted(platforms))
+
+def load_queries(path: str, default_platforms: list, known_platforms: list):
+    """(query, platforms) pairs from a text or JSONL query file, without duplicates"""
+    jobs = {}
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if path.endswith(".jsonl"):
+                entry = json.loads(line)
+                query, platforms = entry["query"], entry.get("platforms") or default_platforms
+            else:
+                query, platforms = line, default_platforms
+            unknown = set(platforms) - set(known_platforms)
+            if unknown:
+                raise ValueError(f"{path}:{number}: unknown platforms {', '.join(sorted(unknown))}")
+            jobs.setdefault(job_key(query, platforms), (query, list(platforms)))
+    return list(jobs.values())
+
+class BatchOutput:
+    """Append-only JSONL results file that doubles as the checkpoint"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> dict:
+        """The latest record per query key.
+
+        Lines torn by an interrupted write and records superseded by a later one
+        for the same query are dropped from the file. A record with failed
+        platforms stays until the rerun has appended its replacement, so an
+        interrupted rerun never loses the platforms that already succeeded.
+        """
+        if not os.path.exists(self.path):
+            return {}
+        records, stale = {}, False
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    key = job_key(record["query"], record["requested_platforms"])
+                    dict(record["failed"])
+                except (ValueError, KeyError, TypeError):
+                    stale = True
+                    continue
+                if key in records or not line.endswith("\n"):
+                    stale = True
+                    records.pop(key, None)
+                records[key] = record
+        if stale:
+            temporary = self.path + ".tmp"
+            with open(temporary, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(record) + "\n" for record in records.values())
+            os.replace(temporary, self.path)
+        return records
+
+    def append(self, record: dict):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+class BatchRunner:
+    """Run (query, platforms) jobs with a global concurrency bound and per-platform budgets"""
+
+    def __init__(self, output: BatchOutput, concurrency: int = BATCH_CONCURRENCY,
+                 timeout: float = BATCH_PLATFORM_TIMEOUT_SECONDS, budgets: dict = PLATFORM_BUDGETS):
+        self.output = output
+        self.timeout = timeout
+        self.budgets = budgets
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._platform_limits = {}
+        self.summary = {"queries": 0, "hits": 0, "failed_platforms": 0}
+
+    def _limits(self, platform):
+        if platform not in self._platform_limits:
+            budget = self.budgets.get(platform, {})
+            concurrency = int(budget.get("concurrency", DEFAULT_PLATFORM_CONCURRENCY))
+            self._platform_limits[platform] = (
+                RateLimiter(float(budget.get("rate", DEFAULT_RATE_PER_SECOND)), burst=concurrency),
+                asyncio.Semaphore(concurrency),
+            )
+        return self._platform_limits[platform]
+
+    async def search_platform(self, query: str, platform: str):
+        """Search one platform; returns (status, validated PlatformBlock dicts)"""
+        from utils.search import search_single_platform, ProductSearchResponse, PlatformUnavailableError
+
+        limiter, platform_slots = self._limits(platform)
+        # Wait for the platform's budget before taking a global slot, so a throttled
+        # platform doesn't hold slots the other platforms could use
+        async with platform_slots:
+            await limiter.acquire()
+            async with self._slots:
+                with tracing.span("platform", platform=platform) as span:
+                    try:
+                        result = await search_single_platform(query, platform, timeout=self.timeout)
+                    except asyncio.TimeoutError:
+                        tracing.record_error("batch.timeout", f"timed out after {self.timeout}s", platform=platform, query=query)
+                        span.set("status", "timeout")
+                        return "timeout", []
+                    except PlatformUnavailableError as e:
+                        tracing.record_error("batch.unavailable", e, platform=platform, query=query)
+                        span.set("status", "unavailable")
+                        return "unavailable", []
+                    except Exception as e:
+                        tracing.record_error("batch", e, platform=platform, query=query)
+                        span.set("status", "failed")
+                        return "failed", []
+                    if not result or not result.get("platforms"):
+                        span.set("status", "failed")
+                        return "failed", []
+                    span.set("status", "done")
+                    return "done", ProductSearchResponse.model_validate(result).model_dump(mode="json")["platforms"]
+
+    async def run_query(self, query: str, platforms: list) -> dict:
+        """Search every platform for one query and build its output record"""
+        from utils.search import ProductSearchResponse
+
+        with tracing.span("batch_query", query=query, platforms=list(platforms)):
+            outcomes = await asyncio.gather(*(self.search_platform(query, platform) for platform in platforms))
+        blocks = [block for _, platform_blocks in outcomes for block in platform_blocks]
+        return {
+            "query": query,
+            "requested_platforms": list(platforms),
+            **ProductSearchResponse.model_validate({"platforms": blocks}).model_dump(mode="json"),
+            "failed": {platform: status for platform, (status, _) in zip(platforms, outcomes) if status != "done"},
+            "completed_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    async def resume_query(self, previous: dict) -> dict:
+        """Search only the platforms that failed in `previous` and merge the results into it"""
+        record = await self.run_query(previous["query"], list(previous["failed"]))
+        # Failed platforms contributed no blocks, so the previous blocks are all kept
+        return {
+            **record,
+            "requested_platforms": previous["requested_platforms"],
+            "platforms": previous["platforms"] + record["platforms"],
+        }
+
+    async def run(self, jobs: list):
+        """Run (query, platforms, previous record or None) jobs, appending each record as it finishes"""
+        total = len(jobs)
+
+        async def one(query, platforms, previous):
+            record = await (self.resume_query(previous) if previous else self.run_query(query, platforms))
+            self.output.append(record)
+            hits = sum(len(block["hits"]) for block in record["platforms"])
+            self.summary["queries"] += 1
+            self.summary["hits"] += hits
+            self.summary["failed_platforms"] += len(record["failed"])
+            failed = f", failed: {', '.join(record['failed'])}" if record["failed"] else ""
+            print(f"[{self.summary['queries']}/{total}] {query}: {hits} hits{failed}")
+
+        await asyncio.gather(*(one(*job) for job in jobs))
+        return self.summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a file of product searches headlessly and write the results as JSONL")
+    parser.add_argument("queries", help="query file: one query per line, or .jsonl with query and platforms")
+    parser.add_argument("--output", required=True, help="JSONL results file; queries already in it without failed platforms are skipped")
+    parser.add_argument("--platforms", default=None, help="comma separated platforms (default: all)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="platform searches in flight")
+    parser.add_argument("--timeout", type=float, default=BATCH_PLATFORM_TIMEOUT_SECONDS, help="seconds per platform search")
+    parser.add_argument("--mcp-url", default=None, help="MCP server to use instead of Smithery, e.g. the local benchmark server")
+    parser.add_argument("--no-cache", action="store_true", help="skip the search result cache")
+    args = parser.parse_args()
+
+    # Search settings are read when utils.search is imported
+    if args.mcp_url:
+        os.environ["MCP_SERVER_URL"] = args.mcp_url
+    os.environ.setdefault("MCP_POOL_SIZE", str(args.concurrency))
+    import utils.search as search
+
+    if args.no_cache:
+        search.RESULT_CACHE_ENABLED = False
+    platforms = args.platforms.split(",") if args.platforms else search.PLATFORMS
+    try:
+        jobs = load_queries(args.queries, platforms, search.PLATFORMS)
+    except (OSError, ValueError, KeyError) as e:
+        parser.error(str(e))
+
+    output = BatchOutput(args.output)
+    records = output.load()
+    pending = []
+    for query, query_platforms in jobs:
+        previous = records.get(job_key(query, query_platforms))
+        if previous is None or previous["failed"]:
+            pending.append((query, query_platforms, previous))
+    retries = sum(1 for *_, previous in pending if previous)
+    print(f"{len(pending)} of {len(jobs)} queries to run ({len(jobs) - len(pending)} already in {args.output}, "
+          f"{retries} retrying failed platforms only)")
+
+    runner = BatchRunner(output, concurrency=args.concurrency, timeout=args.timeout)
+    try:
+        print("Batch search summary:", run_sync(runner.run(pending)))
+    finally:
+        run_sync(search.get_mcp_pool().close())
+
+if __name__ == "__main__":
+    main()
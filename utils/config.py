@@ -0,0 +1,37 @@
+import os
+import streamlit as st
+
+def get_setting(name: str, default=None, cast=None):
+    """Read a setting from Streamlit secrets, falling back to environment variables"""
+    value = None
+    try:
+        if name in st.secrets:
+            value = st.secrets[name]
+    except Exception:
+        # No secrets.toml (e.g. headless scripts) - use the environment instead
+        pass
+
+    if value is None:
+        value = os.environ.get(name)
+
+    if value is None:
+        return default
+
+    if cast is bool and isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    if cast is not None:
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            print(f"Invalid value for setting {name}: {value!r}, using default {default!r}")
+            return default
+    return value
+
+def is_admin(email) -> bool:
+    """Whether the signed-in email is listed in the ADMIN_EMAILS setting"""
+    if not email:
+        return False
+    admins = get_setting("ADMIN_EMAILS", [])
+    if isinstance(admins, str):
+        admins = admins.split(",")
+    return email.strip().lower() in {admin.strip().lower() for admin in admins}
@@ -0,0 +1,151 @@
+"""Shrink scraped pages before the agent's model reads them.
+
+`scrape_as_markdown` and `search_engine` return whole retailer pages:
+navigation, filters, footers and the products somewhere in between. The
+reducer reads that markdown line by line, keeps product candidates (a product
+link with the price, rating and image found near it) and drops the rest, so
+the model reads a few hundred tokens per page instead of tens of thousands.
+"""
+import re
+from langchain_core.tools import StructuredTool
+from utils.config import get_setting
+from utils import tracing
+
+REDUCER_MAX_CHARS = get_setting("REDUCER_MAX_CHARS", 6000, int)
+REDUCER_MAX_CANDIDATES = get_setting("REDUCER_MAX_CANDIDATES", 20, int)
+REDUCED_TOOLS = ("scrape_as_markdown", "search_engine")
+
+# Lines after a product link that may still describe that product
+CANDIDATE_WINDOW_LINES = 8
+
+_LINK_PATTERN = re.compile(r"(?<!!)\[([^\]]{8,300})\]\((https?://[^)\s]+)\)")
+_IMAGE_PATTERN = re.compile(r"!\[[^\]]*\]\((https?://[^)\s]+)\)")
+_PRODUCT_URL_PATTERN = re.compile(r"/(?:dp|gp/product|ip|itm|p|product|products)/", re.IGNORECASE)
+_PRICE_PATTERN = re.compile(
+    r"(?:[$€£]\s?\d[\d,]*(?:\.\d{1,2})?|\b\d[\d,]*(?:\.\d{1,2})?\s?(?:USD|EUR|GBP)\b)"
+)
+_RATING_PATTERN = re.compile(r"(\d(?:\.\d)?)\s*(?:out of 5|/\s*5\b|stars?\b)", re.IGNORECASE)
+_REVIEWS_PATTERN = re.compile(r"([\d,]+)\s*(?:reviews|ratings)\b", re.IGNORECASE)
+# Lines that are only a list of links, a bare link or decoration
+_BOILERPLATE_PATTERN = re.compile(r"^\s*(?:[*+\-|>#]\s*)*(?:\[[^\]]*\]\([^)]*\)\s*[|·•,]?\s*)+$|^\s*[-=*_|#]*\s*$")
+
+def _new_candidate(title, url, image=None):
+    return {"title": title.strip(), "url": url, "price": None, "rating": None, "reviews": None, "image": image, "age": 0}
+
+def _fill(candidate, line):
+    # Attach the first price, rating and image seen after a product link
+    if candidate["price"] is None:
+        price = _PRICE_PATTERN.search(line)
+        if price:
+            candidate["price"] = re.sub(r"\s+", "", price.group(0)) if price.group(0)[0] in "$€£" else price.group(0)
+    if candidate["rating"] is None:
+        rating = _RATING_PATTERN.search(line)
+        if rating and float(rating.group(1)) <= 5:
+            candidate["rating"] = rating.group(1)
+    if candidate["reviews"] is None:
+        reviews = _REVIEWS_PATTERN.search(line)
+        if reviews:
+            candidate["reviews"] = reviews.group(1)
+    if candidate["image"] is None:
+        image = _IMAGE_PATTERN.search(line)
+        if image:
+            candidate["image"] = image.group(1)
+
+def iter_candidates(lines):
+    """Yield product candidates from markdown lines in one pass"""
+    current = None
+    last_image = None
+    seen = set()
+    for line in lines:
+        link = next((match for match in _LINK_PATTERN.finditer(line) if _PRODUCT_URL_PATTERN.search(match.group(2))), None)
+        if link and (current is None or link.group(2) != current["url"]):
+            if current is not None and current["url"] not in seen:
+                seen.add(current["url"])
+                yield current
+            # Product images often come just before the title link
+            current = _new_candidate(link.group(1), link.group(2), last_image)
+            last_image = None
+            _fill(current, line[link.end():])
+            continue
+
+        image = _IMAGE_PATTERN.search(line)
+        if current is not None and current["age"] < CANDIDATE_WINDOW_LINES:
+            current["age"] += 1
+            had_image = current["image"] is not None
+            _fill(current, line)
+            if image and had_image:
+                last_image = image.group(1)
+        elif image:
+            last_image = image.group(1)
+
+    if current is not None and current["url"] not in seen:
+        yield current
+
+def format_candidate(candidate) -> str:
+    details = [candidate["price"] or "Price not shown"]
+    if candidate["rating"]:
+        rating = f"Rated {candidate['rating']} out of 5"
+        if candidate["reviews"]:
+            rating += f" ({candidate['reviews']} reviews)"
+        details.append(rating)
+    lines = [f"## [{candidate['title']}]({candidate['url']})", " · ".join(details)]
+    if candidate["image"]:
+        lines.append(f"![image]({candidate['image']})")
+    return "\n".join(lines)
+
+def strip_boilerplate(text: str, max_chars: int) -> str:
+    """Page text without link lists, bare links and empty lines, capped at `max_chars`"""
+    kept, size = [], 0
+    for line in text.splitlines():
+        if _BOILERPLATE_PATTERN.match(line):
+            continue
+        line = line.strip()
+        if size + len(line) + 1 > max_chars:
+            break
+        kept.append(line)
+        size += len(line) + 1
+    return "\n".join(kept)
+
+def reduce_markdown(text: str, max_chars: int = REDUCER_MAX_CHARS, max_candidates: int = REDUCER_MAX_CANDIDATES) -> str:
+    """Product candidates from a scraped page, or the page without boilerplate if it lists none"""
+    blocks, size = [], 0
+    for candidate in iter_candidates(text.splitlines()):
+        block = format_candidate(candidate)
+        if len(blocks) >= max_candidates or size + len(block) + 2 > max_chars:
+            break
+        blocks.append(block)
+        size += len(block) + 2
+
+    if not blocks:
+        # A single product page, or a page we can't parse: keep its text but not its chrome
+        return strip_boilerplate(text, max_chars)
+    return "Product candidates found on the page:\n\n" + "\n\n".join(blocks)
+
+def reduce_tool_content(tool_name: str, content):
+    """Reduce one tool result and record how much it shrank"""
+    text = "\n\n".join(content) if isinstance(content, list) else str(content or "")
+    reduced = reduce_markdown(text)
+    if len(reduced) >= len(text):
+        return content
+    tracing.record("reducer.chars_in", len(text))
+    tracing.record("reducer.chars_out", len(reduced))
+    tracing.metrics.observe(f"reducer.{tool_name}.kept_percent", len(reduced) / max(1, len(text)) * 100)
+    return reduced
+
+def reduce_tool_output(tools, names=REDUCED_TOOLS):
+    """Wrap the named MCP tools so their output is reduced before the model sees it"""
+    return [_reducing_tool(tool) if tool.name in names else tool for tool in tools]
+
+def _reducing_tool(tool):
+    async def call_tool(**arguments):
+        content, artifact = await tool.coroutine(**arguments)
+        return reduce_tool_content(tool.name, content), artifact
+
+    return StructuredTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        coroutine=call_tool,
+        response_format=tool.response_format,
+        metadata=tool.metadata,
+    )
@@ -1,80 +1,197 @@
+import time
+import asyncio
+import threading
+import concurrent.futures
 import streamlit as st
-from supabase import create_client, Client
+from utils.config import get_setting
+from utils.resources import get_supabase
+from utils.event_loop import submit
+from utils.normalize import parse_price_value
 
-# Initialize Supabase client
-@st.cache_resource
-def init_supabase():
-    url = st.secrets["SUPABASE_URL"]
-    key = st.secrets["SUPABASE_KEY"]
-    return create_client(url, key)
+USER_CACHE_TTL_SECONDS = get_setting("USER_CACHE_TTL_SECONDS", 600.0, float)
+
+# Columns rendered by the Watchlist page, plus the keyset columns
+WATCHLIST_COLUMNS = "id, title, url, price, price_value, rating, image_url, platform, search_query, created_at"
+
+# Sort option -> (keyset column, descending)
+WATCHLIST_SORTS = {
+    "newest": ("created_at", True),
+    "oldest": ("created_at", False),
+    "price_low": ("price_value", False),
+    "price_high": ("price_value", True),
+}
+
+# Process-wide email -> (user record, expiry) memo shared by all sessions
+_user_cache = {}
+_user_cache_lock = threading.Lock()
 
-supabase: Client = init_supabase()
 
 def get_or_create_user(email: str):
-    """Get existing user or create new one"""
+    """Get existing user or create new one.
+
+    The record is cached in the session and in a process-wide TTL memo, so
+    returning users cost no database round trips.
+    """
+    cached = st.session_state.get("user_record")
+    if cached and cached.get("email") == email:
+        return cached
+
+    with _user_cache_lock:
+        entry = _user_cache.get(email)
+    if entry and entry[1] > time.monotonic():
+        st.session_state["user_record"] = entry[0]
+        return entry[0]
+
     try:
-        result = supabase.table("users").select("*").eq("email", email).execute()
+        # Single round trip: returns the existing row or the newly created one
+        result = get_supabase().table("users").upsert({"email": email}, on_conflict="email").execute()
         
         if result.data:
-            return result.data[0]
+            user = result.data[0]
+            with _user_cache_lock:
+                _user_cache[email] = (user, time.monotonic() + USER_CACHE_TTL_SECONDS)
+            st.session_state["user_record"] = user
+            return user
         else:
-            # Create new user
-            new_user = {"email": email}
-            result = supabase.table("users").insert(new_user).execute()
-            if result.data:
-                return result.data[0]
-            else:
-                st.error("Failed to create user account")
-                return None
+            st.error("Failed to create user account")
+            return None
     except Exception as e:
         st.error(f"Database error: {str(e)}")
         return None
 
-def add_to_watchlist(user_id: str, product: dict, platform: str, search_query: str):
-    """Add product to user's watchlist"""
-    try:
-        # Check if item already exists
-        existing = supabase.table("watchlist").select("id").eq("user_id", user_id).eq("url", product["url"]).execute()
-        
-        if existing.data:
-            st.warning("This product is already in your watchlist!")
-            return False
-        
-        watchlist_item = {
-            "user_id": user_id,
-            "title": product["title"],
-            "url": product["url"],
-            "price": product["price"],
-            "rating": product["rating"],
-            "image_url": product["image_url"],
-            "platform": platform,
-            "search_query": search_query
-        }
-        
-        result = supabase.table("watchlist").insert(watchlist_item).execute()
-        if result.data:
-            return True
-        else:
-            st.error("Failed to add item to watchlist")
-            return False
-    except Exception as e:
-        st.error(f"Error adding to watchlist: {str(e)}")
-        return False
-    
-def get_user_watchlist(user_id: str):
-    """Get user's watchlist items"""
+def invalidate_user(email: str):
+    """Forget the cached user record, e.g. on sign-out"""
+    with _user_cache_lock:
+        _user_cache.pop(email, None)
+    st.session_state["user_record"] = None
+
+def _invalidate_watchlist_pages():
+    # The Watchlist page keeps loaded pages in the session until its filters change
+    st.session_state.pop("watchlist_filters", None)
+
+def _watchlist_row(user_id: str, product: dict, platform: str, search_query: str):
+    return {
+        "user_id": user_id,
+        "title": product["title"],
+        "url": product["url"],
+        "price": product["price"],
+        "price_value": parse_price_value(product["price"]),
+        "rating": product["rating"],
+        "image_url": product["image_url"],
+        "platform": platform,
+        "search_query": search_query
+    }
+
+def _insert_watchlist_rows(client, rows: list) -> dict:
+    # Runs off the script thread, so no Streamlit calls here; errors propagate through the future
+    result = client.table("watchlist").upsert(
+        rows,
+        on_conflict="user_id,url",
+        ignore_duplicates=True
+    ).execute()
+    # Only newly inserted rows are returned when duplicates are ignored
+    added = {row["url"] for row in result.data or []}
+    return {
+        "added": [row["url"] for row in rows if row["url"] in added],
+        "existing": [row["url"] for row in rows if row["url"] not in added],
+    }
+
+def add_to_watchlist_in_background(user_id: str, items: list, search_query: str):
+    """Start adding (product, platform) pairs to user's watchlist without waiting for the database.
+
+    Rows already in the watchlist are skipped by the (user_id, url) constraint.
+    Returns a concurrent future of {"added": [urls], "existing": [urls]}; it
+    raises if the write failed.
+    """
+    rows = {}
+    for product, platform in items:
+        rows.setdefault(product["url"], _watchlist_row(user_id, product, platform, search_query))
+
+    _invalidate_watchlist_pages()
+    future = submit(asyncio.to_thread(_insert_watchlist_rows, get_supabase(), list(rows.values())))
+    st.session_state.setdefault("watchlist_writes", []).append(future)
+    return future
+
+def wait_for_watchlist_writes(timeout: float = 5.0):
+    """Let this session's background watchlist adds land before the watchlist is read"""
+    writes = st.session_state.get("watchlist_writes")
+    if writes:
+        concurrent.futures.wait(writes, timeout=timeout)
+        st.session_state["watchlist_writes"] = [future for future in writes if not future.done()]
+
+def get_user_watchlist_page(user_id: str, cursor=None, limit: int = 20, sort: str = "newest",
+                            platforms=None, min_price=None, max_price=None,
+                            added_after=None, added_before=None, search=None):
+    """Get one page of user's watchlist items with keyset pagination.
+
+    Filtering and sorting run in the database. `cursor` is the value returned
+    for the previous page. Returns (items, next_cursor, total) where total is
+    only counted for the first page and next_cursor is None on the last page.
+    Sorting by price leaves out items without a parsed price.
+    """
+    column, descending = WATCHLIST_SORTS[sort]
     try:
-        result = supabase.table("watchlist").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
-        return result.data
+        query = get_supabase().table("watchlist").select(
+            WATCHLIST_COLUMNS, count="exact" if cursor is None else None
+        ).eq("user_id", user_id)
+
+        if platforms:
+            query = query.in_("platform", list(platforms))
+        if min_price is not None:
+            query = query.gte("price_value", min_price)
+        if max_price is not None:
+            query = query.lte("price_value", max_price)
+        if added_after is not None:
+            query = query.gte("created_at", str(added_after))
+        if added_before is not None:
+            query = query.lt("created_at", str(added_before))
+        if search:
+            query = query.ilike("title", f"%{search}%")
+        if column == "price_value":
+            query = query.not_.is_("price_value", "null")
+
+        if cursor is not None:
+            value, last_id = cursor
+            op = "lt" if descending else "gt"
+            query = query.or_(f'{column}.{op}."{value}",and({column}.eq."{value}",id.{op}.{last_id})')
+
+        result = query.order(column, desc=descending).order("id", desc=descending).limit(limit + 1).execute()
+        rows = result.data or []
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = (last[column], last["id"])
+        return rows, next_cursor, result.count
     except Exception as e:
         st.error(f"Error fetching watchlist: {str(e)}")
-        return []
+        return [], None, None
 
 def remove_from_watchlist(watchlist_id: str):
     """Remove item from watchlist"""
     try:
-        result = supabase.table("watchlist").delete().eq("id", watchlist_id).execute()
+        result = get_supabase().table("watchlist").delete().eq("id", watchlist_id).execute()
         return True
     except Exception as e:
         st.error(f"Error removing from watchlist: {str(e)}")
         return False
+
+def remove_many_from_watchlist(user_id: str, watchlist_ids: list):
+    """Remove many of a user's watchlist items in one request.
+
+    Returns {"removed": [ids], "missing": [ids]}, or None if the request failed.
+    """
+    if not watchlist_ids:
+        return {"removed": [], "missing": []}
+
+    try:
+        result = get_supabase().table("watchlist").delete().eq("user_id", user_id).in_("id", list(watchlist_ids)).execute()
+        removed = {str(row["id"]) for row in result.data or []}
+        return {
+            "removed": [item_id for item_id in watchlist_ids if str(item_id) in removed],
+            "missing": [item_id for item_id in watchlist_ids if str(item_id) not in removed],
+        }
+    except Exception as e:
+        st.error(f"Error removing from watchlist: {str(e)}")
+        return None
@@ -0,0 +1,30 @@
+import asyncio
+import threading
+import concurrent.futures
+import streamlit as st
+
+@st.cache_resource
+def get_event_loop():
+    """Start the process-wide background event loop shared by all sessions.
+
+    MCP sessions and other long-lived async resources are bound to the loop they
+    were opened on, so everything that reuses them has to run here instead of in
+    a fresh `asyncio.run` per rerun.
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name="tympli-event-loop", daemon=True)
+    thread.start()
+    return loop
+
+def submit(coro):
+    """Schedule a coroutine on the background loop and return a concurrent future"""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+def run_sync(coro, timeout=None):
+    """Run a coroutine on the background loop and block until it finishes"""
+    future = submit(coro)
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
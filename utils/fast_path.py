@@ -0,0 +1,236 @@
+import re
+import json
+import time
+import asyncio
+from urllib.parse import urlparse, parse_qs, unquote
+from utils.query_index import FILLER_WORDS, extract_constraints
+from utils.normalize import parse_price_value, parse_rating
+from utils.tool_memo import memoized
+from utils import tracing
+
+# Direct pipelines for the supported platforms. Platforms with a `search_tool`
+# are searched with it; the others go through `search_engine` restricted to the
+# platform's domain and then look up each product URL with `product_tool`.
+PLATFORM_PIPELINES = {
+    "Amazon": {
+        "domain": "amazon.com",
+        "search_tool": "web_data_amazon_product_search",
+        "search_arguments": {"keyword": "{keywords}", "url": "https://www.amazon.com"},
+        "product_tool": "web_data_amazon_product",
+        "product_url": r"/dp/[A-Z0-9]{10}",
+    },
+    "Walmart": {
+        "domain": "walmart.com",
+        "product_tool": "web_data_walmart_product",
+        "product_url": r"/ip/",
+    },
+    "Ebay": {
+        "domain": "ebay.com",
+        "product_tool": "web_data_ebay_product",
+        "product_url": r"/itm/",
+    },
+    "Target": {
+        "domain": "target.com",
+        "product_tool": "web_data_target_product",
+        "product_url": r"/-/A-\d+",
+    },
+}
+
+SEARCH_QUERY_TEMPLATE = "{keywords} site:{domain}"
+
+# Candidate field names in BrightData dataset records, in order of preference
+TITLE_FIELDS = ("title", "product_name", "name")
+URL_FIELDS = ("url", "product_url", "link")
+PRICE_FIELDS = ("final_price", "price", "current_price", "sale_price", "initial_price")
+CURRENCY_FIELDS = ("currency",)
+RATING_FIELDS = ("rating", "stars", "average_rating", "product_rating")
+REVIEWS_FIELDS = ("reviews_count", "review_count", "num_ratings", "ratings_count")
+IMAGE_FIELDS = ("image_url", "image", "main_image", "thumbnail", "images", "image_urls")
+
+CURRENCY_SYMBOLS = {"USD": "$", "EUR": "€", "GBP": "£"}
+
+_URL_PATTERN = re.compile(r"https?://[^\s)\]\"'<>]+")
+
+class FastPathError(Exception):
+    """The direct pipeline could not produce results; use the agent instead"""
+
+def search_keywords(query: str) -> str:
+    """Query text without price/rating phrases and filler words, in the user's word order"""
+    _, text = extract_constraints(query)
+    words = [word for word in re.findall(r"[a-z0-9$'-]+", text) if word not in FILLER_WORDS and word != "$"]
+    return " ".join(words)
+
+async def _call_tool(session, name, arguments):
+    async def timed_call():
+        # Only calls that reach the server are timed; memoized results are counted as tool_memo_hits
+        started = time.perf_counter()
+        error = True
+        try:
+            result = await session.call_tool(name, arguments)
+            error = bool(getattr(result, "isError", False))
+            return result
+        finally:
+            tracing.record_tool_call(name, time.perf_counter() - started, error)
+
+    return await memoized(name, arguments, timed_call)
+
+def _tool_text(result) -> str:
+    if getattr(result, "isError", False):
+        raise FastPathError(f"Tool returned an error: {_content_text(result)[:200]}")
+    return _content_text(result)
+
+def _content_text(result) -> str:
+    return "".join(getattr(item, "text", "") for item in result.content)
+
+def _parse_records(text: str):
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise FastPathError(f"Tool output is not JSON: {str(e)}")
+    if isinstance(data, dict):
+        # Some datasets wrap records, e.g. {"data": [...]} or a single product
+        for key in ("data", "results", "products", "items"):
+            if isinstance(data.get(key), list):
+                return data[key]
+        return [data]
+    if isinstance(data, list):
+        return data
+    raise FastPathError("Unexpected tool output")
+
+def _first(record: dict, fields):
+    for field in fields:
+        value = record.get(field)
+        if value not in (None, "", [], {}):
+            return value
+    return None
+
+def record_to_hit(record: dict):
+    """Convert one dataset record into a Hit dict, or None if it lacks a title or URL"""
+    title = _first(record, TITLE_FIELDS)
+    url = _first(record, URL_FIELDS)
+    if not title or not url:
+        return None
+
+    price = _first(record, PRICE_FIELDS)
+    if isinstance(price, dict):
+        price = _first(price, ("value", "amount", "price"))
+    if isinstance(price, (int, float)):
+        currency = _first(record, CURRENCY_FIELDS) or "USD"
+        price = f"{CURRENCY_SYMBOLS.get(currency, currency + ' ')}{price:,.2f}"
+
+    rating = _first(record, RATING_FIELDS)
+    reviews = _first(record, REVIEWS_FIELDS)
+    if rating is not None:
+        rating = f"{rating}"
+        if reviews is not None:
+            rating = f"{rating} ({reviews} reviews)"
+
+    image = _first(record, IMAGE_FIELDS)
+    if isinstance(image, list):
+        image = image[0] if image else None
+    if isinstance(image, dict):
+        image = _first(image, ("url", "src"))
+
+    return {
+        "title": str(title).strip(),
+        "url": str(url),
+        "price": str(price) if price is not None else "",
+        "rating": rating or "",
+        "image_url": str(image) if image else "No Image URL Available",
+    }
+
+def extract_product_urls(text: str, domain: str, product_url: str, limit: int):
+    """Find distinct product page URLs for `domain` in search engine output"""
+    urls = []
+    for url in _URL_PATTERN.findall(text):
+        parsed = urlparse(url)
+        # Unwrap Google redirect links
+        if parsed.path == "/url" and "q" in parse_qs(parsed.query):
+            url = unquote(parse_qs(parsed.query)["q"][0])
+            parsed = urlparse(url)
+        # The platform's domain or a subdomain of it, not "notamazon.com"; hostname drops any port
+        host = (parsed.hostname or "").rstrip(".")
+        if not (host == domain or host.endswith("." + domain)) or not re.search(product_url, parsed.path):
+            continue
+        url = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+        if url not in urls:
+            urls.append(url)
+        if len(urls) >= limit:
+            break
+    return urls
+
+def matches_constraints(hit: dict, constraints) -> bool:
+    """Check a hit against price/rating constraint tokens; unknown values pass"""
+    for constraint in constraints:
+        field, op, bound = re.match(r"(price|rating)(<=|>=)([\d.]+)", constraint).groups()
+        value = parse_price_value(hit[field]) if field == "price" else parse_rating(hit[field])["value"]
+        if value is None:
+            continue
+        if op == "<=" and value > float(bound):
+            return False
+        if op == ">=" and value < float(bound):
+            return False
+    return True
+
+async def lookup_product(session, tool: str, url: str) -> list:
+    """Dataset records for one product URL from a `web_data_*_product` tool.
+
+    Raises FastPathError when the tool reports an error or its output isn't JSON.
+    """
+    return _parse_records(_tool_text(await _call_tool(session, tool, {"url": url})))
+
+async def _lookup_products(session, tool, urls):
+    async def lookup(url):
+        try:
+            records = await lookup_product(session, tool, url)
+        except FastPathError as e:
+            tracing.record_error("fast_path.lookup", e, url=url)
+            return []
+        return records
+
+    batches = await asyncio.gather(*(lookup(url) for url in urls))
+    return [record for batch in batches for record in batch]
+
+async def run_fast_path(session, tool_names, query: str, platform: str, max_products: int = 5):
+    """Search a known platform by calling MCP tools directly, without the LLM.
+
+    Returns a ProductSearchResponse-shaped dict. Raises FastPathError when the
+    platform is unknown, a needed tool is missing or the output can't be parsed.
+    """
+    pipeline = PLATFORM_PIPELINES.get(platform)
+    if pipeline is None:
+        raise FastPathError(f"No direct pipeline for {platform}")
+
+    constraints, _ = extract_constraints(query)
+    keywords = search_keywords(query)
+    if not keywords:
+        raise FastPathError("Query has no keywords")
+
+    search_tool = pipeline.get("search_tool")
+    if search_tool in tool_names:
+        arguments = {name: value.format(keywords=keywords) for name, value in pipeline["search_arguments"].items()}
+        records = _parse_records(_tool_text(await _call_tool(session, search_tool, arguments)))
+    elif pipeline["product_tool"] in tool_names and "search_engine" in tool_names:
+        search_query = SEARCH_QUERY_TEMPLATE.format(keywords=keywords, domain=pipeline["domain"])
+        serp = _tool_text(await _call_tool(session, "search_engine", {"query": search_query}))
+        urls = extract_product_urls(serp, pipeline["domain"], pipeline["product_url"], max_products)
+        if not urls:
+            raise FastPathError(f"No {platform} product URLs in search results")
+        records = await _lookup_products(session, pipeline["product_tool"], urls)
+    else:
+        raise FastPathError(f"MCP server has no tools for a direct {platform} search")
+
+    hits = []
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        hit = record_to_hit(record)
+        if hit and matches_constraints(hit, constraints):
+            hits.append(hit)
+        if len(hits) >= max_products:
+            break
+
+    if not hits:
+        raise FastPathError(f"No usable {platform} products in tool output")
+
+    return {"platforms": [{"platform": platform, "hits": hits}]}
@@ -0,0 +1,275 @@
+import os
+import io
+import time
+import asyncio
+import socket
+import hashlib
+import ipaddress
+import threading
+import concurrent.futures
+from urllib.parse import urlparse
+import httpx
+import streamlit as st
+from PIL import Image
+from utils.config import get_setting
+from utils.event_loop import submit
+from utils import tracing
+
+IMAGE_CACHE_DIR = get_setting("IMAGE_CACHE_DIR", ".cache/thumbnails")
+IMAGE_CACHE_MAX_BYTES = get_setting("IMAGE_CACHE_MAX_BYTES", 200 * 1024 * 1024, int)
+IMAGE_NEGATIVE_TTL_SECONDS = get_setting("IMAGE_NEGATIVE_TTL_SECONDS", 6 * 3600.0, float)
+# Timeouts, connection errors, 5xx and 429 are retried much sooner than permanent failures
+IMAGE_RETRY_TTL_SECONDS = get_setting("IMAGE_RETRY_TTL_SECONDS", 300.0, float)
+IMAGE_FETCH_TIMEOUT_SECONDS = get_setting("IMAGE_FETCH_TIMEOUT_SECONDS", 5.0, float)
+IMAGE_PREFETCH_CONCURRENCY = get_setting("IMAGE_PREFETCH_CONCURRENCY", 8, int)
+IMAGE_PREFETCH_WAIT_SECONDS = get_setting("IMAGE_PREFETCH_WAIT_SECONDS", 2.0, float)
+THUMBNAIL_SIZE = (200, 200)
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+MAX_REDIRECTS = 5
+
+def is_image_url(url) -> bool:
+    return bool(url) and url.startswith(("http://", "https://"))
+
+class UnsafeImageURLError(ValueError):
+    """The image URL is not http(s) or points at a private, loopback, link-local or reserved address"""
+
+async def check_public_url(url: str) -> str:
+    """Raise UnsafeImageURLError unless `url` is http(s) and every address its host resolves to is public.
+
+    Image URLs come from scraped pages and the model, so the server must not be
+    made to request internal services or cloud metadata endpoints with them.
+    Returns one of the checked addresses, which the request must connect to so
+    a second DNS lookup can't swap in a private one.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise UnsafeImageURLError(f"not an http(s) URL: {url}")
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            parsed.hostname, parsed.port or (443 if parsed.scheme == "https" else 80), type=socket.SOCK_STREAM
+        )
+    except socket.gaierror as e:
+        raise UnsafeImageURLError(f"cannot resolve {parsed.hostname}: {str(e)}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if getattr(address, "ipv4_mapped", None):
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise UnsafeImageURLError(f"{parsed.hostname} resolves to non-public address {address}")
+    return str(ipaddress.ip_address(infos[0][4][0].split("%")[0]))
+
+def is_permanent_failure(error: BaseException) -> bool:
+    """False for failures worth retrying soon: timeouts, connection errors, 5xx, 408 and 429"""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return 400 <= status < 500 and status not in (408, 429)
+    return not isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+class ImageCache:
+    """Thumbnails of remote product images on disk, keyed by URL hash.
+
+    Thumbnails are JPEGs of at most THUMBNAIL_SIZE. Reading one refreshes its
+    modification time, and the least recently used files are evicted once the
+    directory grows past `max_bytes`. URLs that fail get an empty marker file:
+    permanent failures (4xx, blocked hosts, not an image) are not retried for
+    `negative_ttl_seconds`, transient ones only for `retry_ttl_seconds`.
+    Prefetches that ask for a URL already being downloaded wait for that
+    download instead of starting another.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, negative_ttl_seconds: float,
+                 retry_ttl_seconds: float = IMAGE_RETRY_TTL_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.retry_ttl_seconds = retry_ttl_seconds
+        self._lock = threading.Lock()
+        # URL -> future resolved when its running download finishes
+        self._in_flight = {}
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def _path(self, url: str, suffix: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest() + suffix)
+
+    def get(self, url: str):
+        """Cached thumbnail bytes, or None if the URL has not been fetched yet"""
+        path = self._path(url, ".jpg")
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def is_dead(self, url: str) -> bool:
+        """Whether the URL failed recently and should not be fetched or shown"""
+        for suffix, ttl in ((".miss", self.negative_ttl_seconds), (".retry", self.retry_ttl_seconds)):
+            try:
+                if time.time() - os.path.getmtime(self._path(url, suffix)) < ttl:
+                    return True
+            except OSError:
+                pass
+        return False
+
+    def _store(self, url: str, data: bytes, suffix: str):
+        path = self._path(url, suffix)
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+        with self._lock:
+            self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Caller holds the lock; trim to 90% so eviction doesn't run on every write
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.is_file() and not entry.name.endswith(".tmp")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        self._size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._size -= size
+            except OSError:
+                pass
+
+    async def fetch(self, client: httpx.AsyncClient, url: str):
+        """Download one image, store its thumbnail and return the bytes (None on failure)"""
+        try:
+            content = await download_image(client, url)
+            data = await asyncio.to_thread(make_thumbnail, content)
+        except Exception as e:
+            tracing.record_error("image.fetch", e, url=url, permanent=is_permanent_failure(e))
+            await asyncio.to_thread(self._store, url, b"", ".miss" if is_permanent_failure(e) else ".retry")
+            return None
+        await asyncio.to_thread(self._store, url, data, ".jpg")
+        return data
+
+    async def prefetch(self, urls, concurrency: int = IMAGE_PREFETCH_CONCURRENCY):
+        """Fetch every URL that is neither cached nor known dead, `concurrency` at a time"""
+        pending = list(dict.fromkeys(
+            url for url in urls
+            if is_image_url(url) and not os.path.exists(self._path(url, ".jpg")) and not self.is_dead(url)
+        ))
+        if not pending:
+            return
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            running = [self._in_flight[url] for url in pending if url in self._in_flight]
+            started = {url: loop.create_future() for url in pending if url not in self._in_flight}
+            self._in_flight.update(started)
+        slots = asyncio.Semaphore(concurrency)
+
+        def finish(url):
+            with self._lock:
+                if self._in_flight.get(url) is started[url]:
+                    del self._in_flight[url]
+            if not started[url].done():
+                started[url].set_result(None)
+
+        async def fetch_one(client, url):
+            try:
+                async with slots:
+                    await self.fetch(client, url)
+            finally:
+                finish(url)
+
+        try:
+            if started:
+                # Redirects are followed by download_image, which checks every hop. Requests go to
+                # IP addresses, so keep-alive is off: a pooled connection is keyed by IP and could
+                # otherwise carry another host's request over a TLS session made for the first.
+                async with httpx.AsyncClient(timeout=IMAGE_FETCH_TIMEOUT_SECONDS, follow_redirects=False,
+                                             limits=httpx.Limits(max_keepalive_connections=0),
+                                             headers={"User-Agent": "Mozilla/5.0 (compatible; Tympli)"}) as client:
+                    await asyncio.gather(*(fetch_one(client, url) for url in started))
+        finally:
+            for url in started:
+                finish(url)
+        # Shielded so a waiter giving up doesn't cancel the download for the others
+        await asyncio.gather(*(asyncio.shield(future) for future in running))
+
+async def download_image(client: httpx.AsyncClient, url: str) -> bytes:
+    """Image bytes at `url`, following redirects only to public http(s) addresses and
+    reading at most MAX_SOURCE_BYTES.
+
+    Each request connects to the address check_public_url validated, with the
+    original host in the Host header and TLS SNI (and certificate check).
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        address = await check_public_url(url)
+        target = httpx.URL(url)
+        async with client.stream(
+            "GET", target.copy_with(host=address), headers={"Host": target.netloc.decode("ascii")},
+            extensions={"sni_hostname": target.host} if target.scheme == "https" else {},
+        ) as response:
+            if response.is_redirect:
+                url = str(target.join(response.headers["location"]))
+                continue
+            response.raise_for_status()
+            if int(response.headers.get("content-length") or 0) > MAX_SOURCE_BYTES:
+                raise ValueError(f"image is {response.headers['content-length']} bytes")
+            content = bytearray()
+            async for chunk in response.aiter_bytes():
+                content.extend(chunk)
+                if len(content) > MAX_SOURCE_BYTES:
+                    raise ValueError(f"image is larger than {MAX_SOURCE_BYTES} bytes")
+            return bytes(content)
+    raise ValueError(f"more than {MAX_REDIRECTS} redirects")
+
+def make_thumbnail(data: bytes) -> bytes:
+    """Downscale image bytes to a JPEG no larger than THUMBNAIL_SIZE"""
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft("RGB", THUMBNAIL_SIZE)
+        image.thumbnail(THUMBNAIL_SIZE)
+        if image.mode != "RGB":
+            background = Image.new("RGB", image.size, "white")
+            image = image.convert("RGBA")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=85, optimize=True)
+        return output.getvalue()
+
+@st.cache_resource
+def get_image_cache():
+    """Process-wide thumbnail cache shared by the search and watchlist pages"""
+    return ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, IMAGE_NEGATIVE_TTL_SECONDS, IMAGE_RETRY_TTL_SECONDS)
+
+def prefetch_images(urls, wait: float = IMAGE_PREFETCH_WAIT_SECONDS):
+    """Start fetching thumbnails on the background loop and wait up to `wait` seconds.
+
+    Fetches still running after that keep going, so later reruns find them cached.
+    """
+    future = submit(get_image_cache().prefetch(urls))
+    try:
+        future.result(wait)
+    except concurrent.futures.TimeoutError:
+        pass
+    except Exception as e:
+        tracing.record_error("image.prefetch", e)
+
+def show_thumbnail(url, width: int = 100):
+    """Render a cached thumbnail, falling back to the remote image or a placeholder"""
+    if not is_image_url(url):
+        st.markdown("📦")
+        return
+
+    cache = get_image_cache()
+    data = cache.get(url)
+    if data is not None:
+        st.image(data, width=width)
+    elif cache.is_dead(url):
+        st.markdown("📦")
+    else:
+        # Not fetched yet; let the browser load it this once
+        st.image(url, width=width)
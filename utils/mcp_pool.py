@@ -0,0 +1,245 @@
+import asyncio
+import time
+import contextvars
+from contextlib import asynccontextmanager
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+from langchain_mcp_adapters.tools import load_mcp_tools
+from utils.tool_memo import memoized
+from utils import tracing
+
+# Session checked out by the current task, used by the pool-wide tools
+_current_session = contextvars.ContextVar("mcp_current_session", default=None)
+
+class _SessionProxy:
+    """Forward calls to the MCP session checked out by the current task.
+
+    Tools are loaded once per pool against this proxy, so the tool list and the
+    compiled agent can be shared by every connection in the pool.
+    """
+
+    def __getattr__(self, name):
+        return getattr(self._session(), name)
+
+    def _session(self):
+        session = _current_session.get()
+        if session is None:
+            raise RuntimeError("No MCP session checked out - use MCPSessionPool.acquire()")
+        return session
+
+    async def call_tool(self, name, arguments=None, **kwargs):
+        # The agent's tool calls go through the shared memo, like the fast path's
+        session = self._session()
+        if kwargs:
+            return await session.call_tool(name, arguments, **kwargs)
+        return await memoized(name, arguments or {}, lambda: session.call_tool(name, arguments))
+
+class PooledConnection:
+    """One initialized MCP ClientSession kept open by its own owner task"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.session = None
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.last_checked = self.created_at
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._error = None
+        self._task = None
+
+    @property
+    def alive(self):
+        return self.session is not None and not self._closing.is_set()
+
+    async def open(self, timeout: float):
+        """Connect and initialize the session, raising if it fails"""
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            raise
+        if self._error is not None:
+            raise self._error
+
+    async def _run(self):
+        # The transport's task group must be entered and exited by the same task,
+        # so the connection lives here until close() is requested.
+        try:
+            async with streamablehttp_client(self.url) as (read_stream, write_stream, _):
+                async with ClientSession(read_stream, write_stream) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set()
+                    await self._closing.wait()
+        except Exception as e:
+            self._error = e
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def ping(self, timeout: float):
+        """Return True if the server still answers on this session"""
+        if not self.alive:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout)
+            self.last_checked = time.monotonic()
+            return True
+        except Exception as e:
+            tracing.record_error("mcp.health_check", e)
+            return False
+
+    async def close(self, timeout: float = 5.0):
+        self._closing.set()
+        if self._task is None or self._task.done():
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except Exception:
+            self._task.cancel()
+
+class MCPSessionPool:
+    """Pool of long-lived MCP sessions with health checks and idle eviction.
+
+    Connections are checked out exclusively for the duration of one agent run.
+    One whose use ended in an exception or a cancellation (a timed-out attempt,
+    the losing hedge) may have a request half-finished on its stream, so it is
+    closed instead of going back to the idle pool. The tool list and the
+    compiled agent are built once and shared by every connection through
+    `_SessionProxy`.
+    """
+
+    def __init__(self, url_factory, agent_factory, max_size=4, idle_timeout=300.0,
+                 health_check_interval=60.0, connect_timeout=30.0, ping_timeout=10.0):
+        self.url_factory = url_factory
+        self.agent_factory = agent_factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.connect_timeout = connect_timeout
+        self.ping_timeout = ping_timeout
+
+        self.tools = None
+        self.agent = None
+        self.stats = {"connects": 0, "reconnects": 0, "evictions": 0, "checkouts": 0, "discards": 0}
+
+        self._idle = []
+        self._loop = None
+        self._slots = None
+        self._setup_lock = None
+        self._reaper = None
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_size)
+            self._setup_lock = asyncio.Lock()
+            self._reaper = loop.create_task(self._reap_idle())
+        elif self._loop is not loop:
+            raise RuntimeError("MCP session pool is bound to the background event loop - use utils.event_loop.run_sync")
+
+    async def _connect(self):
+        conn = PooledConnection(self.url_factory())
+        started = time.perf_counter()
+        await conn.open(self.connect_timeout)
+        seconds = time.perf_counter() - started
+        tracing.record("mcp_connect_seconds", seconds)
+        tracing.metrics.observe("mcp.connect_ms", seconds * 1000)
+        self.stats["connects"] += 1
+        return conn
+
+    async def _checkout(self):
+        while self._idle:
+            conn = self._idle.pop()
+            if not conn.alive:
+                self.stats["reconnects"] += 1
+                await conn.close()
+                continue
+            if time.monotonic() - conn.last_checked > self.health_check_interval:
+                if not await conn.ping(self.ping_timeout):
+                    self.stats["reconnects"] += 1
+                    await conn.close()
+                    continue
+            return conn
+        return await self._connect()
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Check out a healthy session for the current task"""
+        self._bind_loop()
+        started = time.perf_counter()
+        await self._slots.acquire()
+        try:
+            conn = await self._checkout()
+        except BaseException:
+            self._slots.release()
+            raise
+        tracing.record("mcp_checkout_seconds", time.perf_counter() - started)
+
+        self.stats["checkouts"] += 1
+        token = _current_session.set(conn.session)
+        finished = False
+        try:
+            yield conn
+            finished = True
+        finally:
+            _current_session.reset(token)
+            conn.last_used = time.monotonic()
+            try:
+                if finished and conn.alive:
+                    self._idle.append(conn)
+                else:
+                    # Don't hand a session with a half-finished exchange to the next caller
+                    self.stats["discards"] += 1
+                    await conn.close()
+            finally:
+                self._slots.release()
+
+    async def get_tools(self):
+        """Return the pool's LangChain tools, loading them on first use.
+
+        Must be called while a session is checked out.
+        """
+        if self.tools is None:
+            async with self._setup_lock:
+                if self.tools is None:
+                    self.tools = await load_mcp_tools(_SessionProxy())
+        return self.tools
+
+    async def get_agent(self):
+        """Return the pool's compiled agent, building it on first use.
+
+        Must be called while a session is checked out.
+        """
+        if self.agent is None:
+            tools = await self.get_tools()
+            async with self._setup_lock:
+                if self.agent is None:
+                    self.agent = self.agent_factory(tools)
+        return self.agent
+
+    async def _reap_idle(self):
+        interval = max(1.0, self.idle_timeout / 2)
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for conn in list(self._idle):
+                if now - conn.last_used <= self.idle_timeout and conn.alive:
+                    continue
+                # Skip connections checked out while we were closing others
+                if conn in self._idle:
+                    self._idle.remove(conn)
+                    self.stats["evictions"] += 1
+                    await conn.close()
+
+    async def close(self):
+        """Close every idle connection and stop the idle reaper"""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            await conn.close()
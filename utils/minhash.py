@@ -0,0 +1,94 @@
+import hashlib
+from collections import defaultdict
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+def _hash32(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=4).digest(), "little")
+
+def jaccard(a: set, b: set) -> float:
+    """Exact Jaccard similarity of two sets"""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+class MinHasher:
+    """Compute MinHash signatures of shingle sets with `num_perm` universal hash functions"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        self.num_perm = num_perm
+        generator = np.random.RandomState(seed)
+        self._a = generator.randint(1, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+
+    def signature(self, shingles) -> np.ndarray:
+        if not shingles:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        values = np.fromiter((_hash32(s) for s in shingles), dtype=np.uint64, count=len(shingles))
+        # One row per shingle, one column per permutation; uint64 overflow wraps like the reference implementation
+        permuted = np.bitwise_and((values[:, None] * self._a + self._b) % _MERSENNE_PRIME, _MAX_HASH)
+        return permuted.min(axis=0)
+
+    @staticmethod
+    def estimate(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+        """Estimate Jaccard similarity from two signatures"""
+        return float(np.count_nonzero(sig_a == sig_b)) / len(sig_a)
+
+class LSHIndex:
+    """Banded locality-sensitive hashing over MinHash signatures.
+
+    Keys whose signatures agree on every row of at least one band become
+    candidates of each other. `namespace` partitions the index so only keys in
+    the same namespace (e.g. the same platform) are ever compared.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets = defaultdict(set)
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _band_keys(self, signature, namespace):
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            yield (namespace, band, chunk.tobytes())
+
+    def add(self, key, signature, namespace=""):
+        if key in self._entries:
+            self.remove(key)
+        self._entries[key] = (namespace, signature)
+        for band_key in self._band_keys(signature, namespace):
+            self._buckets[band_key].add(key)
+
+    def remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        namespace, signature = entry
+        for band_key in self._band_keys(signature, namespace):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def signature_of(self, key):
+        entry = self._entries.get(key)
+        return entry[1] if entry else None
+
+    def candidates(self, signature, namespace=""):
+        """Return keys sharing at least one band with `signature`"""
+        found = set()
+        for band_key in self._band_keys(signature, namespace):
+            found.update(self._buckets.get(band_key, ()))
+        return found
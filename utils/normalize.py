@@ -0,0 +1,197 @@
+import re
+import numpy as np
+import pandas as pd
+from utils.query_index import SIZE_PATTERN, normalize_size
+
+CURRENCY_CODES = {"$": "USD", "US$": "USD", "USD": "USD", "€": "EUR", "EUR": "EUR", "£": "GBP", "GBP": "GBP",
+                  "C$": "CAD", "CAD": "CAD", "A$": "AUD", "AUD": "AUD"}
+_CURRENCY = r"US\$|C\$|A\$|[$€£]|\b(?:USD|EUR|GBP|CAD|AUD)\b"
+# Currencies written after the amount, as in "19,99 €" or "20 USD"
+_SUFFIX_CURRENCY = r"[€£]|\b(?:USD|EUR|GBP|CAD|AUD)\b"
+_CURRENCY_PATTERN = re.compile(_CURRENCY)
+_AMOUNT_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+_PRICED_AMOUNT_PATTERN = re.compile(
+    rf"(?:{_CURRENCY})\s*(?P<before>\d+(?:\.\d+)?)|(?P<after>\d+(?:\.\d+)?)\s*(?:{_SUFFIX_CURRENCY})"
+)
+_RANGE_PATTERN = re.compile(
+    rf"(?P<cur1>{_CURRENCY})?\s*(?P<low>\d+(?:\.\d+)?)\s*(?:-|–|to)\s*(?P<cur2>{_CURRENCY})?\s*(?P<high>\d+(?:\.\d+)?)(?:\s*(?P<cur3>{_SUFFIX_CURRENCY}))?",
+    re.IGNORECASE,
+)
+_WAS_PATTERN = re.compile(
+    r"\b(?:was|list(?:\s+price)?|reg(?:ular)?(?:\s+price)?|msrp|orig(?:inal)?(?:\s+price)?)\b[:\s]*(?:US\$|C\$|A\$|[$€£])?\s*(?P<amount>\d+(?:\.\d+)?)",
+    re.IGNORECASE,
+)
+_RATING_SCALE_PATTERN = re.compile(r"(?P<value>\d+(?:\.\d+)?)\s*(?:out\s+of|/)\s*(?P<scale>\d+)", re.IGNORECASE)
+_REVIEWS_PATTERN = re.compile(r"(?P<count>\d+(?:\.\d+)?)\s*(?P<unit>k)?\+?\s*(?:reviews?|ratings?|global ratings)", re.IGNORECASE)
+
+# Ratings with few reviews are pulled towards PRIOR_RATING as if it had PRIOR_REVIEWS votes
+PRIOR_RATING = 3.5
+PRIOR_REVIEWS = 20
+
+# Sort options for the results view: label -> (column, ascending)
+RESULT_SORTS = {
+    "Relevance": ("rank", True),
+    "Price: low to high": ("amount", True),
+    "Price: high to low": ("amount", False),
+    "Top rated": ("rating_score", False),
+    "Most reviewed": ("review_count", False),
+    "Biggest discount": ("discount_percent", False),
+}
+
+def _clean(text) -> str:
+    """Drop thousands separators, treating "12,50" and "1.299,99" as decimal commas"""
+    text = str(text or "")
+    text = re.sub(r"\b(\d{1,3}(?:\.\d{3})+),(\d{2})\b", lambda m: m.group(1).replace(".", "") + "." + m.group(2), text)
+    text = re.sub(r"(\d),(\d{2})(?!\d)", r"\1.\2", text)
+    return text.replace(",", "")
+
+def parse_price(price) -> dict:
+    """Parse a free-form price string into amount, currency, range high and was-price.
+
+    "$1,299.99" -> amount 1299.99 USD; "$10 - $20" -> amount 10, high 20;
+    "$30 (was $45)" -> amount 30, was 45. When the string has a currency, only
+    amounts next to it count, so "2 for $10" -> 10 and "$19.99 - 2 Pack" -> 19.99
+    with no range. Unparseable parts are None.
+    """
+    text = _clean(price)
+    currency_match = _CURRENCY_PATTERN.search(text)
+    parsed = {
+        "amount": None,
+        "currency": CURRENCY_CODES[currency_match.group()] if currency_match else None,
+        "high": None,
+        "was": None,
+    }
+
+    was = _WAS_PATTERN.search(text)
+    if was:
+        parsed["was"] = float(was.group("amount"))
+        # The current price is whatever number is left once the was-price is removed
+        text = text[:was.start()] + text[was.end():]
+
+    priced = _CURRENCY_PATTERN.search(text) is not None
+    for price_range in _RANGE_PATTERN.finditer(text):
+        low, high = float(price_range.group("low")), float(price_range.group("high"))
+        # "$10 - $20", or "$10 - 20" where the second number can only be the high end
+        both_priced = price_range.group("cur1") and price_range.group("cur2")
+        if priced and not (price_range.group("cur1") or price_range.group("cur3")):
+            continue
+        if both_priced or high >= low:
+            parsed["amount"], parsed["high"] = min(low, high), max(low, high)
+            break
+    else:
+        amount = (_PRICED_AMOUNT_PATTERN if priced else _AMOUNT_PATTERN).search(text)
+        if amount:
+            parsed["amount"] = float(amount.group("before") or amount.group("after") if priced else amount.group())
+
+    if parsed["was"] is not None and parsed["amount"] is None:
+        # Only a was-price, e.g. "Was $45": treat it as the price
+        parsed["amount"], parsed["was"] = parsed["was"], None
+    return parsed
+
+def parse_price_value(price):
+    """Numeric amount of a free-form price string, e.g. "$1,299.99" -> 1299.99"""
+    if not price:
+        return None
+    return parse_price(price)["amount"]
+
+def parse_rating(rating) -> dict:
+    """Parse a free-form rating string into a 0-5 value and a review count.
+
+    "4.5 out of 5 (1,234 reviews)" -> 4.5 and 1234; "9/10" -> 4.5; "4.2 (3.1k ratings)" -> 4.2 and 3100.
+    """
+    text = _clean(rating)
+    parsed = {"value": None, "reviews": None}
+
+    reviews = _REVIEWS_PATTERN.search(text)
+    if reviews:
+        count = float(reviews.group("count")) * (1000 if reviews.group("unit") else 1)
+        parsed["reviews"] = int(count)
+        text = text[:reviews.start()] + text[reviews.end():]
+    else:
+        # "4.5 (1234)": a bare number in parentheses is the review count
+        bracketed = re.search(r"\((\d+)\)", text)
+        if bracketed:
+            parsed["reviews"] = int(bracketed.group(1))
+            text = text[:bracketed.start()] + text[bracketed.end():]
+
+    scaled = _RATING_SCALE_PATTERN.search(text)
+    if scaled and float(scaled.group("scale")) > 0:
+        parsed["value"] = float(scaled.group("value")) / float(scaled.group("scale")) * 5
+    else:
+        value = _AMOUNT_PATTERN.search(text)
+        if value and float(value.group()) <= 5:
+            parsed["value"] = float(value.group())
+    return parsed
+
+def normalize_results(platforms: list) -> pd.DataFrame:
+    """One row per hit across all platform blocks, with parsed numeric columns.
+
+    Keeps the original string fields for display and adds amount, currency,
+    price_high, was_price, discount_percent, rating_value, review_count,
+    rating_score (rating shrunk towards PRIOR_RATING for items with few
+    reviews) and rank (position within its platform's results).
+    """
+    rows = []
+    for block in platforms:
+        for rank, hit in enumerate(block["hits"]):
+            price = parse_price(hit.get("price"))
+            rating = parse_rating(hit.get("rating"))
+            rows.append({
+                "platform": block["platform"],
+                "title": hit.get("title", ""),
+                "url": hit.get("url", ""),
+                "price": hit.get("price", ""),
+                "rating": hit.get("rating", ""),
+                "image_url": hit.get("image_url", ""),
+                "amount": price["amount"],
+                "currency": price["currency"],
+                "price_high": price["high"],
+                "was_price": price["was"],
+                "rating_value": rating["value"],
+                "review_count": rating["reviews"],
+                "rank": rank,
+            })
+
+    frame = pd.DataFrame(rows, columns=[
+        "platform", "title", "url", "price", "rating", "image_url", "amount", "currency",
+        "price_high", "was_price", "rating_value", "review_count", "rank",
+    ])
+    for column in ("amount", "price_high", "was_price", "rating_value", "review_count"):
+        frame[column] = pd.to_numeric(frame[column], errors="coerce").astype(float)
+
+    frame["discount_percent"] = np.where(
+        frame["was_price"] > frame["amount"], (frame["was_price"] - frame["amount"]) / frame["was_price"] * 100, np.nan
+    )
+
+    # Bayesian average: a 5.0 from 3 reviews shouldn't outrank a 4.7 from 3,000
+    reviews = frame["review_count"].fillna(0)
+    frame["rating_score"] = (frame["rating_value"] * reviews + PRIOR_RATING * PRIOR_REVIEWS) / (reviews + PRIOR_REVIEWS)
+    return frame
+
+def filter_results(frame: pd.DataFrame, platforms=None, min_price=None, max_price=None, min_rating=None,
+                   brand=None, size=None) -> pd.DataFrame:
+    """Rows matching every given filter; hits without a price or rating fail that filter.
+
+    `brand` must appear in the title. `size` only rules out titles that name a
+    different size, since most titles don't mention one.
+    """
+    mask = np.ones(len(frame), dtype=bool)
+    if brand:
+        mask &= frame["title"].str.contains(rf"\b{re.escape(brand)}\b", case=False, regex=True, na=False).to_numpy()
+    if size:
+        sizes = frame["title"].str.lower().str.extract(SIZE_PATTERN)[0].map(normalize_size, na_action="ignore")
+        mask &= (sizes.isna() | (sizes == size)).to_numpy()
+    if platforms:
+        mask &= frame["platform"].isin(platforms).to_numpy()
+    if min_price is not None:
+        mask &= (frame["amount"] >= min_price).to_numpy()
+    if max_price is not None:
+        mask &= (frame["amount"] <= max_price).to_numpy()
+    if min_rating:
+        mask &= (frame["rating_value"] >= min_rating).to_numpy()
+    return frame[mask]
+
+def sort_results(frame: pd.DataFrame, sort: str) -> pd.DataFrame:
+    """Sort by one of RESULT_SORTS, keeping rows without the sort value last"""
+    column, ascending = RESULT_SORTS.get(sort, RESULT_SORTS["Relevance"])
+    return frame.sort_values([column, "rank"], ascending=[ascending, True], na_position="last", kind="stable")
@@ -0,0 +1,278 @@
+"""Latency- and failure-aware scheduling of per-platform searches.
+
+Keeps a rolling window of latencies and outcomes per platform and uses it to:
+
+- order work: with limited concurrency the slowest platforms start first, so
+  they don't also queue behind the fast ones;
+- time out each attempt at a multiple of the platform's p95 instead of one
+  fixed limit for every platform;
+- retry transient failures (timeouts, connection and rate-limit errors) with
+  exponential backoff and jitter, but not errors a retry won't fix;
+- hedge: start a second attempt once the first has run past the platform's
+  p95, and take whichever finishes first;
+- trip a circuit breaker after repeated failures, so a platform that is down
+  is skipped for a cooldown period and then probed with a single request.
+"""
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+import numpy as np
+from utils.config import get_setting
+from utils.tool_memo import fresh_tool_calls
+from utils import tracing
+
+SCHEDULER_WINDOW = get_setting("SCHEDULER_WINDOW", 200, int)
+SCHEDULER_MIN_SAMPLES = get_setting("SCHEDULER_MIN_SAMPLES", 10, int)
+ADAPTIVE_TIMEOUT_MULTIPLIER = get_setting("ADAPTIVE_TIMEOUT_MULTIPLIER", 2.0, float)
+ADAPTIVE_TIMEOUT_MIN_SECONDS = get_setting("ADAPTIVE_TIMEOUT_MIN_SECONDS", 15.0, float)
+RETRY_ATTEMPTS = get_setting("RETRY_ATTEMPTS", 2, int)
+RETRY_BACKOFF_SECONDS = get_setting("RETRY_BACKOFF_SECONDS", 0.5, float)
+HEDGING_ENABLED = get_setting("HEDGING_ENABLED", True, bool)
+BREAKER_FAILURE_THRESHOLD = get_setting("BREAKER_FAILURE_THRESHOLD", 5, int)
+BREAKER_COOLDOWN_SECONDS = get_setting("BREAKER_COOLDOWN_SECONDS", 60.0, float)
+
+# Exception class names (anywhere in the MRO) worth retrying: network trouble,
+# server overload and rate limits from httpx, openai, anyio and the MCP client
+TRANSIENT_ERRORS = {
+    "TimeoutError", "ConnectionError", "TransportError", "TimeoutException", "NetworkError", "RemoteProtocolError",
+    "APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError",
+    "ClosedResourceError", "BrokenResourceError", "EndOfStream",
+}
+
+class PlatformUnavailableError(Exception):
+    """The platform's circuit breaker is open; the search was not attempted"""
+
+def is_transient(error: BaseException) -> bool:
+    """True for transport, timeout, rate-limit and 5xx failures, which a retry may fix.
+
+    Exception groups count if any member is transient.
+    """
+    if isinstance(error, BaseExceptionGroup):
+        return any(is_transient(member) for member in error.exceptions)
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int) and (status == 429 or status >= 500):
+        return True
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+class PlatformState:
+    """Rolling statistics and circuit breaker state of one platform"""
+
+    def __init__(self, window: int):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.open_until = None
+        self.probing = False
+        self.counters = {"attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "timeouts": 0, "rejected": 0}
+
+class PlatformScheduler:
+    """Shared per-platform statistics driving timeouts, retries, hedging and circuit breaking.
+
+    Searches run on the background event loop; the lock only guards the
+    statistics against the Metrics page reading them from a script thread.
+    """
+
+    def __init__(self, window: int = SCHEDULER_WINDOW, min_samples: int = SCHEDULER_MIN_SAMPLES,
+                 timeout_multiplier: float = ADAPTIVE_TIMEOUT_MULTIPLIER, min_timeout: float = ADAPTIVE_TIMEOUT_MIN_SECONDS,
+                 retries: int = RETRY_ATTEMPTS, backoff: float = RETRY_BACKOFF_SECONDS, hedging: bool = HEDGING_ENABLED,
+                 failure_threshold: int = BREAKER_FAILURE_THRESHOLD, cooldown: float = BREAKER_COOLDOWN_SECONDS):
+        self.window = window
+        self.min_samples = min_samples
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout = min_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedging = hedging
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._platforms = {}
+        self._lock = threading.Lock()
+
+    def _state(self, platform) -> PlatformState:
+        # Caller holds the lock
+        if platform not in self._platforms:
+            self._platforms[platform] = PlatformState(self.window)
+        return self._platforms[platform]
+
+    def _percentile(self, platform, q):
+        with self._lock:
+            latencies = list(self._state(platform).latencies)
+        if len(latencies) < self.min_samples:
+            return None
+        return float(np.percentile(latencies, q))
+
+    def order(self, platforms) -> list:
+        """Slowest typical latency first; platforms without enough history count as slowest"""
+        p50 = {platform: self._percentile(platform, 50) for platform in platforms}
+        return sorted(platforms, key=lambda platform: -(p50[platform] if p50[platform] is not None else float("inf")))
+
+    def timeout(self, platform, limit: float) -> float:
+        """Per-attempt timeout: a multiple of p95, within [min_timeout, limit]"""
+        p95 = self._percentile(platform, 95)
+        if p95 is None:
+            return limit
+        return min(limit, max(self.min_timeout, p95 * self.timeout_multiplier))
+
+    def hedge_delay(self, platform):
+        """Seconds after which a second attempt is started, or None without enough history"""
+        return self._percentile(platform, 95) if self.hedging else None
+
+    def _admit(self, platform) -> bool:
+        with self._lock:
+            state = self._state(platform)
+            if state.open_until is None:
+                return True
+            if time.monotonic() < state.open_until or state.probing:
+                state.counters["rejected"] += 1
+                return False
+            # Cooldown over: let one probe through (half-open)
+            state.probing = True
+            return True
+
+    def _record(self, platform, seconds=None, error=None):
+        with self._lock:
+            state = self._state(platform)
+            state.probing = False
+            state.outcomes.append(error is None)
+            if error is None:
+                state.latencies.append(seconds)
+                state.consecutive_failures = 0
+                state.open_until = None
+                return
+            if not is_transient(error):
+                # A bad response or parse error for one query says nothing about whether the
+                # platform is up: it doesn't count toward the breaker, and a probe that got
+                # that far shows the platform is reachable again
+                if state.open_until is not None and time.monotonic() >= state.open_until:
+                    state.consecutive_failures = 0
+                    state.open_until = None
+                return
+            state.consecutive_failures += 1
+            if isinstance(error, asyncio.TimeoutError):
+                state.counters["timeouts"] += 1
+            if state.open_until is not None or state.consecutive_failures >= self.failure_threshold:
+                state.open_until = time.monotonic() + self.cooldown
+                tracing.record_error("scheduler.breaker_open", error, platform=platform,
+                                     failures=state.consecutive_failures, cooldown_seconds=self.cooldown)
+
+    def _count(self, platform, counter):
+        with self._lock:
+            self._state(platform).counters[counter] += 1
+        tracing.record(f"scheduler.{counter}")
+
+    async def _attempt(self, factory, hedge=False):
+        if hedge:
+            # A hedge must send its own requests instead of joining the slow ones in flight
+            fresh_tool_calls.set(True)
+        started = time.perf_counter()
+        result = await factory()
+        return result, time.perf_counter() - started
+
+    async def _hedged(self, platform, factory, timeout: float, budget_deadline: float):
+        """Run one attempt, adding a hedged second attempt once it passes the platform's p95.
+
+        Each attempt gets `timeout` seconds from its own start, within the overall budget.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = min(loop.time() + timeout, budget_deadline)
+        tasks = [asyncio.ensure_future(self._attempt(factory))]
+        pending = set(tasks)
+        error = None
+        try:
+            delay = self.hedge_delay(platform)
+            if delay is not None and delay < timeout:
+                done, pending = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    self._count(platform, "hedges")
+                    deadline = min(loop.time() + timeout, budget_deadline)
+                    hedge = asyncio.ensure_future(self._attempt(factory, hedge=True))
+                    tasks.append(hedge)
+                    pending.add(hedge)
+                else:
+                    pending = set(tasks) - done
+
+            finished = [task for task in tasks if task.done()]
+            while True:
+                for task in finished:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self._count(platform, "hedge_wins")
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    raise error
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                finished, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not finished:
+                    raise asyncio.TimeoutError()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def run(self, platform, factory, budget: float):
+        """Run `factory()` for `platform` within `budget` seconds with adaptive timeouts, retries and hedging.
+
+        Raises PlatformUnavailableError while the platform's circuit is open,
+        asyncio.TimeoutError when the budget runs out, or the last error.
+        """
+        if not self._admit(platform):
+            raise PlatformUnavailableError(f"{platform} is temporarily unavailable")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + budget
+        attempt = 0
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self._record(platform, error=asyncio.TimeoutError())
+                raise asyncio.TimeoutError()
+            self._count(platform, "attempts")
+            try:
+                result, seconds = await self._hedged(platform, factory, self.timeout(platform, remaining), deadline)
+            except asyncio.CancelledError:
+                if loop.time() >= deadline:
+                    # A caller's own deadline at or past the budget: the platform hung
+                    self._record(platform, error=asyncio.TimeoutError())
+                else:
+                    with self._lock:
+                        self._state(platform).probing = False
+                raise
+            except Exception as e:
+                self._record(platform, error=e)
+                delay = random.uniform(0, self.backoff * 2 ** attempt)
+                with self._lock:
+                    tripped = self._state(platform).open_until is not None
+                if attempt >= self.retries or tripped or not is_transient(e) or loop.time() + delay >= deadline:
+                    raise
+                tracing.record_error("scheduler.retry", e, platform=platform, delay_seconds=round(delay, 1))
+                attempt += 1
+                self._count(platform, "retries")
+                await asyncio.sleep(delay)
+                # Another search may have tripped the breaker while this one backed off
+                if not self._admit(platform):
+                    raise PlatformUnavailableError(f"{platform} is temporarily unavailable")
+                continue
+            self._record(platform, seconds)
+            return result
+
+    def snapshot(self) -> dict:
+        """Per-platform latency percentiles, error rate, breaker state and counters for the Metrics page"""
+        with self._lock:
+            states = {platform: (list(state.latencies), list(state.outcomes), state.open_until, dict(state.counters))
+                      for platform, state in self._platforms.items()}
+        now = time.monotonic()
+        snapshot = {}
+        for platform, (latencies, outcomes, open_until, counters) in states.items():
+            p50, p95 = np.percentile(latencies, [50, 95]) if latencies else (None, None)
+            snapshot[platform] = {
+                "p50_s": round(float(p50), 2) if p50 is not None else None,
+                "p95_s": round(float(p95), 2) if p95 is not None else None,
+                "error_rate": round(1 - sum(outcomes) / len(outcomes), 3) if outcomes else None,
+                "circuit": "closed" if open_until is None else ("open" if now < open_until else "half-open"),
+                **counters,
+            }
+        return snapshot
@@ -0,0 +1,175 @@
+"""Price history per tracked product URL and batch price-alert evaluation.
+
+Each URL has one series shared by every user watching it. Points are stored as
+integer cents and seconds, each delta-encoded against the point before it, and points
+older than `HISTORY_RAW_RETENTION_DAYS` are downsampled to one per day. The
+all-time low is kept alongside the series so downsampling never loses it.
+"""
+import time
+import numpy as np
+from utils.config import get_setting
+
+HISTORY_RAW_RETENTION_DAYS = get_setting("HISTORY_RAW_RETENTION_DAYS", 14, int)
+HISTORY_MAX_DAYS = get_setting("HISTORY_MAX_DAYS", 365, int)
+HISTORY_REQUEST_CHUNK = 500
+ALERT_PAGE_SIZE = 1000
+# URLs per alert-rule request; they go in the query string
+ALERT_URL_CHUNK = 100
+DAY_SECONDS = 86400
+
+ALERT_KINDS = ("price_drop", "all_time_low", "below_target")
+
+def encode_series(timestamps: np.ndarray, cents: np.ndarray) -> dict:
+    """Encode parallel arrays of epoch seconds and integer cents as the first point plus
+    each later point's difference from the one before it"""
+    return {
+        "start_time": int(timestamps[0]),
+        "start_cents": int(cents[0]),
+        "time_deltas": np.diff(timestamps).astype(int).tolist(),
+        "price_deltas": np.diff(cents).astype(int).tolist(),
+    }
+
+def decode_series(row: dict):
+    """Inverse of encode_series: (timestamps, cents) as int64 arrays"""
+    timestamps = np.cumsum([row["start_time"], *(row.get("time_deltas") or [])], dtype=np.int64)
+    cents = np.cumsum([row["start_cents"], *(row.get("price_deltas") or [])], dtype=np.int64)
+    return timestamps, cents
+
+def downsample(timestamps: np.ndarray, cents: np.ndarray, now: float):
+    """Keep recent points as-is, the last point per day for older ones, and drop anything past HISTORY_MAX_DAYS"""
+    keep_from = now - HISTORY_MAX_DAYS * DAY_SECONDS
+    raw_from = now - HISTORY_RAW_RETENTION_DAYS * DAY_SECONDS
+
+    alive = timestamps >= keep_from
+    timestamps, cents = timestamps[alive], cents[alive]
+
+    old = timestamps < raw_from
+    days = timestamps[old] // DAY_SECONDS
+    # Last point of each day: where the next point falls on a different day
+    last_of_day = np.append(days[1:] != days[:-1], True) if days.size else np.zeros(0, dtype=bool)
+    keep = np.concatenate([last_of_day, np.ones(np.count_nonzero(~old), dtype=bool)])
+    return timestamps[keep], cents[keep]
+
+def to_cents(price_value) -> int:
+    return int(round(float(price_value) * 100))
+
+def append_points(client, points: list, now: float = None):
+    """Append one observed price per URL and save the updated series in one request per chunk.
+
+    `points` are dicts with "url" and "price_value" (as written by the price
+    refresh). Returns {url: (latest, previous, prior_low)} in dollars, where
+    previous and prior_low are NaN for a URL's first point.
+    """
+    now = time.time() if now is None else now
+    points = [point for point in points if point.get("price_value") is not None]
+    summaries = {}
+
+    for start in range(0, len(points), HISTORY_REQUEST_CHUNK):
+        chunk = points[start:start + HISTORY_REQUEST_CHUNK]
+        urls = [point["url"] for point in chunk]
+        existing = {
+            row["url"]: row
+            for row in client.table("price_history").select("*").in_("url", urls).execute().data or []
+        }
+
+        rows = []
+        for point in chunk:
+            cents = to_cents(point["price_value"])
+            row = existing.get(point["url"])
+            if row:
+                timestamps, history = decode_series(row)
+                previous, prior_low = int(history[-1]) / 100, row["low_cents"] / 100
+                low_cents = min(row["low_cents"], cents)
+                timestamps, history = downsample(np.append(timestamps, int(now)), np.append(history, cents), now)
+            else:
+                previous = prior_low = np.nan
+                low_cents = cents
+                timestamps, history = np.array([int(now)]), np.array([cents])
+
+            rows.append({
+                "url": point["url"],
+                "low_cents": low_cents,
+                **encode_series(timestamps, history),
+            })
+            summaries[point["url"]] = (cents / 100, previous, prior_low)
+
+        client.table("price_history").upsert(rows, on_conflict="url").execute()
+
+    return summaries
+
+def evaluate_alerts(url_index, latest, previous, prior_low, target_price, drop_percent, all_time_low):
+    """Evaluate every watch entry's alert rules at once.
+
+    `latest`, `previous` and `prior_low` are per-URL arrays; `url_index` maps
+    each watch entry to its URL, and `target_price`, `drop_percent` (NaN when
+    unset) and `all_time_low` are that entry's rules. Returns a boolean array
+    per alert kind. Alerts fire on the cycle the condition becomes true, not on
+    every cycle it stays true.
+    """
+    latest_w = latest[url_index]
+    previous_w = previous[url_index]
+    prior_low_w = prior_low[url_index]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        drop = (previous_w - latest_w) / previous_w * 100
+        return {
+            "price_drop": drop >= drop_percent,
+            "all_time_low": all_time_low & (latest_w < prior_low_w),
+            "below_target": (latest_w <= target_price) & ~(previous_w <= target_price),
+        }
+
+def _alert_rules(client, urls: list):
+    """Watch entries on `urls` with at least one alert rule, paged by id"""
+    for start in range(0, len(urls), ALERT_URL_CHUNK):
+        after = None
+        while True:
+            request = (client.table("watchlist")
+                       .select("id, user_id, url, target_price, alert_drop_percent, alert_all_time_low")
+                       .in_("url", urls[start:start + ALERT_URL_CHUNK])
+                       .or_("target_price.not.is.null,alert_drop_percent.not.is.null,alert_all_time_low.is.true")
+                       .order("id")
+                       .limit(ALERT_PAGE_SIZE))
+            if after is not None:
+                request = request.gt("id", after)
+            rows = request.execute().data or []
+            yield from rows
+            if len(rows) < ALERT_PAGE_SIZE:
+                break
+            after = rows[-1]["id"]
+
+def evaluate_cycle(client, summaries: dict):
+    """Evaluate alert rules for the URLs refreshed in one cycle and record the alerts that fired"""
+    if not summaries:
+        return []
+
+    urls = list(summaries)
+    position = {url: i for i, url in enumerate(urls)}
+    latest, previous, prior_low = (np.array(column, dtype=float) for column in zip(*summaries.values()))
+
+    rules = list(_alert_rules(client, urls))
+    if not rules:
+        return []
+
+    url_index = np.fromiter((position[row["url"]] for row in rules), dtype=np.int64, count=len(rules))
+    target_price = np.array([row["target_price"] for row in rules], dtype=float)
+    drop_percent = np.array([row["alert_drop_percent"] for row in rules], dtype=float)
+    all_time_low = np.array([bool(row["alert_all_time_low"]) for row in rules])
+
+    fired = evaluate_alerts(url_index, latest, previous, prior_low, target_price, drop_percent, all_time_low)
+
+    alerts = []
+    for kind in ALERT_KINDS:
+        for i in np.flatnonzero(fired[kind]):
+            rule = rules[i]
+            alerts.append({
+                "user_id": rule["user_id"],
+                "watchlist_id": rule["id"],
+                "url": rule["url"],
+                "kind": kind,
+                "price_value": float(latest[url_index[i]]),
+                "previous_price_value": None if np.isnan(previous[url_index[i]]) else float(previous[url_index[i]]),
+            })
+
+    for start in range(0, len(alerts), HISTORY_REQUEST_CHUNK):
+        client.table("price_alerts").insert(alerts[start:start + HISTORY_REQUEST_CHUNK]).execute()
+    return alerts
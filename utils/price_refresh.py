@@ -0,0 +1,235 @@
+"""Background refresh of watchlist prices.
+
+Collects every distinct watchlist URL across all users, looks each one up once
+with the platform's MCP `web_data_*` tool under per-platform rate limits and
+concurrency budgets, and writes refreshed price and rating back to every
+watchlist row with that URL. Refreshed prices are appended to the shared
+price history and users' price alerts are evaluated at the end of each
+cycle (see utils/price_history.py). Progress is checkpointed so an interrupted cycle
+resumes where it stopped:
+
+    python -m utils.price_refresh --once
+    python -m utils.price_refresh --interval 21600
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+from collections import defaultdict
+from supabase import create_client
+from utils.config import get_setting
+from utils.event_loop import run_sync
+from utils.rate_limit import RateLimiter
+from utils.fast_path import PLATFORM_PIPELINES, lookup_product, record_to_hit
+from utils.normalize import parse_price_value
+from utils.product_match import listing_key
+from utils import tracing, price_history
+
+REFRESH_CHECKPOINT_PATH = get_setting("REFRESH_CHECKPOINT_PATH", ".cache/price_refresh_checkpoint.json")
+REFRESH_PAGE_SIZE = get_setting("REFRESH_PAGE_SIZE", 1000, int)
+REFRESH_BATCH_SIZE = get_setting("REFRESH_BATCH_SIZE", 25, int)
+REFRESH_INTERVAL_SECONDS = get_setting("REFRESH_INTERVAL_SECONDS", 6 * 3600.0, float)
+
+# Per-platform budgets: lookups per second and lookups in flight
+DEFAULT_RATE_PER_SECOND = get_setting("REFRESH_RATE_PER_SECOND", 2.0, float)
+DEFAULT_CONCURRENCY = get_setting("REFRESH_CONCURRENCY", 4, int)
+# Overrides per platform, e.g. {"Ebay": {"rate": 0.5, "concurrency": 2}}
+PLATFORM_BUDGETS = get_setting("REFRESH_PLATFORM_BUDGETS", {}, lambda value: json.loads(value) if isinstance(value, str) else dict(value))
+
+def get_service_client():
+    """Supabase client that can read and update every user's watchlist.
+
+    Needs the service role key: the refresh functions are revoked from the anon key.
+    """
+    key = get_setting("SUPABASE_SERVICE_KEY")
+    if not key:
+        raise RuntimeError("SUPABASE_SERVICE_KEY is not set; the price refresh needs the service role key")
+    return create_client(get_setting("SUPABASE_URL"), key)
+
+class Checkpoint:
+    """Completed URLs of the current refresh cycle, persisted after every batch"""
+
+    def __init__(self, path: str = REFRESH_CHECKPOINT_PATH):
+        self.path = path
+        self.cycle_started = None
+        self.done = set()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.cycle_started = data["cycle_started"]
+            self.done = set(data["done"])
+        except (OSError, ValueError, KeyError):
+            self.cycle_started = None
+            self.done = set()
+        return self
+
+    def start_cycle(self):
+        if self.cycle_started is None:
+            self.cycle_started = time.time()
+            self.save()
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"cycle_started": self.cycle_started, "done": sorted(self.done)}, f)
+        os.replace(temporary, self.path)
+
+    def finish_cycle(self):
+        self.cycle_started = None
+        self.done = set()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+def collect_tracked_urls(client, page_size: int = REFRESH_PAGE_SIZE):
+    """Every distinct watchlist URL across all users, grouped by platform"""
+    by_platform = defaultdict(list)
+    after = None
+    while True:
+        rows = client.rpc("distinct_watchlist_urls", {"after_url": after, "page_size": page_size}).execute().data or []
+        for row in rows:
+            by_platform[row["platform"]].append(row["url"])
+        if len(rows) < page_size:
+            return dict(by_platform)
+        after = rows[-1]["url"]
+
+def write_refreshed(client, refreshed: list):
+    """Update every watchlist row for the refreshed URLs in one request"""
+    if not refreshed:
+        return 0
+    return client.rpc("apply_watchlist_price_refresh", {"updates": refreshed}).execute().data
+
+async def lookup_price(session, tool: str, url: str, limiter: RateLimiter, budget: asyncio.Semaphore):
+    """Fetch current price and rating for one product URL, or None if the lookup failed"""
+    async with budget:
+        await limiter.acquire()
+        try:
+            records = await lookup_product(session, tool, url)
+        except Exception as e:
+            tracing.record_error("price_refresh", e, url=url)
+            return None
+
+    for record in records:
+        hit = record_to_hit(record) if isinstance(record, dict) else None
+        if hit and hit["price"]:
+            return {
+                "url": url,
+                "price": hit["price"],
+                "price_value": parse_price_value(hit["price"]),
+                "rating": hit["rating"] or None,
+            }
+    return None
+
+async def refresh_platform(pool, client, checkpoint, platform, urls, summaries, batch_size=REFRESH_BATCH_SIZE):
+    """Refresh one platform's URLs batch by batch; returns (refreshed, failed) counts.
+
+    Each refreshed price is also appended to the URL's price history and its
+    (latest, previous, prior_low) summary added to `summaries`.
+    """
+    pipeline = PLATFORM_PIPELINES.get(platform)
+    budgets = PLATFORM_BUDGETS.get(platform, {})
+    concurrency = int(budgets.get("concurrency", DEFAULT_CONCURRENCY))
+    limiter = RateLimiter(float(budgets.get("rate", DEFAULT_RATE_PER_SECOND)), burst=concurrency)
+    budget = asyncio.Semaphore(concurrency)
+
+    # URL variants of one listing (tracking parameters, slugs) are looked up once
+    variants = defaultdict(list)
+    for url in urls:
+        if url not in checkpoint.done:
+            variants[listing_key(url)].append(url)
+    pending = [group[0] for group in variants.values()]
+    refreshed_count = failed_count = 0
+    if pipeline is None or not pending:
+        return refreshed_count, failed_count
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        with tracing.span("price_refresh_batch", platform=platform, urls=len(batch)) as span:
+            async with pool.acquire() as conn:
+                tools = {tool.name for tool in await pool.get_tools()}
+                if pipeline["product_tool"] not in tools:
+                    print(f"No {pipeline['product_tool']} tool available, skipping {platform}")
+                    return refreshed_count, failed_count + sum(len(variants[listing_key(url)]) for url in pending[start:])
+                results = await asyncio.gather(*(
+                    lookup_price(conn.session, pipeline["product_tool"], url, limiter, budget) for url in batch
+                ))
+
+            refreshed = [
+                {**result, "url": url}
+                for result in results if result
+                for url in variants[listing_key(result["url"])]
+            ]
+            await asyncio.to_thread(write_refreshed, client, refreshed)
+            summaries.update(await asyncio.to_thread(price_history.append_points, client, refreshed))
+            span.set("refreshed", len(refreshed))
+
+        batch_urls = [url for representative in batch for url in variants[listing_key(representative)]]
+        refreshed_count += len(refreshed)
+        failed_count += len(batch_urls) - len(refreshed)
+        # Failed lookups are not retried within this cycle
+        checkpoint.done.update(batch_urls)
+        checkpoint.save()
+
+    return refreshed_count, failed_count
+
+async def refresh_cycle(pool=None, client=None, checkpoint=None):
+    """Run (or resume) one refresh cycle over every tracked URL"""
+    from utils.search import get_mcp_pool
+
+    pool = pool or get_mcp_pool()
+    client = client or get_service_client()
+    checkpoint = checkpoint or Checkpoint().load()
+    checkpoint.start_cycle()
+
+    with tracing.span("price_refresh_cycle") as span:
+        by_platform = await asyncio.to_thread(collect_tracked_urls, client)
+        span.set("urls", sum(len(urls) for urls in by_platform.values()))
+        span.set("resumed", len(checkpoint.done))
+
+        summaries = {}
+        outcomes = await asyncio.gather(*(
+            refresh_platform(pool, client, checkpoint, platform, urls, summaries) for platform, urls in by_platform.items()
+        ))
+        summary = {platform: {"refreshed": refreshed, "failed": failed}
+                   for platform, (refreshed, failed) in zip(by_platform, outcomes)}
+        span.set("summary", summary)
+
+        # Only URLs refreshed by this run are evaluated; a resumed cycle skips the ones done before the restart
+        alerts = await asyncio.to_thread(price_history.evaluate_cycle, client, summaries)
+        span.set("alerts", len(alerts))
+
+    checkpoint.finish_cycle()
+    return summary
+
+def run_forever(interval: float = REFRESH_INTERVAL_SECONDS):
+    """Run a refresh cycle every `interval` seconds, measured from cycle start"""
+    while True:
+        started = time.monotonic()
+        try:
+            print("Price refresh summary:", run_sync(refresh_cycle()))
+        except Exception as e:
+            print(f"Price refresh cycle failed, will resume from checkpoint: {str(e)}")
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh watchlist prices from the MCP web_data tools")
+    parser.add_argument("--once", action="store_true", help="run a single cycle and exit")
+    parser.add_argument("--interval", type=float, default=REFRESH_INTERVAL_SECONDS, help="seconds between cycles")
+    args = parser.parse_args()
+    if not get_setting("SUPABASE_SERVICE_KEY"):
+        parser.error("SUPABASE_SERVICE_KEY is not set; the price refresh needs the service role key")
+
+    if args.once:
+        print("Price refresh summary:", run_sync(refresh_cycle()))
+    else:
+        run_forever(args.interval)
+
+if __name__ == "__main__":
+    main()
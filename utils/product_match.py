@@ -0,0 +1,211 @@
+"""Group listings of the same product across platforms.
+
+Listings are matched on strong identifiers (UPC/EAN barcodes and model
+numbers found in titles or URLs) and otherwise on title similarity, using
+MinHash/LSH so only likely pairs are ever compared. Two clusters whose model
+numbers disagree are never merged, even through a listing without a model
+number that resembles both, so "WH-1000XM4" and "WH-1000XM5" stay apart.
+
+Title overlap alone could still join different brands' products ("Sony Wireless
+Headphones" and "onn. Wireless Headphones"), so a cluster only grows while all
+of its listings share an identifier or a leading (brand) token. The best-price
+table also requires the listings to be priced in a single currency.
+"""
+import re
+from urllib.parse import urlparse
+import numpy as np
+import pandas as pd
+from utils.minhash import MinHasher, LSHIndex, jaccard
+
+TITLE_MATCH_THRESHOLD = 0.5
+
+_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9]+(?:[-/.][A-Za-z0-9]+)*")
+_UNIT_PATTERN = re.compile(
+    r"^\d+(?:\.\d+)?(?:gb|tb|mb|mah|w|v|hz|khz|ghz|in|inch|inches|mm|cm|m|ft|oz|fl|lb|lbs|kg|g|ml|l|pack|pk|pcs|ct|count|k|p|x|s|th|nd|rd|st)$"
+)
+_BARCODE_PATTERN = re.compile(r"(?<!\d)(\d{12,14})(?!\d)")
+_ASIN_PATTERN = re.compile(r"/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})(?:[/?]|$)")
+
+# Platform listing IDs in product URLs, so tracking links and slugs don't split one product
+_LISTING_ID_PATTERNS = {
+    "amazon.": _ASIN_PATTERN,
+    "walmart.": re.compile(r"/ip/(?:[^/]+/)?(\d+)"),
+    "ebay.": re.compile(r"/itm/(?:[^/]+/)?(\d+)"),
+    "target.": re.compile(r"/A-(\d+)"),
+}
+
+TITLE_STOPWORDS = {
+    "the", "and", "with", "for", "of", "in", "a", "an", "by", "to", "on", "new", "brand", "free", "shipping",
+    "fast", "sale", "deal", "pack", "set", "item", "product", "edition", "version", "model", "latest", "genuine",
+    "original", "official", "authentic", "us", "usa", "import",
+}
+
+def title_tokens(title: str) -> set:
+    """Lowercased title words with separators removed from model-like tokens ("WH-1000XM5" -> "wh1000xm5")"""
+    tokens = set()
+    for raw in _TOKEN_PATTERN.findall(title or ""):
+        token = re.sub(r"[-/.]", "", raw).lower()
+        if token and token not in TITLE_STOPWORDS:
+            tokens.add(token)
+    return tokens
+
+def leading_token(title: str) -> str:
+    """First title word that isn't a stopword, usually the brand ("onn. Wireless Headphones" -> "onn")"""
+    for raw in _TOKEN_PATTERN.findall(title or ""):
+        token = re.sub(r"[-/.]", "", raw).lower()
+        if token and token not in TITLE_STOPWORDS:
+            return token
+    return ""
+
+def listings_agree(identifier_sets, leading_tokens) -> bool:
+    """Whether listings can be the same product: an identifier they all carry, or one leading token"""
+    return bool(set.intersection(*identifier_sets)) or len(set(leading_tokens)) == 1
+
+def model_numbers(tokens: set) -> set:
+    """Tokens that look like model numbers: letters and digits mixed, not a size or quantity"""
+    return {
+        token for token in tokens
+        if len(token) >= 4 and re.search(r"[a-z]", token) and re.search(r"\d", token) and not _UNIT_PATTERN.match(token)
+    }
+
+def product_identifiers(title: str, url: str = "") -> set:
+    """Identifiers that pin down a product on any platform: barcodes and model numbers"""
+    identifiers = {f"model:{model}" for model in model_numbers(title_tokens(title))}
+    for text in (title or "", urlparse(url or "").path):
+        identifiers.update(f"upc:{code.lstrip('0')}" for code in _BARCODE_PATTERN.findall(text))
+    return identifiers
+
+def listing_key(url: str) -> str:
+    """Stable key for a product page: platform plus listing ID when recognised, else the bare URL"""
+    parsed = urlparse(url or "")
+    host = parsed.netloc.lower()
+    for domain, pattern in _LISTING_ID_PATTERNS.items():
+        if domain in host:
+            match = pattern.search(parsed.path)
+            if match:
+                return f"{domain.rstrip('.')}:{match.group(1)}"
+    return f"{host}{parsed.path.rstrip('/')}"
+
+class ProductMatcher:
+    """Incremental index of listings that assigns each one to a product cluster.
+
+    Clusters are kept in a union-find over listing keys, so adding a listing that
+    bridges two clusters merges them, unless both clusters have model numbers
+    and none of them are shared, or the merged listings would fail
+    listings_agree (no identifier common to all and more than one leading token).
+    """
+
+    def __init__(self, threshold: float = TITLE_MATCH_THRESHOLD, num_perm: int = 64, bands: int = 32):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm=num_perm)
+        self.lsh = LSHIndex(num_perm=num_perm, bands=bands)
+        self._tokens = {}
+        self._cluster_models = {}
+        # Per cluster root: identifiers every listing carries, and the listings' leading tokens
+        self._cluster_identifiers = {}
+        self._cluster_leads = {}
+        self._by_identifier = {}
+        self._parent = {}
+
+    def _find(self, key):
+        root = key
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[key] != root:
+            self._parent[key], key = root, self._parent[key]
+        return root
+
+    def _union(self, a, b):
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a == root_b:
+            return
+        models_a, models_b = self._cluster_models[root_a], self._cluster_models[root_b]
+        if models_a and models_b and not models_a & models_b:
+            return
+        identifiers = [self._cluster_identifiers[root_a], self._cluster_identifiers[root_b]]
+        leads = self._cluster_leads[root_a] | self._cluster_leads[root_b]
+        if not listings_agree(identifiers, leads):
+            return
+        root, child = min(root_a, root_b, key=str), max(root_a, root_b, key=str)
+        self._parent[child] = root
+        self._cluster_models[root] = models_a | models_b
+        self._cluster_identifiers[root] = set.intersection(*identifiers)
+        self._cluster_leads[root] = leads
+        for state in (self._cluster_models, self._cluster_identifiers, self._cluster_leads):
+            del state[child]
+
+    def add(self, key, title: str, url: str = ""):
+        """Index one listing and merge it into any cluster it matches"""
+        tokens = title_tokens(title)
+        identifiers = product_identifiers(title, url)
+        if key not in self._parent:
+            self._parent[key] = key
+            self._cluster_models[key] = model_numbers(tokens)
+            self._cluster_identifiers[key] = set(identifiers)
+            self._cluster_leads[key] = {leading_token(title)}
+        self._tokens[key] = tokens
+
+        for identifier in identifiers:
+            other = self._by_identifier.setdefault(identifier, key)
+            if other != key:
+                self._union(key, other)
+
+        signature = self.hasher.signature(tokens)
+        for other in self.lsh.candidates(signature):
+            if other == key:
+                continue
+            if jaccard(tokens, self._tokens[other]) >= self.threshold:
+                self._union(key, other)
+        self.lsh.add(key, signature)
+
+    def cluster_of(self, key):
+        return self._find(key)
+
+def cluster_listings(titles, urls, threshold: float = TITLE_MATCH_THRESHOLD) -> np.ndarray:
+    """Cluster label per listing; listings of the same product share a label"""
+    matcher = ProductMatcher(threshold=threshold)
+    for i, (title, url) in enumerate(zip(titles, urls)):
+        matcher.add(i, title, url)
+    roots = [matcher.cluster_of(i) for i in range(len(titles))]
+    return pd.factorize(pd.Series(roots, dtype=object))[0]
+
+def is_same_product(listings: pd.DataFrame) -> bool:
+    """Whether a cluster's listings can be compared on price: one currency, and either an
+    identifier every listing carries or the same leading token on every title"""
+    if listings["currency"].nunique(dropna=False) > 1:
+        return False
+    titles, urls = listings["title"].tolist(), listings["url"].tolist()
+    return listings_agree([product_identifiers(title, url) for title, url in zip(titles, urls)],
+                          [leading_token(title) for title in titles])
+
+def best_prices(frame: pd.DataFrame) -> pd.DataFrame:
+    """Best-price comparison for products found on more than one platform.
+
+    Takes the normalized results frame (see utils/normalize.py) and returns one
+    row per multi-platform cluster with the cheapest listing, the price spread
+    and every platform's best price, largest savings first. Clusters that fail
+    is_same_product are left out.
+    """
+    if frame.empty:
+        return pd.DataFrame()
+
+    frame = frame.assign(cluster=cluster_listings(frame["title"].tolist(), frame["url"].tolist()))
+    priced = frame[frame["amount"].notna()]
+    platform_counts = priced.groupby("cluster")["platform"].nunique()
+    shared = priced[priced["cluster"].isin(platform_counts[platform_counts > 1].index)]
+    confirmed = [cluster for cluster, listings in shared.groupby("cluster") if is_same_product(listings)]
+    shared = shared[shared["cluster"].isin(confirmed)]
+    if shared.empty:
+        return pd.DataFrame()
+
+    cheapest = shared.loc[shared.groupby("cluster")["amount"].idxmin()].set_index("cluster")
+    per_platform = shared.pivot_table(index="cluster", columns="platform", values="amount", aggfunc="min")
+    comparison = pd.DataFrame({
+        "product": cheapest["title"],
+        "best_price": cheapest["amount"],
+        "currency": cheapest["currency"],
+        "best_platform": cheapest["platform"],
+        "url": cheapest["url"],
+        "savings": shared.groupby("cluster")["amount"].max() - cheapest["amount"],
+    }).join(per_platform)
+    return comparison.sort_values("savings", ascending=False).reset_index(drop=True)
@@ -0,0 +1,286 @@
+import re
+import threading
+from utils.minhash import MinHasher, LSHIndex, jaccard
+
+# Words that don't change what the user is looking for
+FILLER_WORDS = {
+    "a", "an", "the", "find", "search", "show", "get", "me", "my", "i", "im", "want", "need",
+    "looking", "look", "for", "some", "any", "please", "with", "that", "are", "is", "which",
+    "buy", "to", "of", "on", "in", "from", "by", "good", "products", "product", "items", "item",
+}
+
+_NUM = r"(\d+(?:\.\d+)?)"
+_UNIT = r"(?:\s*(?:dollars?|usd|bucks))?"
+
+_RATING_PATTERNS = [
+    re.compile(rf"(?:at least\s*)?{_NUM}\s*\+?\s*-?\s*stars?(?:\s*(?:rating|rated))?(?:\s*(?:or|and)\s*(?:above|up|higher|more|better))?"),
+    re.compile(rf"rat(?:ed|ing)\s*(?:of\s*)?(?:at least\s*)?{_NUM}\s*\+?(?:\s*(?:or|and)\s*(?:above|up|higher|more|better))?"),
+]
+_RANGE_PATTERN = re.compile(
+    rf"(?P<prefix>between|from)?\s*(?P<cur1>\$)?\s*(?P<low>\d+(?:\.\d+)?)\s*(?:-|–|to|and)\s*(?P<cur2>\$)?\s*(?P<high>\d+(?:\.\d+)?)(?P<unit>{_UNIT})"
+)
+_MAX_PATTERN = re.compile(rf"(?:under|below|less than|cheaper than|max(?:imum)?|up to|at most|<)\s*\$?\s*{_NUM}{_UNIT}")
+_MIN_PATTERN = re.compile(rf"(?:over|above|more than|at least|min(?:imum)?|>)\s*\$?\s*{_NUM}{_UNIT}")
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:['-][a-z0-9]+)*")
+
+def _number(value: str) -> str:
+    return f"{float(value):g}"
+
+def _singular(word: str) -> str:
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def extract_constraints(query: str):
+    """Pull price and rating constraints out of a query.
+
+    Returns sorted constraint tokens such as "price<=100" or "rating>=4" and the
+    lowercased query text with those phrases removed.
+    """
+    text = query.lower().replace(",", "").replace("\\", "")
+    constraints = set()
+
+    def rating(match):
+        constraints.add(f"rating>={_number(match.group(1))}")
+        return " "
+
+    for pattern in _RATING_PATTERNS:
+        text = pattern.sub(rating, text)
+
+    def price_range(match):
+        # Only treat "10-11" as a price when something marks it as one
+        if not (match.group("prefix") or match.group("cur1") or match.group("cur2") or match.group("unit").strip()):
+            return match.group(0)
+        low, high = sorted((float(match.group("low")), float(match.group("high"))))
+        constraints.add(f"price>={low:g}")
+        constraints.add(f"price<={high:g}")
+        return " "
+
+    def price_max(match):
+        constraints.add(f"price<={_number(match.group(1))}")
+        return " "
+
+    def price_min(match):
+        constraints.add(f"price>={_number(match.group(1))}")
+        return " "
+
+    text = _RANGE_PATTERN.sub(price_range, text)
+    text = _MAX_PATTERN.sub(price_max, text)
+    text = _MIN_PATTERN.sub(price_min, text)
+    return tuple(sorted(constraints)), re.sub(r"\s+", " ", text).strip()
+
+_CONSTRAINT_PATTERN = re.compile(r"(price|rating)(<=|>=)([\d.]+)")
+_BRAND_PATTERN = re.compile(r"\b(?:from|by|brand:?)\s+([a-z0-9][a-z0-9&'-]*)")
+SIZE_PATTERN = re.compile(r"\bsize\s*:?\s*(\d+(?:\.\d+)?|xxs|xs|s|m|l|xl|xxl|xxxl|small|medium|large)\b")
+_SIZE_NAMES = {"small": "s", "medium": "m", "large": "l"}
+# Words after "from"/"by" that name a store or a filler, not a brand
+NOT_BRANDS = FILLER_WORDS | {"amazon", "walmart", "ebay", "target", "brand", "brands", "top", "best"}
+
+def normalize_size(size: str) -> str:
+    size = size.lower()
+    if re.fullmatch(r"\d+(?:\.\d+)?", size):
+        return _number(size)
+    return _SIZE_NAMES.get(size, size)
+
+def parse_query(query: str) -> dict:
+    """Price bounds, minimum rating, brand, size and content words of a search query.
+
+    Brands are only recognised after "from", "by" or "brand" ("mouse from
+    Logitech"); a brand that is just part of the query text stays a content word.
+    """
+    constraints, text = extract_constraints(query)
+    parsed = {"min_price": None, "max_price": None, "min_rating": None, "brand": None, "size": None}
+    for constraint in constraints:
+        field, op, bound = _CONSTRAINT_PATTERN.match(constraint).groups()
+        key = f"{'max' if op == '<=' else 'min'}_{field}"
+        tighter = min if op == "<=" else max
+        parsed[key] = float(bound) if parsed[key] is None else tighter(parsed[key], float(bound))
+
+    def size(match):
+        parsed["size"] = normalize_size(match.group(1))
+        return " "
+
+    def brand(match):
+        if match.group(1) in NOT_BRANDS or match.group(1).isdigit():
+            return match.group(0)
+        parsed["brand"] = match.group(1)
+        return " "
+
+    text = SIZE_PATTERN.sub(size, text)
+    text = _BRAND_PATTERN.sub(brand, text)
+    parsed["words"] = frozenset(
+        _singular(token) for token in _TOKEN_PATTERN.findall(text.replace("$", " "))
+        if token not in FILLER_WORDS
+    )
+    return parsed
+
+def narrows(base: dict, new: dict) -> bool:
+    """True if `new` (from parse_query) only tightens `base`: same content words,
+    bounds kept or made stricter, brand and size kept or newly added, and at
+    least one constraint actually changed. Every result matching `new` then
+    also matched `base`, so the old results can be filtered instead of searching again.
+    """
+    if new["words"] != base["words"] or new == base:
+        return False
+    for key in ("min_price", "min_rating"):
+        if base[key] is not None and (new[key] is None or new[key] < base[key]):
+            return False
+    if base["max_price"] is not None and (new["max_price"] is None or new["max_price"] > base["max_price"]):
+        return False
+    for key in ("brand", "size"):
+        if base[key] is not None and new[key] != base[key]:
+            return False
+    return True
+
+def canonicalize_query(query: str):
+    """Split a query into sorted constraint tokens and a set of content words.
+
+    Price and rating expressions are rewritten to tokens such as "price<=100" so
+    that "$50-$100" and "between $50 and $100" compare equal, filler words are
+    dropped, plurals are folded and word order is ignored.
+    """
+    constraints, text = extract_constraints(query)
+    words = frozenset(
+        _singular(token) for token in _TOKEN_PATTERN.findall(text.replace("$", " "))
+        if token not in FILLER_WORDS
+    )
+    return constraints, words
+
+def query_identifiers(query: str) -> tuple:
+    """Tokens that pin down a specific product: model and number tokens ("s24",
+    "xm5", "12") and the normalized size. Queries that differ in any of them
+    ask for different products however similar the rest of the text is.
+    """
+    _, text = extract_constraints(query)
+    identifiers = {token for token in _TOKEN_PATTERN.findall(text.replace("$", " ")) if any(c.isdigit() for c in token)}
+    identifiers.update(f"size={normalize_size(size)}" for size in SIZE_PATTERN.findall(text))
+    return tuple(sorted(identifiers))
+
+# Trigram Jaccard at which two differing words count as spellings of the same word
+SPELLING_MATCH_THRESHOLD = 0.5
+
+def word_trigrams(word: str) -> set:
+    padded = f"#{word}#"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def query_shingles(words) -> set:
+    """Word tokens plus character trigrams, so near-spellings still overlap"""
+    shingles = set(words)
+    for word in words:
+        shingles.update(word_trigrams(word))
+    return shingles
+
+def edit_distance(a: str, b: str) -> int:
+    """Optimal string alignment distance: insertions, deletions, substitutions and adjacent swaps"""
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+def is_near_spelling(word: str, other: str) -> bool:
+    """Close trigrams, or one dropped, extra or swapped letter between words of four or
+    more letters with the same first letter: "headphnes" ~ "headphones", "fryr" ~
+    "fryer". A single substituted letter or a short word usually makes another
+    word ("case" / "cage", "tan" / "tank"), so neither is enough on its own.
+    """
+    if jaccard(word_trigrams(word), word_trigrams(other)) >= SPELLING_MATCH_THRESHOLD:
+        return True
+    if min(len(word), len(other)) < 4 or word[0] != other[0] or edit_distance(word, other) != 1:
+        return False
+    return len(word) != len(other) or sorted(word) == sorted(other)
+
+def same_words_up_to_spelling(words, other_words) -> bool:
+    """True if the two word sets differ only in spelling: each word one query
+    doesn't share pairs with a distinct unshared word of the other that is a
+    near-spelling of it. "headphnes" pairs with "headphones", but "red" never
+    pairs with "blue" and an extra word ("kids") has nothing to pair with.
+    """
+    missing, extra = sorted(words - other_words), set(other_words - words)
+    if len(missing) != len(extra):
+        return False
+    for word in missing:
+        trigrams = word_trigrams(word)
+        best = max(extra, key=lambda other: (is_near_spelling(word, other), jaccard(trigrams, word_trigrams(other))))
+        if not is_near_spelling(word, best):
+            return False
+        extra.remove(best)
+    return True
+
+class QueryIndex:
+    """Map incoming queries to previously answered near-duplicate queries per platform.
+
+    Queries only match when their price/rating constraints and their model,
+    number and size tokens are identical and every word they don't share is a
+    near-spelling of one in the other query. The Jaccard similarity of their
+    content shingles only has to reach `threshold`, which is kept low: a typo in
+    a short query changes many of its shingles, and the word check is what keeps
+    different queries apart. Candidates come from a MinHash LSH index, so
+    lookups stay fast with many cached queries.
+    """
+
+    def __init__(self, threshold: float = 0.4, num_perm: int = 64, bands: int = 32):
+        self.threshold = threshold
+        self._hasher = MinHasher(num_perm)
+        self._lsh = LSHIndex(num_perm, bands)
+        self._shingles = {}
+        self._words = {}
+        self._exact = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._lsh)
+
+    def clear(self):
+        with self._lock:
+            self._lsh = LSHIndex(self._hasher.num_perm, self._lsh.bands)
+            self._shingles.clear()
+            self._words.clear()
+            self._exact.clear()
+
+    def add(self, query_key: str, platform: str):
+        constraints, words = canonicalize_query(query_key)
+        if not words:
+            return
+        shingles = query_shingles(words)
+        key = (platform, query_key)
+        with self._lock:
+            self._lsh.add(key, self._hasher.signature(shingles), namespace=(platform, constraints, query_identifiers(query_key)))
+            self._shingles[key] = shingles
+            self._words[key] = words
+            self._exact[(platform, constraints, words)] = query_key
+
+    def remove(self, query_key: str, platform: str):
+        constraints, words = canonicalize_query(query_key)
+        key = (platform, query_key)
+        with self._lock:
+            self._lsh.remove(key)
+            self._shingles.pop(key, None)
+            self._words.pop(key, None)
+            if self._exact.get((platform, constraints, words)) == query_key:
+                del self._exact[(platform, constraints, words)]
+
+    def lookup(self, query: str, platform: str):
+        """Return `(query_key, similarity)` of the best match above the threshold, or None"""
+        constraints, words = canonicalize_query(query)
+        if not words:
+            return None
+
+        with self._lock:
+            exact = self._exact.get((platform, constraints, words))
+            if exact is not None:
+                return exact, 1.0
+
+            shingles = query_shingles(words)
+            signature = self._hasher.signature(shingles)
+            best = None
+            for key in self._lsh.candidates(signature, namespace=(platform, constraints, query_identifiers(query))):
+                similarity = jaccard(shingles, self._shingles[key])
+                if similarity < self.threshold or not same_words_up_to_spelling(words, self._words[key]):
+                    continue
+                if best is None or similarity > best[1]:
+                    best = (key[1], similarity)
+        return best
@@ -0,0 +1,36 @@
+"""Heavy process-wide objects, created on first use and shared by every session and rerun.
+
+The libraries behind them are imported inside the factories, so pages that
+never run a search don't pay for importing langchain at all.
+"""
+import streamlit as st
+from utils.config import get_setting
+
+OPENAI_MODEL = get_setting("OPENAI_MODEL", "gpt-4o-mini")
+
+@st.cache_resource
+def get_supabase():
+    """Supabase client shared by every session for data access. Never use it for auth"""
+    from supabase import create_client
+
+    return create_client(get_setting("SUPABASE_URL"), get_setting("SUPABASE_KEY"))
+
+def new_auth_client():
+    """A fresh Supabase client for one sign-up, sign-in or sign-out call.
+
+    supabase-py points a client's PostgREST Authorization header at whoever
+    signed in or out through it last, so auth on the shared data client would
+    run every session's queries as that user. Sessions aren't persisted or
+    refreshed; the caller keeps the user's token in its own session state.
+    """
+    from supabase import create_client, ClientOptions
+
+    return create_client(get_setting("SUPABASE_URL"), get_setting("SUPABASE_KEY"),
+                         options=ClientOptions(persist_session=False, auto_refresh_token=False))
+
+@st.cache_resource
+def get_model():
+    """Chat model driving the search agent"""
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(model=OPENAI_MODEL, api_key=get_setting("OPENAI_API_KEY"))
@@ -0,0 +1,177 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from utils import tracing
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query for cache keys: case, whitespace and trailing punctuation"""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.strip(" .!?")
+
+class SearchResultCache:
+    """SQLite-backed TTL + LRU cache of search results keyed on (query, platform).
+
+    Entries older than `ttl_seconds` are treated as misses and removed. When the
+    cache grows past `max_entries`, the least recently used entries are evicted.
+    The database survives process restarts; hit/miss counters are per process.
+
+    With a `query_index`, lookups that miss the exact key fall back to the most
+    similar previously cached query for the same platform. Evicted and purged
+    entries are removed from the index as well.
+
+    Methods block on SQLite; async callers should run them in a worker thread.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 3600.0, max_entries: int = 5000, query_index=None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.query_index = query_index
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS search_results (
+                query TEXT NOT NULL,
+                platform TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (query, platform)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_search_results_access ON search_results (last_access)")
+        self._conn.commit()
+
+        if self.query_index is not None:
+            rows = self._conn.execute(
+                "SELECT query, platform FROM search_results WHERE created_at >= ?",
+                (time.time() - self.ttl_seconds,),
+            ).fetchall()
+            for key, platform in rows:
+                self.query_index.add(key, platform)
+
+    def _load(self, key: str, platform: str, now: float):
+        # Caller holds the lock
+        row = self._conn.execute(
+            "SELECT response, created_at FROM search_results WHERE query = ? AND platform = ?",
+            (key, platform),
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        response, created_at = row
+        if now - created_at > self.ttl_seconds:
+            self._delete([(key, platform)])
+            self._conn.commit()
+            return None
+
+        self._conn.execute(
+            "UPDATE search_results SET last_access = ? WHERE query = ? AND platform = ?",
+            (now, key, platform),
+        )
+        self._conn.commit()
+        return response
+
+    def get(self, query: str, platform: str):
+        """Return the cached response dict, or None on a miss or expired entry"""
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            response = self._load(key, platform, now)
+            if response is not None:
+                self.hits += 1
+        if response is not None:
+            return json.loads(response)
+
+        if self.query_index is not None:
+            # The exact key missed, so any index entry for it is stale
+            self.query_index.remove(key, platform)
+            match = self.query_index.lookup(key, platform)
+            if match is not None:
+                similar_key, similarity = match
+                with self._lock:
+                    response = self._load(similar_key, platform, now)
+                    if response is not None:
+                        self.near_hits += 1
+                if response is not None:
+                    span = tracing.current_span()
+                    if span is not None:
+                        span.set("similar_query", similar_key)
+                        span.set("similarity", round(similarity, 3))
+                    return json.loads(response)
+                # Expired since it was indexed
+                self.query_index.remove(similar_key, platform)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _delete(self, rows):
+        # Caller holds the lock; `rows` are (query, platform) pairs
+        self._conn.executemany("DELETE FROM search_results WHERE query = ? AND platform = ?", rows)
+        if self.query_index is not None:
+            for key, platform in rows:
+                self.query_index.remove(key, platform)
+
+    def put(self, query: str, platform: str, response: dict):
+        """Store a validated response and evict least recently used entries over the size bound"""
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_results (query, platform, response, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, platform, json.dumps(response), now, now),
+            )
+            evicted = self._conn.execute(
+                "SELECT query, platform FROM search_results ORDER BY last_access DESC LIMIT -1 OFFSET ?",
+                (self.max_entries,),
+            ).fetchall()
+            self._delete(evicted)
+            self._conn.commit()
+
+        if self.query_index is not None:
+            self.query_index.add(key, platform)
+
+    def purge_expired(self):
+        """Remove every entry past its TTL"""
+        with self._lock:
+            expired = self._conn.execute(
+                "SELECT query, platform FROM search_results WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,),
+            ).fetchall()
+            self._delete(expired)
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM search_results")
+            self._conn.commit()
+        if self.query_index is not None:
+            self.query_index.clear()
+
+    def stats(self):
+        """Hit/miss counters for this process plus the current number of entries"""
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM search_results").fetchone()
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            "entries": entries,
+        }
@@ -0,0 +1,345 @@
+import asyncio
+import json
+import base64
+from typing import List
+import streamlit as st
+from pydantic import BaseModel
+from utils.config import get_setting
+from utils.resources import get_model
+from utils.result_cache import SearchResultCache, normalize_query
+from utils.single_flight import SingleFlight
+from utils.query_index import QueryIndex
+from utils.fast_path import PLATFORM_PIPELINES, FastPathError, run_fast_path
+from utils.platform_scheduler import PlatformScheduler, PlatformUnavailableError
+from utils import tracing
+
+# Constants
+PLATFORMS = ["Amazon", "Walmart", "Ebay", "Target"]
+
+# Search policy: "concurrent" fans out to all platforms at once, "sequential" searches one after another
+SEARCH_POLICY = get_setting("SEARCH_POLICY", "concurrent")
+MAX_CONCURRENT_PLATFORMS = get_setting("MAX_CONCURRENT_PLATFORMS", 4, int)
+PLATFORM_TIMEOUT_SECONDS = get_setting("PLATFORM_TIMEOUT_SECONDS", 120.0, float)
+SEQUENTIAL_DELAY_SECONDS = get_setting("SEQUENTIAL_DELAY_SECONDS", 1.0, float)
+
+# Smithery.ai configuration
+SMITHERY_API_KEY = get_setting("SMITHERY_API_KEY", "")
+
+# Point searches at another MCP server instead of Smithery (e.g. the local benchmark server)
+MCP_SERVER_URL = get_setting("MCP_SERVER_URL")
+
+# MCP session pool configuration
+MCP_POOL_SIZE = get_setting("MCP_POOL_SIZE", 4, int)
+MCP_IDLE_TIMEOUT_SECONDS = get_setting("MCP_IDLE_TIMEOUT_SECONDS", 300.0, float)
+MCP_HEALTH_CHECK_SECONDS = get_setting("MCP_HEALTH_CHECK_SECONDS", 60.0, float)
+
+# Search result cache configuration
+RESULT_CACHE_ENABLED = get_setting("RESULT_CACHE_ENABLED", True, bool)
+RESULT_CACHE_PATH = get_setting("RESULT_CACHE_PATH", ".cache/search_results.sqlite3")
+RESULT_CACHE_TTL_SECONDS = get_setting("RESULT_CACHE_TTL_SECONDS", 3600.0, float)
+RESULT_CACHE_MAX_ENTRIES = get_setting("RESULT_CACHE_MAX_ENTRIES", 5000, int)
+QUERY_MATCHING_ENABLED = get_setting("QUERY_MATCHING_ENABLED", True, bool)
+# Shingle similarity a cached query needs to be checked word by word (see QueryIndex)
+QUERY_MATCH_THRESHOLD = get_setting("QUERY_MATCH_THRESHOLD", 0.4, float)
+
+# Direct tool pipeline for known platforms, falling back to the agent
+FAST_PATH_ENABLED = get_setting("FAST_PATH_ENABLED", True, bool)
+FAST_PATH_MAX_PRODUCTS = get_setting("FAST_PATH_MAX_PRODUCTS", 5, int)
+
+# Extract product candidates from scraped pages before the agent's model reads them
+TOOL_OUTPUT_REDUCER_ENABLED = get_setting("TOOL_OUTPUT_REDUCER_ENABLED", True, bool)
+
+# Pydantic models
+class Hit(BaseModel):
+    title: str
+    url: str
+    price: str
+    rating: str
+    image_url: str
+
+class PlatformBlock(BaseModel):
+    platform: str
+    hits: List[Hit]
+
+class ProductSearchResponse(BaseModel):
+    platforms: List[PlatformBlock]
+
+def create_smithery_url():
+    """Create Smithery.ai MCP server URL with configuration"""
+    if MCP_SERVER_URL:
+        return MCP_SERVER_URL
+
+    config = {
+        "apiToken": get_setting("API_TOKEN"),
+        "browserAuth": get_setting("BROWSER_AUTH"),
+        "webUnlockerZone": get_setting("WEB_UNLOCKER_ZONE")
+    }
+
+    config_b64 = base64.b64encode(json.dumps(config).encode()).decode()
+    url = f"https://server.smithery.ai/@luminati-io/brightdata-mcp/mcp?config={config_b64}&api_key={SMITHERY_API_KEY}"
+
+    return url
+
+def build_system_prompt(policy: str = SEARCH_POLICY):
+    """Build the agent system prompt for the given search policy"""
+    if policy == "sequential":
+        ordering = "Search all requested platforms in sequence, not in parallel. "
+    else:
+        ordering = "You may search the requested platforms in parallel. "
+
+    return (
+        "To find products, first use the search_engine tool. When finding products, use the web_data tool for the platform. "
+        "If none exists, scrape as markdown. "
+        + ordering +
+        "Example: Don't use web_data_bestbuy_products for search. Use it only for getting data on specific products you already found in search."
+    )
+
+SYSTEM_PROMPT = build_system_prompt()
+
+def create_agent(tools):
+    """Compile the ReAct agent for a set of MCP tools"""
+    from langgraph.prebuilt import create_react_agent
+
+    if TOOL_OUTPUT_REDUCER_ENABLED:
+        from utils.content_reducer import reduce_tool_output
+
+        tools = reduce_tool_output(tools)
+    return create_react_agent(get_model(), tools, response_format=ProductSearchResponse)
+
+@st.cache_resource
+def get_mcp_pool():
+    """Process-wide pool of initialized MCP sessions, shared across reruns and sessions.
+
+    The pool is bound to the background event loop, so search coroutines must be
+    run with `utils.event_loop.run_sync`.
+    """
+    # mcp and langchain-mcp-adapters are only needed once a search actually runs
+    from utils.mcp_pool import MCPSessionPool
+
+    return MCPSessionPool(
+        create_smithery_url,
+        create_agent,
+        max_size=MCP_POOL_SIZE,
+        idle_timeout=MCP_IDLE_TIMEOUT_SECONDS,
+        health_check_interval=MCP_HEALTH_CHECK_SECONDS,
+    )
+
+async def run_agent_single_platform(query, platform, system_prompt=SYSTEM_PROMPT):
+    """Run agent for a single platform.
+
+    Returns None when the agent gives no structured response. Errors are raised
+    so the platform scheduler can tell transient failures from the others.
+    """
+    from utils.tracing_callbacks import TracingCallbackHandler
+
+    with tracing.span("agent", platform=platform) as span:
+        try:
+            pool = get_mcp_pool()
+
+            async with pool.acquire():
+                agent = await pool.get_agent()
+
+                prompt = f'{query}\n\nPlatforms: {platform}'
+                result = await agent.ainvoke(
+                    {
+                        'messages': [
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": prompt}
+                        ]
+                    },
+                    config={"callbacks": [TracingCallbackHandler(span)]},
+                )
+
+                structured = result.get("structured_response")
+                span.set("schema_valid", isinstance(structured, ProductSearchResponse))
+                if structured is None:
+                    return None
+                return structured.model_dump()
+
+        except Exception as e:
+            tracing.record_error("agent", e, platform=platform)
+            raise
+
+async def run_fast_path_single_platform(query, platform):
+    """Search a known platform without the agent, returning None when the agent is needed"""
+    if platform not in PLATFORM_PIPELINES:
+        return None
+    try:
+        pool = get_mcp_pool()
+
+        async with pool.acquire() as conn:
+            tools = await pool.get_tools()
+            try:
+                result = await run_fast_path(conn.session, {tool.name for tool in tools}, query, platform, FAST_PATH_MAX_PRODUCTS)
+            except FastPathError as e:
+                tracing.record_error("fast_path.unavailable", e, platform=platform)
+                return None
+
+        return ProductSearchResponse.model_validate(result).model_dump()
+
+    except Exception as e:
+        tracing.record_error("fast_path", e, platform=platform)
+        return None
+
+@st.cache_resource
+def get_result_cache():
+    """Process-wide on-disk cache of validated search results, matching near-duplicate queries"""
+    return SearchResultCache(
+        RESULT_CACHE_PATH,
+        ttl_seconds=RESULT_CACHE_TTL_SECONDS,
+        max_entries=RESULT_CACHE_MAX_ENTRIES,
+        query_index=QueryIndex(threshold=QUERY_MATCH_THRESHOLD) if QUERY_MATCHING_ENABLED else None,
+    )
+
+@st.cache_resource
+def get_single_flight():
+    """Process-wide coalescing of identical in-flight platform searches"""
+    return SingleFlight()
+
+@st.cache_resource
+def get_scheduler():
+    """Process-wide platform latency and failure statistics: adaptive timeouts, retries, hedging and circuit breaking"""
+    return PlatformScheduler()
+
+async def search_single_platform(query, platform, system_prompt=SYSTEM_PROMPT, timeout=PLATFORM_TIMEOUT_SECONDS):
+    """Search one platform: result cache first, then the direct pipeline, then the agent.
+
+    Concurrent calls for the same normalized query and platform share one search
+    and its result or failure. Searches that reach the platform go through the
+    scheduler within `timeout` seconds; it raises asyncio.TimeoutError when they
+    run out and PlatformUnavailableError while the platform's circuit is open.
+    """
+    span = tracing.current_span()
+    cache = get_result_cache() if RESULT_CACHE_ENABLED else None
+
+    if cache is not None:
+        # SQLite reads must not block the shared event loop
+        cached = await asyncio.to_thread(cache.get, query, platform)
+        if cached is not None:
+            if span is not None:
+                span.set("source", "cache")
+            return cached
+
+    async def attempt():
+        result = None
+        if FAST_PATH_ENABLED:
+            result = await run_fast_path_single_platform(query, platform)
+            source = "fast_path"
+        if result is None:
+            result = await run_agent_single_platform(query, platform, system_prompt)
+            source = "agent"
+        return result, source
+
+    async def search():
+        result, source = await get_scheduler().run(platform, attempt, timeout)
+        if span is not None:
+            span.set("source", source)
+        if cache is not None and result and result.get("platforms"):
+            await asyncio.to_thread(cache.put, query, platform, ProductSearchResponse.model_validate(result).model_dump(mode="json"))
+        return result
+
+    # Identical searches already running (other sessions, double clicks) share one execution
+    flight = get_single_flight()
+    key = (normalize_query(query), platform)
+    if flight.is_running(key) and span is not None:
+        span.set("source", "coalesced")
+    return await flight.run(key, search)
+
+async def collect_search_results(query, platforms, policy=SEARCH_POLICY,
+                                 max_concurrency=MAX_CONCURRENT_PLATFORMS, timeout=PLATFORM_TIMEOUT_SECONDS):
+    """All platforms' blocks plus the platforms that failed, timed out or were skipped, or None without results"""
+    all_results = {"platforms": [], "failed": {}}
+
+    async for item in iter_search_results(query, platforms, policy, max_concurrency, timeout):
+        if item["status"] == "done":
+            all_results["platforms"].extend(item["blocks"])
+        elif item["status"] in ("failed", "timeout", "unavailable"):
+            all_results["failed"][item["platform"]] = item["status"]
+
+    return all_results if all_results["platforms"] else None
+
+async def run_agent_sequential(query, platforms):
+    """Run agent sequentially for multiple platforms to avoid conflicts.
+
+    A platform that fails is listed under "failed" without stopping the others.
+    """
+    return await collect_search_results(query, platforms, "sequential")
+
+async def iter_search_results(query, platforms, policy=SEARCH_POLICY,
+                              max_concurrency=MAX_CONCURRENT_PLATFORMS, timeout=PLATFORM_TIMEOUT_SECONDS):
+    """Search platforms and yield each platform's status as soon as it changes.
+
+    Yields dicts with "platform", "status" and "blocks". Every platform is first
+    reported as "pending", then "running", and finally "done" with its validated
+    PlatformBlock dicts, or "failed" / "timeout" / "unavailable" (circuit open)
+    with no blocks. Platforms that are usually slowest start first. The platform
+    scheduler enforces each platform's `timeout`. Closing the generator early
+    cancels the platforms still in flight.
+    """
+    sequential = policy == "sequential"
+    semaphore = asyncio.Semaphore(1 if sequential else max(1, max_concurrency))
+    system_prompt = build_system_prompt(policy)
+    events = asyncio.Queue()
+
+    def event(platform, status, blocks=None):
+        return {"platform": platform, "status": status, "blocks": blocks or []}
+
+    async def search_platform(platform):
+        async with semaphore:
+            await events.put(event(platform, "running"))
+            with tracing.span("platform", platform=platform) as span:
+                try:
+                    result = await search_single_platform(query, platform, system_prompt, timeout)
+                    if result and result.get("platforms"):
+                        blocks = ProductSearchResponse.model_validate(result).model_dump()["platforms"]
+                        span.set("hits", sum(len(block["hits"]) for block in blocks))
+                        item = event(platform, "done", blocks)
+                    else:
+                        item = event(platform, "failed")
+                except asyncio.TimeoutError:
+                    tracing.record_error("search.timeout", f"timed out after {timeout}s", platform=platform)
+                    item = event(platform, "timeout")
+                except PlatformUnavailableError as e:
+                    tracing.record_error("search.unavailable", e, platform=platform)
+                    item = event(platform, "unavailable")
+                except Exception as e:
+                    tracing.record_error("search", e, platform=platform)
+                    item = event(platform, "failed")
+                span.set("status", item["status"])
+            await events.put(item)
+
+            if sequential:
+                await asyncio.sleep(SEQUENTIAL_DELAY_SECONDS)
+
+    for platform in platforms:
+        yield event(platform, "pending")
+
+    with tracing.span("search", query=query, platforms=list(platforms), policy=policy) as span:
+        # With limited concurrency, slow platforms queue first so they don't also wait behind fast ones
+        tasks = [asyncio.create_task(search_platform(platform)) for platform in get_scheduler().order(platforms)]
+        remaining = len(tasks)
+        try:
+            while remaining:
+                item = await events.get()
+                if item["status"] not in ("pending", "running"):
+                    remaining -= 1
+                    span.add(f"platforms_{item['status']}")
+                yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+async def run_agent_concurrent(query, platforms, max_concurrency=MAX_CONCURRENT_PLATFORMS, timeout=PLATFORM_TIMEOUT_SECONDS):
+    """Run agent for all platforms at once, returning partial results if some platforms fail or time out.
+
+    At most `max_concurrency` platforms are in flight at a time and each one gets its own
+    `timeout`. Platforms that fail or time out are listed under "failed" with the reason.
+    """
+    return await collect_search_results(query, platforms, "concurrent", max_concurrency, timeout)
+
+async def run_agent_search(query, platforms, policy=SEARCH_POLICY):
+    """Search platforms according to the configured search policy"""
+    if policy == "sequential":
+        return await run_agent_sequential(query, platforms)
+    return await run_agent_concurrent(query, platforms)
@@ -0,0 +1,220 @@
+"""Search jobs run on the background event loop with admission control.
+
+Sessions submit a search and get a job ID back immediately; the search runs
+on a bounded pool of workers whether or not the session is still around, so
+a browser refresh can pick the job up again. Jobs beyond the global worker
+limit or a user's per-tier limit wait in a queue (higher tiers first), and
+submissions beyond the queue bounds are rejected instead of piling up.
+"""
+import time
+import uuid
+import asyncio
+import threading
+import itertools
+import streamlit as st
+from utils.config import get_setting
+from utils.event_loop import get_event_loop
+from utils.search import iter_search_results
+from utils import tracing
+
+SEARCH_WORKERS = get_setting("SEARCH_WORKERS", 4, int)
+SEARCH_QUEUE_LIMIT = get_setting("SEARCH_QUEUE_LIMIT", 50, int)
+SEARCH_JOB_RETENTION_SECONDS = get_setting("SEARCH_JOB_RETENTION_SECONDS", 900.0, float)
+SEARCH_POLL_SECONDS = get_setting("SEARCH_POLL_SECONDS", 0.5, float)
+
+# Per plan: searches running at once, searches running or waiting, and queue priority (lower goes first)
+TIER_LIMITS = {
+    "starter": {"running": 1, "active": 2, "priority": 2},
+    "basic": {"running": 2, "active": 4, "priority": 1},
+    "pro": {"running": 3, "active": 8, "priority": 0},
+}
+DEFAULT_TIER = "starter"
+
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+class AdmissionError(Exception):
+    """The search queue or the user's share of it is full"""
+
+class SearchJob:
+    def __init__(self, user: str, tier: str, query: str, platforms: list):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.tier = tier
+        self.query = query
+        self.platforms = list(platforms)
+        self.status = "queued"
+        self.platform_status = {platform: "pending" for platform in platforms}
+        self.blocks = []
+        self.failed = {}
+        self.error = None
+        self.collected = False
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+
+    def snapshot(self, position=None) -> dict:
+        return {
+            "id": self.id,
+            "query": self.query,
+            "platforms": list(self.platforms),
+            "status": self.status,
+            "position": position,
+            "platform_status": dict(self.platform_status),
+            "blocks": list(self.blocks),
+            "failed": dict(self.failed),
+            "error": self.error,
+            "collected": self.collected,
+        }
+
+class SearchJobQueue:
+    """Bounded pool of search workers with per-user limits and a priority queue.
+
+    Job state is shared between the background loop (which runs and updates
+    jobs) and Streamlit script threads (which submit, poll and cancel), so all
+    of it is guarded by one lock; scheduling itself only happens on the loop.
+    """
+
+    def __init__(self, loop, workers: int = SEARCH_WORKERS, queue_limit: int = SEARCH_QUEUE_LIMIT,
+                 retention_seconds: float = SEARCH_JOB_RETENTION_SECONDS):
+        self.loop = loop
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._queue = []
+        self._running = set()
+        self._order = itertools.count()
+        self.stats = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "cancelled": 0}
+
+    def _limits(self, tier):
+        return TIER_LIMITS.get(tier, TIER_LIMITS[DEFAULT_TIER])
+
+    def submit(self, user: str, query: str, platforms: list, tier: str = DEFAULT_TIER) -> str:
+        """Queue a search and return its job ID, or raise AdmissionError if there is no room"""
+        limits = self._limits(tier)
+        with self._lock:
+            self._expire()
+            active_for_user = sum(1 for job in self._jobs.values() if job.user == user and job.status in ("queued", "running"))
+            if len(self._queue) >= self.queue_limit:
+                self.stats["rejected"] += 1
+                raise AdmissionError("Tympli is busy right now. Please try again in a minute.")
+            if active_for_user >= limits["active"]:
+                self.stats["rejected"] += 1
+                raise AdmissionError("You already have searches running or waiting. Let them finish or cancel one first.")
+
+            job = SearchJob(user, tier, query, platforms)
+            self._jobs[job.id] = job
+            self._queue.append((limits["priority"], next(self._order), job))
+            self._queue.sort(key=lambda entry: entry[:2])
+            self.stats["submitted"] += 1
+
+        self.loop.call_soon_threadsafe(self._dispatch)
+        return job.id
+
+    def _dispatch(self):
+        # Runs on the loop: start queued jobs while workers are free, skipping users at their limit
+        with self._lock:
+            while len(self._running) < self.workers:
+                running_per_user = {}
+                for job in self._running:
+                    running_per_user[job.user] = running_per_user.get(job.user, 0) + 1
+                entry = next(
+                    (entry for entry in self._queue
+                     if running_per_user.get(entry[2].user, 0) < self._limits(entry[2].tier)["running"]),
+                    None,
+                )
+                if entry is None:
+                    return
+                self._queue.remove(entry)
+                job = entry[2]
+                job.status = "running"
+                job.started_at = time.time()
+                self._running.add(job)
+                job.task = self.loop.create_task(self._run(job))
+
+    async def _run(self, job: SearchJob):
+        tracing.metrics.observe("search_job.queue_wait_ms", (job.started_at - job.created_at) * 1000)
+        try:
+            async for item in iter_search_results(job.query, job.platforms):
+                with self._lock:
+                    job.platform_status[item["platform"]] = item["status"]
+                    if item["status"] == "done":
+                        job.blocks.extend(item["blocks"])
+                    elif item["status"] in ("failed", "timeout", "unavailable"):
+                        job.failed[item["platform"]] = item["status"]
+            status = "done" if job.blocks else "failed"
+        except asyncio.CancelledError:
+            status = "cancelled"
+        except Exception as e:
+            tracing.record_error("search_job", e, job_id=job.id)
+            job.error = str(e)
+            status = "failed"
+
+        with self._lock:
+            job.status = status
+            job.finished_at = time.time()
+            self._running.discard(job)
+            self.stats[{"done": "completed"}.get(status, status)] += 1
+        self._dispatch()
+
+    def _expire(self):
+        # Caller holds the lock
+        cutoff = time.time() - self.retention_seconds
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+    def get(self, job_id: str, user: str):
+        """Snapshot of a job owned by `user`, or None if unknown or expired"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.user != user:
+                return None
+            position = None
+            if job.status == "queued":
+                position = next(i for i, entry in enumerate(self._queue) if entry[2] is job) + 1
+            return job.snapshot(position)
+
+    def latest_for_user(self, user: str):
+        """ID of the user's most recent job whose results have not been shown yet"""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.user == user and not job.collected]
+        if not jobs:
+            return None
+        return max(jobs, key=lambda job: job.created_at).id
+
+    def mark_collected(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.collected = True
+
+    def cancel(self, job_id: str, user: str) -> bool:
+        """Cancel a queued or running job owned by `user`"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.user != user or job.status in FINISHED_STATUSES:
+                return False
+            for entry in self._queue:
+                if entry[2] is job:
+                    self._queue.remove(entry)
+                    job.status = "cancelled"
+                    job.finished_at = time.time()
+                    self.stats["cancelled"] += 1
+                    return True
+            task = job.task
+        if task is not None:
+            self.loop.call_soon_threadsafe(task.cancel)
+        return True
+
+    def load(self) -> dict:
+        """Current queue depth and running jobs, for the metrics page"""
+        with self._lock:
+            return {"running": len(self._running), "queued": len(self._queue), "workers": self.workers, **self.stats}
+
+@st.cache_resource
+def get_search_jobs():
+    """Process-wide search job queue on the shared background loop"""
+    return SearchJobQueue(get_event_loop())
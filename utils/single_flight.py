@@ -0,0 +1,51 @@
+import asyncio
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution.
+
+    The first caller for a key starts the work as its own task; callers that
+    arrive while it is running await the same task and get its result or its
+    exception. A caller being cancelled (e.g. its timeout expiring) only stops
+    its own wait; the work is cancelled once nobody is waiting for it.
+    All callers must run on the same event loop.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.stats = {"calls": 0, "executions": 0, "deduplicated": 0, "in_flight": 0}
+
+    async def run(self, key, factory):
+        """Return the result of `factory()`, sharing one execution per key among concurrent callers"""
+        self.stats["calls"] += 1
+        entry = self._inflight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(factory())
+            entry = self._inflight[key] = {"task": task, "waiters": 0}
+            self.stats["executions"] += 1
+            self.stats["in_flight"] = len(self._inflight)
+
+            def forget(_, key=key, entry=entry):
+                if self._inflight.get(key) is entry:
+                    del self._inflight[key]
+                    self.stats["in_flight"] = len(self._inflight)
+
+            task.add_done_callback(forget)
+        else:
+            self.stats["deduplicated"] += 1
+
+        entry["waiters"] += 1
+        try:
+            return await asyncio.shield(entry["task"])
+        except asyncio.CancelledError:
+            if entry["waiters"] == 1 and not entry["task"].done():
+                entry["task"].cancel()
+                # Callers arriving from now on start fresh instead of joining a cancelled task
+                if self._inflight.get(key) is entry:
+                    del self._inflight[key]
+                    self.stats["in_flight"] = len(self._inflight)
+            raise
+        finally:
+            entry["waiters"] -= 1
+
+    def is_running(self, key) -> bool:
+        return key in self._inflight
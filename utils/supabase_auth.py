@@ -1,18 +1,15 @@
 import streamlit as st
-from supabase import create_client, Client
-
-# Supabase setup
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+from utils.database import invalidate_user
+from utils.resources import new_auth_client
 
 # Authentication functions
 def sign_up(email: str, password: str):
     try:
-        user = supabase.auth.sign_up({"email": email, "password": password})
+        user = new_auth_client().auth.sign_up({"email": email, "password": password})
         if user.user:
             if user.session:  # Session exists if email confirmation is disabled
                 st.session_state["user"] = user.user
+                st.session_state["access_token"] = user.session.access_token
             else:  # Email confirmation required
                 st.session_state["user"] = None
             return user
@@ -25,9 +22,10 @@ def sign_up(email: str, password: str):
 
 def sign_in(email: str, password: str):
     try:
-        user = supabase.auth.sign_in_with_password({"email": email, "password": password})
+        user = new_auth_client().auth.sign_in_with_password({"email": email, "password": password})
         if user.user:
             st.session_state["user"] = user.user
+            st.session_state["access_token"] = user.session.access_token
             return user
         else:
             st.error("Login failed: No user returned.")
@@ -38,9 +36,14 @@ def sign_in(email: str, password: str):
 
 def sign_out():
     try:
-        supabase.auth.sign_out()
+        # Revoke this session's token; the client holds no session of its own
+        if st.session_state.get("access_token"):
+            new_auth_client().auth.admin.sign_out(st.session_state["access_token"])
+        if st.session_state.get("user_email"):
+            invalidate_user(st.session_state["user_email"])
         st.session_state["user"] = None
         st.session_state["user_email"] = None
+        st.session_state["access_token"] = None
         #st.success("Logged out successfully!")
         st.rerun()
     except Exception as e:
@@ -0,0 +1,245 @@
+"""Memoized MCP tool calls shared by the agent, the fast path and price refresh.
+
+Intermediate tool calls repeat far more often than whole searches: the same
+`search_engine` query from two users, the same product URL looked up by a
+search and by the next watchlist refresh. Results are memoized on the tool name
+and canonicalized arguments with a TTL per tool (short for price lookups, longer
+for search listings), kept in memory up to a byte budget, and optionally spilled
+to SQLite when evicted. Identical calls in flight at the same time share one
+request.
+"""
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import fnmatch
+import threading
+import contextvars
+from collections import OrderedDict
+from urllib.parse import urlparse
+from utils.config import get_setting
+from utils.single_flight import SingleFlight
+from utils.result_cache import normalize_query
+from utils.product_match import listing_key
+from utils import tracing
+
+TOOL_MEMO_ENABLED = get_setting("TOOL_MEMO_ENABLED", True, bool)
+TOOL_MEMO_MAX_BYTES = get_setting("TOOL_MEMO_MAX_BYTES", 32_000_000, int)
+# Empty to keep evicted results in memory only
+TOOL_MEMO_SPILL_PATH = get_setting("TOOL_MEMO_SPILL_PATH", ".cache/tool_calls.sqlite3")
+TOOL_MEMO_SPILL_MAX_ENTRIES = get_setting("TOOL_MEMO_SPILL_MAX_ENTRIES", 20000, int)
+
+# Tool name pattern -> seconds a result stays fresh; first match wins, 0 disables memoization
+DEFAULT_TOOL_TTLS = {
+    "web_data_*_product": 900,
+    "web_data_*_search": 3600,
+    "search_engine": 3600,
+    "scrape_as_markdown": 1800,
+    "*": 0,
+}
+_custom_ttls = get_setting("TOOL_MEMO_TTLS", {}, lambda value: json.loads(value) if isinstance(value, str) else dict(value))
+TOOL_TTLS = {**_custom_ttls, **{pattern: ttl for pattern, ttl in DEFAULT_TOOL_TTLS.items() if pattern not in _custom_ttls}}
+
+# Set by hedged searches: their tool calls go out on their own instead of joining
+# the identical (slow) calls already in flight. Finished results are still reused.
+fresh_tool_calls = contextvars.ContextVar("fresh_tool_calls", default=False)
+
+def tool_ttl(name: str, ttls: dict = TOOL_TTLS) -> float:
+    return float(next((ttl for pattern, ttl in ttls.items() if fnmatch.fnmatchcase(name, pattern)), 0))
+
+def _canonical(name, value):
+    # Same product or query spelled differently -> same key
+    if isinstance(value, dict):
+        return {key: _canonical(key, item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_canonical(name, item) for item in value]
+    if isinstance(value, str):
+        if name == "url":
+            # Product pages collapse to their listing ID; other pages (e.g. search URLs) keep their query string
+            parsed = urlparse(value.strip())
+            key = listing_key(value)
+            return value.strip() if key == f"{parsed.netloc.lower()}{parsed.path.rstrip('/')}" else key
+        if name in ("query", "keyword"):
+            return normalize_query(value)
+        return value.strip()
+    return value
+
+def memo_key(name: str, arguments: dict) -> str:
+    """Tool name plus canonicalized arguments"""
+    return name + ":" + json.dumps(_canonical(None, arguments or {}), sort_keys=True, separators=(",", ":"))
+
+class ToolCallMemo:
+    """Bounded TTL memo of MCP tool results with in-flight deduplication.
+
+    Results are kept in an LRU ordered dict up to `max_bytes` of serialized
+    size. With a `spill_path`, entries evicted from memory move to SQLite and
+    are promoted back on the next hit; SQLite is only touched from worker
+    threads, never on the event loop. Error results are never memoized.
+    """
+
+    def __init__(self, max_bytes: int = TOOL_MEMO_MAX_BYTES, spill_path: str = TOOL_MEMO_SPILL_PATH,
+                 spill_max_entries: int = TOOL_MEMO_SPILL_MAX_ENTRIES, ttls: dict = TOOL_TTLS):
+        self.max_bytes = max_bytes
+        self.spill_max_entries = spill_max_entries
+        self.ttls = ttls
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Guards the SQLite connection, which is only used from worker threads and the Metrics page
+        self._spill_lock = threading.Lock()
+        self._flights = SingleFlight()
+        self.stats = {"hits": 0, "spill_hits": 0, "misses": 0, "deduplicated": 0, "evicted": 0, "spilled": 0}
+
+        self._conn = None
+        if spill_path:
+            directory = os.path.dirname(spill_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(spill_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tool_calls (
+                    key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tool_calls_access ON tool_calls (last_access)")
+            self._conn.commit()
+
+    def _get(self, key: str, now: float):
+        # Caller holds the lock; memory only
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            self._bytes -= entry[3]
+            del self._entries[key]
+        return None
+
+    def _put(self, key: str, result, serialized: str, expires_at: float) -> list:
+        # Caller holds the lock; returns the evicted entries still fresh enough to spill
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[3]
+        self._entries[key] = (expires_at, result, serialized, len(serialized))
+        self._bytes += len(serialized)
+
+        spill = []
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            evicted_key, (evicted_expiry, _, evicted_serialized, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.stats["evicted"] += 1
+            if evicted_expiry > time.time():
+                spill.append((evicted_key, evicted_serialized, evicted_expiry, time.time()))
+        return spill
+
+    def _spill(self, spill: list):
+        # Blocking SQLite write; called off the event loop
+        if not spill or self._conn is None:
+            return
+        with self._spill_lock:
+            self._conn.executemany("INSERT OR REPLACE INTO tool_calls VALUES (?, ?, ?, ?)", spill)
+            count = self._conn.execute("SELECT COUNT(*) FROM tool_calls").fetchone()[0]
+            if count > self.spill_max_entries:
+                self._conn.execute(
+                    "DELETE FROM tool_calls WHERE key IN (SELECT key FROM tool_calls ORDER BY last_access LIMIT ?)",
+                    (count - self.spill_max_entries,),
+                )
+            self._conn.commit()
+        with self._lock:
+            self.stats["spilled"] += len(spill)
+
+    def _get_spilled(self, key: str, now: float):
+        # Blocking SQLite read; called off the event loop. A hit moves back into memory.
+        with self._spill_lock:
+            row = self._conn.execute("SELECT result, expires_at FROM tool_calls WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("DELETE FROM tool_calls WHERE key = ?", (key,))
+            self._conn.commit()
+        if row[1] <= now:
+            return None
+        from mcp.types import CallToolResult
+
+        result = CallToolResult.model_validate_json(row[0])
+        with self._lock:
+            spill = self._put(key, result, row[0], row[1])
+            self.stats["spill_hits"] += 1
+        self._spill(spill)
+        return result
+
+    async def call(self, name: str, arguments: dict, fetch):
+        """Return the memoized result of a tool call, or `await fetch()` and memoize it"""
+        ttl = tool_ttl(name, self.ttls)
+        if ttl <= 0:
+            return await fetch()
+
+        key = memo_key(name, arguments)
+        with self._lock:
+            result = self._get(key, time.time())
+        if result is None and self._conn is not None:
+            result = await asyncio.to_thread(self._get_spilled, key, time.time())
+        if result is not None:
+            tracing.record("tool_memo_hits")
+            return result
+
+        async def fetch_and_store():
+            result = await fetch()
+            if not getattr(result, "isError", False):
+                serialized = result.model_dump_json()
+                with self._lock:
+                    spill = self._put(key, result, serialized, time.time() + ttl)
+                if spill and self._conn is not None:
+                    await asyncio.to_thread(self._spill, spill)
+            return result
+
+        if fresh_tool_calls.get():
+            self.stats["misses"] += 1
+            return await fetch_and_store()
+        if self._flights.is_running(key):
+            self.stats["deduplicated"] += 1
+            tracing.record("tool_memo_deduplicated")
+        else:
+            self.stats["misses"] += 1
+        return await self._flights.run(key, fetch_and_store)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self._conn is not None:
+            with self._spill_lock:
+                self._conn.execute("DELETE FROM tool_calls")
+                self._conn.commit()
+
+    def summary(self) -> dict:
+        spilled = 0
+        if self._conn is not None:
+            with self._spill_lock:
+                spilled = self._conn.execute("SELECT COUNT(*) FROM tool_calls").fetchone()[0]
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self._bytes, "spilled_entries": spilled}
+
+_memo = None
+_memo_lock = threading.Lock()
+
+def get_tool_memo():
+    """Process-wide tool call memo"""
+    global _memo
+    with _memo_lock:
+        if _memo is None:
+            _memo = ToolCallMemo()
+        return _memo
+
+async def memoized(name: str, arguments: dict, fetch):
+    """`await fetch()` for a tool call, through the process-wide memo when TOOL_MEMO_ENABLED"""
+    if not TOOL_MEMO_ENABLED:
+        return await fetch()
+    return await get_tool_memo().call(name, arguments, fetch)
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import uuid
+import random
+import threading
+import contextvars
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import numpy as np
+from utils.config import get_setting
+
+TRACE_PATH = get_setting("TRACE_PATH", ".cache/traces.jsonl")
+TRACE_SAMPLE_RATE = get_setting("TRACE_SAMPLE_RATE", 0.1, float)
+TRACE_MAX_BYTES = get_setting("TRACE_MAX_BYTES", 50_000_000, int)
+METRICS_WINDOW = get_setting("METRICS_WINDOW", 2000, int)
+
+_current_span = contextvars.ContextVar("tracing_current_span", default=None)
+
+class MetricsRegistry:
+    """Rolling window of recent observations per metric for percentile summaries"""
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.window = window
+        self._values = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            self._values[name].append(float(value))
+
+    def values(self, name: str):
+        with self._lock:
+            return list(self._values.get(name, ()))
+
+    def summary(self):
+        """Count, mean and p50/p95/p99 for every metric"""
+        with self._lock:
+            snapshot = {name: np.array(values) for name, values in self._values.items() if values}
+        rows = []
+        for name in sorted(snapshot):
+            values = snapshot[name]
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            rows.append({
+                "metric": name,
+                "count": int(values.size),
+                "mean": float(values.mean()),
+                "p50": float(p50),
+                "p95": float(p95),
+                "p99": float(p99),
+            })
+        return rows
+
+class ErrorLog:
+    """Error counts per kind and the most recent errors, for the Metrics page"""
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.counts = defaultdict(int)
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, message: str, attributes: dict):
+        with self._lock:
+            self.counts[kind] += 1
+            self._recent.append({"time": time.time(), "kind": kind, "message": message, **attributes})
+
+    def recent(self, limit: int = 50):
+        """Newest errors first"""
+        with self._lock:
+            return list(self._recent)[-limit:][::-1]
+
+    def summary(self):
+        with self._lock:
+            return dict(sorted(self.counts.items()))
+
+class TraceWriter:
+    """Append finished spans to a JSONL file, rotating it once it grows past `max_bytes`"""
+
+    def __init__(self, path: str = TRACE_PATH, max_bytes: int = TRACE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"Failed to write trace: {str(e)}")
+
+metrics = MetricsRegistry()
+errors = ErrorLog()
+writer = TraceWriter()
+
+class Span:
+    """A timed unit of work with attributes and additive counters.
+
+    Whether a trace is written is decided once at its root span, so sampled
+    traces are always complete. Durations always feed the metrics registry.
+    """
+
+    def __init__(self, name: str, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = uuid.uuid4().hex[:16]
+        self.sampled = parent.sampled if parent else random.random() < TRACE_SAMPLE_RATE
+        self.attributes = dict(attributes or {})
+        self.counters = defaultdict(float)
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def add(self, key: str, amount: float = 1):
+        self.counters[key] += amount
+
+    def end(self):
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        metrics.observe(f"{self.name}.duration_ms", self.duration_ms)
+        if self.sampled:
+            writer.write({
+                "trace_id": self.trace_id,
+                "span_id": self.span_id,
+                "parent_id": self.parent_id,
+                "name": self.name,
+                "start_time": self.start_time,
+                "duration_ms": round(self.duration_ms, 3),
+                "attributes": self.attributes,
+                "counters": dict(self.counters),
+            })
+
+@contextmanager
+def span(name: str, **attributes):
+    """Open a child of the current span (or a new trace) for the duration of the block"""
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set("error", f"{type(e).__name__}: {str(e)}"[:500])
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+def current_span():
+    return _current_span.get()
+
+def record(key: str, amount: float = 1):
+    """Add to a counter on the current span, if any"""
+    current = _current_span.get()
+    if current is not None:
+        current.add(key, amount)
+
+def record_tool_call(tool: str, seconds: float, error: bool = False):
+    """Record one MCP tool call on the current span and in the metrics registry"""
+    record("tool_calls")
+    record(f"tool.{tool}.seconds", seconds)
+    if error:
+        record("tool_errors")
+    metrics.observe(f"tool.{tool}.duration_ms", seconds * 1000)
+
+def record_error(kind: str, error, **attributes):
+    """Record a handled error in the error log and on the current span, if any.
+
+    `kind` names where it happened ("agent", "fast_path.lookup", ...); the span
+    gets an `errors.<kind>` counter and the message under its "errors" attribute.
+    """
+    if isinstance(error, BaseException):
+        message = f"{type(error).__name__}: {str(error)}"[:500]
+    else:
+        message = str(error)[:500]
+    errors.add(kind, message, attributes)
+    current = _current_span.get()
+    if current is not None:
+        current.add(f"errors.{kind}")
+        current.attributes.setdefault("errors", []).append({"kind": kind, "message": message, **attributes})
@@ -0,0 +1,72 @@
+"""LangChain callbacks for tracing agent runs.
+
+Kept out of utils.tracing so pages that only record spans and metrics don't
+import langchain_core; it is loaded once an agent actually runs.
+"""
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+from utils.tracing import Span, metrics
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """LangChain callbacks that count LLM calls, token usage and tool timings on a span"""
+
+    run_inline = True
+
+    def __init__(self, target: Span):
+        self.target = target
+        self._tools = {}
+        self._llm_starts = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._llm_starts[run_id] = time.perf_counter()
+        self.target.add("llm_calls")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._llm_starts[run_id] = time.perf_counter()
+        self.target.add("llm_calls")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._llm_starts.pop(run_id, None)
+        if started is not None:
+            seconds = time.perf_counter() - started
+            self.target.add("llm_seconds", seconds)
+            metrics.observe("llm.duration_ms", seconds * 1000)
+
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if not usage:
+            # Fall back to usage metadata on the generated messages
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    usage = {
+                        "prompt_tokens": metadata.get("input_tokens", 0),
+                        "completion_tokens": metadata.get("output_tokens", 0),
+                        "total_tokens": metadata.get("total_tokens", 0),
+                    }
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            if usage.get(key):
+                self.target.add(key, usage[key])
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._llm_starts.pop(run_id, None)
+        self.target.add("llm_errors")
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._tools[run_id] = (serialized.get("name", "unknown"), time.perf_counter())
+
+    def _finish_tool(self, run_id, error):
+        name, started = self._tools.pop(run_id, ("unknown", None))
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        self.target.add("tool_calls")
+        self.target.add(f"tool.{name}.seconds", seconds)
+        if error:
+            self.target.add("tool_errors")
+        metrics.observe(f"tool.{name}.duration_ms", seconds * 1000)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._finish_tool(run_id, False)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish_tool(run_id, True)